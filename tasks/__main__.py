@@ -1,10 +1,289 @@
 """Main entry point for running the task management system as a module."""
 
+import argparse
+import sys
+import time
+from pathlib import Path
+
+from .database.durability import CorruptDocumentError
+from .constants import HASH_TARGET_MS
+from .database.migrations import DocumentVersionError
 from .main import TaskManager
 
-def main():
-    task_manager = TaskManager()
-    task_manager.start()
+MAX_REPORTED_ERRORS = 20
+
+
+def migrate_sqlite(args):
+    """Import the JSON data files into the SQLite database."""
+    from .database import DatabaseManager, SQLiteDatabaseManager
+
+    counts = SQLiteDatabaseManager(base_dir=args.data_dir).import_from_json(DatabaseManager(base_dir=args.data_dir))
+    print(", ".join(f"{table}: {count}" for table, count in counts.items()))
+
+
+def convert_format(args):
+    """Rewrite the JSON backend's data files in another storage format."""
+    from .database import DatabaseManager
+
+    converted = DatabaseManager(base_dir=args.data_dir).convert_format(args.format)
+    print(f"Converted {converted} file(s) to {args.format}")
+
+
+def _open_database(args):
+    """Open the database backend named on the command line, or the configured one."""
+    from .database import create_database_manager
+
+    return create_database_manager(args.backend, base_dir=args.data_dir)
+
+
+def _print_progress(stats):
+    """Report import progress and throughput on stderr."""
+    rate = stats["read"] / stats["seconds"] if stats["seconds"] else 0
+    print(f"{stats['read']} read, {stats['imported']} imported, {stats['skipped']} skipped, "
+          f"{stats['invalid']} invalid ({rate:.0f} records/s)", file=sys.stderr)
+
+
+def import_records(args):
+    """Stream records from a CSV or JSON Lines file into the database."""
+    from .database import bulk
+
+    file_format = bulk.detect_format(args.file, args.format)
+    importer = bulk.BulkImporter(_open_database(args), args.kind, args.chunk_size, progress=_print_progress)
+    with bulk.open_text(args.file, "r") as f:
+        stats = importer.run(bulk.read_records(f, file_format))
+    _print_errors(importer.errors)
+    if args.strict and stats["invalid"]:
+        raise SystemExit(1)
+
+
+def _print_errors(errors):
+    """Report the first invalid records on stderr."""
+    for line_number, error in errors[:MAX_REPORTED_ERRORS]:
+        print(f"line {line_number}: {error}", file=sys.stderr)
+    if len(errors) > MAX_REPORTED_ERRORS:
+        print(f"... and {len(errors) - MAX_REPORTED_ERRORS} more invalid records", file=sys.stderr)
+
+
+def register_users(args):
+    """Register the users of a CSV or JSON Lines file with plain-text passwords."""
+    from .auth.hashing import SETTINGS_FILENAME, PasswordHasher
+    from .auth.provisioning import BulkRegistration
+    from .constants import DATA_DIR
+    from .database import bulk
+
+    def progress(stats):
+        rate = stats["hashed"] / stats["seconds"] if stats["seconds"] else 0
+        print(f"{stats['hashed']} passwords hashed ({rate:.1f}/s)", file=sys.stderr)
+
+    file_format = bulk.detect_format(args.file, args.format)
+    hasher = PasswordHasher(settings_file=Path(args.data_dir or DATA_DIR) / SETTINGS_FILENAME)
+    registration = BulkRegistration(_open_database(args), hasher, args.workers, progress=progress,
+                                    every=args.chunk_size)
+    with bulk.open_text(args.file, "r") as f:
+        stats = registration.run(bulk.read_records(f, file_format))
+    _print_errors(registration.errors)
+    rate = stats["registered"] / stats["seconds"] if stats["seconds"] else 0
+    print(f"{stats['registered']} registered, {stats['skipped']} skipped, {stats['invalid']} invalid "
+          f"in {stats['seconds']:.2f}s ({rate:.1f} users/s; {stats['hash_seconds']:.2f}s reading and hashing "
+          f"at cost {registration.hasher.rounds} in {registration.hasher.workers} process(es))")
+    if args.strict and stats["invalid"]:
+        raise SystemExit(1)
+
+
+def export_records(args):
+    """Stream every record of a kind from the database to a CSV or JSON Lines file."""
+    from .database import bulk
+
+    file_format = bulk.detect_format(args.file, args.format)
+    start = time.perf_counter()
+
+    def progress(count):
+        print(f"{count} exported ({count / (time.perf_counter() - start):.0f} records/s)", file=sys.stderr)
+
+    with bulk.open_text(args.file, "w") as f:
+        count = bulk.write_records(f, file_format, args.kind, bulk.iter_export(_open_database(args), args.kind),
+                                  progress=progress, every=args.chunk_size)
+    elapsed = time.perf_counter() - start
+    print(f"{count} exported in {elapsed:.2f}s ({count / elapsed if elapsed else 0:.0f} records/s)", file=sys.stderr)
+
+
+def fsck(args):
+    """Validate every stored user and task against its schema."""
+    problems = _open_database(args).fsck(args.processes)
+    for problem in problems:
+        print(problem)
+    if problems:
+        print(f"{len(problems)} problem(s) found", file=sys.stderr)
+        raise SystemExit(1)
+    print("No problems found", file=sys.stderr)
+
+
+def calibrate_hashing(args):
+    """Calibrate the bcrypt cost to a target time per hash on this machine and save it.
+
+    The cost never goes below the highest one stored password hashes use.
+    """
+    from .auth import hashing
+    from .constants import DATA_DIR
+
+    users = _open_database(args).get_all_users()
+    stored = hashing.highest_rounds(user.get("password") or "" for user in users.values())
+    rounds = hashing.calibrate(args.target_ms, minimum=stored)
+    settings_file = Path(args.data_dir or DATA_DIR) / hashing.SETTINGS_FILENAME
+    hashing.save_rounds(settings_file, rounds, args.target_ms)
+    elapsed = hashing.time_hash(rounds, repeat=1)
+    print(f"bcrypt cost {rounds}: {elapsed * 1000:.0f} ms per hash (target {args.target_ms:.0f} ms), saved to {settings_file}")
+    print("Passwords hashed with a lower cost are rehashed at their next login", file=sys.stderr)
+
+
+def _session_store(args):
+    """Get the session store of the data directory named on the command line, or the configured one."""
+    from .auth.sessions import SessionStore
+
+    return SessionStore(args.data_dir)
+
+
+def logout(args):
+    """End the session saved by the last login."""
+    from .auth.sessions import clear_token, load_token
+
+    token = load_token()
+    if token and _session_store(args).revoke(token):
+        print("Session ended")
+    else:
+        print("No active session", file=sys.stderr)
+    clear_token()
+
+
+def revoke_sessions(args):
+    """End every session of a user."""
+    count = _session_store(args).revoke_all(args.username)
+    print(f"Ended {count} session(s) of {args.username}")
+
+
+def sweep_sessions(args):
+    """Remove expired sessions."""
+    count = _session_store(args).sweep()
+    print(f"Removed {count} expired session(s)")
+
+
+def _admission(args):
+    """Get the login admission controller of the data directory named on the command line, or the configured one."""
+    from .auth.admission import AdmissionController
+    from .constants import DATA_DIR
+
+    return AdmissionController(Path(args.data_dir or DATA_DIR))
+
+
+def login_stats(args):
+    """Print how many login attempts were admitted and rejected."""
+    for name, value in _admission(args).stats().items():
+        print(f"{name:<22} {value}")
+
+
+def login_reset(args):
+    """Clear the login limits of a user, or every limit and counter."""
+    _admission(args).reset(args.username)
+    print(f"Cleared the login limits of {args.username}" if args.username else "Cleared every login limit and counter")
+
+
+def _add_bulk_arguments(parser, file_help):
+    """Add the arguments shared by import and export."""
+    parser.add_argument("kind", choices=["tasks", "completed", "users"])
+    parser.add_argument("file", help=file_help)
+    parser.add_argument("--format", choices=["csv", "jsonl"], help="File format (default: from the extension)")
+    parser.add_argument("--backend", choices=["json", "sqlite"], help="Database backend (default: configured)")
+    parser.add_argument("--chunk-size", type=int, default=10000, help="Records per transaction and progress report")
+
+
+def build_parser():
+    """Build the command line parser."""
+    parser = argparse.ArgumentParser(prog="python -m tasks")
+    parser.add_argument("--data-dir", help="Directory holding the data files (default: TASKS_DATA_DIR or tasks/data)")
+    subparsers = parser.add_subparsers(dest="command")
+
+    migrate_parser = subparsers.add_parser("migrate-sqlite", help="Import the JSON data files into SQLite")
+    migrate_parser.set_defaults(func=migrate_sqlite)
+
+    convert_parser = subparsers.add_parser("convert-format", help="Rewrite the data files in another format")
+    convert_parser.add_argument("format", choices=["pretty", "compact", "marshal"])
+    convert_parser.set_defaults(func=convert_format)
+
+    import_parser = subparsers.add_parser("import", help="Import records from a CSV or JSON Lines file")
+    _add_bulk_arguments(import_parser, "File to read, or - for stdin")
+    import_parser.add_argument("--strict", action="store_true", help="Exit with an error if any record is invalid")
+    import_parser.set_defaults(func=import_records)
+
+    export_parser = subparsers.add_parser("export", help="Export records to a CSV or JSON Lines file")
+    _add_bulk_arguments(export_parser, "File to write, or - for stdout")
+    export_parser.set_defaults(func=export_records)
+
+    register_parser = subparsers.add_parser("register-users",
+                                            help="Register users from a CSV or JSON Lines file of usernames and passwords")
+    register_parser.add_argument("file", help="File to read, or - for stdin")
+    register_parser.add_argument("--format", choices=["csv", "jsonl"], help="File format (default: from the extension)")
+    register_parser.add_argument("--backend", choices=["json", "sqlite"], help="Database backend (default: configured)")
+    register_parser.add_argument("--workers", type=int, help="Hashing processes (default: HASH_WORKERS)")
+    register_parser.add_argument("--chunk-size", type=int, default=1000, help="Hashes per progress report")
+    register_parser.add_argument("--strict", action="store_true", help="Exit with an error if any record is invalid")
+    register_parser.set_defaults(func=register_users)
+
+    fsck_parser = subparsers.add_parser("fsck", aliases=["validate"], help="Check the stored data against its schemas")
+    fsck_parser.add_argument("--backend", choices=["json", "sqlite"], help="Database backend (default: configured)")
+    fsck_parser.add_argument("--processes", type=int, help="Worker processes (default: one per CPU)")
+    fsck_parser.set_defaults(func=fsck)
+
+    calibrate_parser = subparsers.add_parser("calibrate-hashing", help="Calibrate the bcrypt cost to this machine")
+    calibrate_parser.add_argument("--target-ms", type=float, default=HASH_TARGET_MS,
+                                  help=f"Time one hash should take (default: {HASH_TARGET_MS:.0f})")
+    calibrate_parser.add_argument("--backend", choices=["json", "sqlite"], help="Database backend (default: configured)")
+    calibrate_parser.set_defaults(func=calibrate_hashing)
+
+    logout_parser = subparsers.add_parser("logout", help="End the saved login session")
+    logout_parser.set_defaults(func=logout)
+
+    revoke_parser = subparsers.add_parser("revoke-sessions", help="End every login session of a user")
+    revoke_parser.add_argument("username")
+    revoke_parser.set_defaults(func=revoke_sessions)
+
+    sweep_parser = subparsers.add_parser("sweep-sessions", help="Remove expired login sessions")
+    sweep_parser.set_defaults(func=sweep_sessions)
+
+    login_stats_parser = subparsers.add_parser("login-stats", help="Show admitted and rejected login attempts")
+    login_stats_parser.set_defaults(func=login_stats)
+
+    login_reset_parser = subparsers.add_parser("login-reset", help="Clear login rate limits and backoff")
+    login_reset_parser.add_argument("username", nargs="?", help="User to clear (default: every limit and counter)")
+    login_reset_parser.set_defaults(func=login_reset)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        if args.command:
+            args.func(args)
+            return
+
+        if args.data_dir:
+            from .auth.hashing import SETTINGS_FILENAME, PasswordHasher, set_hasher
+            from .auth.admission import set_admission
+            from .auth.sessions import set_session_store
+            from .database import create_database_manager, set_database
+            set_database(create_database_manager(base_dir=args.data_dir))
+            set_hasher(PasswordHasher(settings_file=Path(args.data_dir) / SETTINGS_FILENAME))
+            set_session_store(_session_store(args))
+            set_admission(_admission(args))
+        task_manager = TaskManager()
+        task_manager.start()
+    except CorruptDocumentError as e:
+        # Refuse to continue rather than treat the file as empty and overwrite it
+        print(f"{e}\nRestore it from a backup (see docs/database.md) before running again.", file=sys.stderr)
+        raise SystemExit(1)
+    except DocumentVersionError as e:
+        print(e, file=sys.stderr)
+        raise SystemExit(1)
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
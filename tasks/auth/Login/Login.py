@@ -1,6 +1,8 @@
 """Login functionality for the task management system."""
 
-import bcrypt
+import math
+
+from ..admission import LoginRejected
 from ..base_auth import BaseAuth
 from ...i18n import language_manager
 
@@ -17,25 +19,48 @@ class Login(BaseAuth):
             if not password_input:
                 return None
 
-            user_data = self.db.get_user(username_input)
-            if user_data:
-                stored_password = user_data["password"]
-                if self.verify_password(password_input, stored_password):
-                    print(language_manager.get_text("LOGIN_SUCCESS").format(username_input))
-                    return username_input
-                else:
-                    print(language_manager.get_text("LOGIN_FAILED"))
-            else:
-                print(language_manager.get_text("LOGIN_FAILED"))
+            try:
+                if self.admission is not None:
+                    self.admission.admit(username_input)
+                user_data = self.db.get_user(username_input)
+                verified = bool(user_data) and self._verify_admitted(password_input, user_data["password"])
+            except LoginRejected as e:
+                print(language_manager.get_text("LOGIN_THROTTLED").format(math.ceil(e.retry_after)))
+                return None
+            if self.admission is not None:
+                self.admission.record(username_input, verified)
+
+            if verified:
+                self._upgrade_hash(username_input, user_data, password_input)
+                print(language_manager.get_text("LOGIN_SUCCESS").format(username_input))
+                return username_input
+            print(language_manager.get_text("LOGIN_FAILED"))
 
         except Exception as e:
             print(language_manager.get_text("ERROR_UNEXPECTED").format(str(e)))
         return None
 
+    def _verify_admitted(self, password, hashed_password):
+        """Verify a password in one of the admission controller's in-flight slots."""
+        if self.admission is None:
+            return self.verify_password(password, hashed_password)
+        with self.admission.verifying():
+            return self.verify_password(password, hashed_password)
+
     def verify_password(self, password, hashed_password):
         """Verify the password against the hashed password."""
         try:
-            return bcrypt.checkpw(password.encode(), hashed_password.encode())
+            return self.hasher.verify(password, hashed_password)
         except Exception as e:
             print(language_manager.get_text("ERROR_UNEXPECTED").format(f"Error verifying password: {str(e)}"))
-            return False
\ No newline at end of file
+            return False
+
+    def _upgrade_hash(self, username, user_data, password):
+        """Store a new hash of a just verified password if it was hashed with a lower cost than configured."""
+        if not self.hasher.needs_rehash(user_data["password"]):
+            return
+        try:
+            self.db.save_user(username, dict(user_data, password=self.hasher.hash(password)))
+        except Exception:
+            # The old hash still works; it is upgraded on a later login
+            pass
\ No newline at end of file
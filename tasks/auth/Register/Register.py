@@ -1,6 +1,5 @@
 """Registration functionality for the task management system."""
 
-import bcrypt
 from ..base_auth import BaseAuth
 from ...i18n import language_manager
 
@@ -25,16 +24,13 @@ class Register(BaseAuth):
 
             # Hash password
             try:
-                hashed_password = bcrypt.hashpw(password_input.encode(), bcrypt.gensalt()).decode()
+                hashed_password = self.hasher.hash(password_input)
             except Exception as e:
                 print(language_manager.get_text("ERROR_UNEXPECTED").format(f"Error hashing password: {str(e)}"))
                 return None
 
             # Generate user ID
-            existing_users = self.db.get_all_users()
-            user_id = 1
-            while any(user_info.get("userid") == user_id for user_info in existing_users.values()):
-                user_id += 1
+            user_id = self.db.allocate_user_id()
 
             # Save user
             user_data = {"userid": user_id, "password": hashed_password}
@@ -1,8 +1,14 @@
 """Authentication package for the task management system."""
 
+from .admission import AdmissionController, LoginRejected, get_admission, set_admission
 from .auth import Auth
 from .base_auth import BaseAuth
+from .hashing import PasswordHasher, get_hasher, set_hasher
 from .Login.Login import Login
+from .provisioning import BulkRegistration
 from .Register.Register import Register
+from .sessions import SessionStore, get_session_store, set_session_store
 
-__all__ = ['Auth', 'BaseAuth', 'Login', 'Register']
\ No newline at end of file
+__all__ = ['Auth', 'BaseAuth', 'Login', 'Register', 'PasswordHasher', 'get_hasher', 'set_hasher',
+           'SessionStore', 'get_session_store', 'set_session_store',
+           'AdmissionController', 'LoginRejected', 'get_admission', 'set_admission', 'BulkRegistration']
\ No newline at end of file
@@ -0,0 +1,320 @@
+"""Login admission control.
+
+Every login attempt costs a full bcrypt verification, so a burst of failed or
+scripted logins can occupy every core. Attempts pass three checks before their
+password is verified, and are rejected with a retry delay otherwise:
+
+- a token bucket per username (LOGIN_USER_RATE attempts per second, bursts of
+  LOGIN_USER_BURST) and one for all logins (LOGIN_GLOBAL_RATE, LOGIN_GLOBAL_BURST)
+- progressive backoff: after LOGIN_FREE_FAILURES failures in a row, a username
+  is refused for LOGIN_BACKOFF_BASE seconds, doubling with every further
+  failure up to LOGIN_BACKOFF_MAX; a successful login resets it
+- at most LOGIN_MAX_INFLIGHT verifications run at once; an attempt waits up to
+  LOGIN_QUEUE_TIMEOUT seconds for a free slot
+
+Limits that one caller could exhaust for everybody are kept per source, the
+local account an attempt comes from by default: username buckets and backoff
+count a username's attempts from one source, and no source may use more than
+LOGIN_SOURCE_SHARE of the global bucket. Someone failing logins for a user
+slows themselves down, not that user.
+
+Each CLI start is its own process, so the state is shared through the data
+directory: buckets, failures and counters live in admission.json, updated
+under its file lock, and the in-flight slots are lock files in login-slots/
+that are released even if their process dies. Without a state directory
+(in-memory databases, tests) the state is kept in the controller.
+"""
+
+import getpass
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional
+
+from ..constants import (
+    DATA_DIR, DATABASE_BACKEND, LOCK_TIMEOUT, LOGIN_BACKOFF_BASE, LOGIN_BACKOFF_MAX, LOGIN_FREE_FAILURES,
+    LOGIN_GLOBAL_BURST, LOGIN_GLOBAL_RATE, LOGIN_MAX_INFLIGHT, LOGIN_QUEUE_TIMEOUT, LOGIN_SOURCE_SHARE,
+    LOGIN_USER_BURST, LOGIN_USER_RATE
+)
+from ..database.locking import DocumentLock
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+STATE_FILENAME = "admission.json"
+SLOTS_DIRNAME = "login-slots"
+MAX_TRACKED_USERS = 10000  # idle usernames beyond this are forgotten first
+POLL_INTERVAL = 0.01
+
+COUNTERS = ("admitted", "succeeded", "failed", "rejected_user_rate", "rejected_source_rate",
+            "rejected_global_rate", "rejected_backoff", "rejected_busy")
+
+
+class LoginRejected(Exception):
+    """Raised when a login attempt is refused before its password is checked."""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(f"Login attempt rejected ({reason}); retry in {retry_after:.1f}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def local_source() -> str:
+    """Identify the local account login attempts come from."""
+    try:
+        return f"uid:{os.getuid()}"
+    except AttributeError:  # Windows
+        return f"user:{getpass.getuser()}"
+
+
+def _empty_state() -> Dict[str, Any]:
+    return {"global": None, "sources": {}, "users": {}, "failures": {}, "counters": dict.fromkeys(COUNTERS, 0)}
+
+
+def _take(bucket: Optional[list], rate: float, burst: float, now: float):
+    """Take a token from a [tokens, updated] bucket, refilled since it was last used.
+
+    Returns:
+        The updated bucket, and the seconds until a token is available or 0 if one was taken
+    """
+    tokens, updated = bucket if bucket else (burst, now)
+    tokens = min(burst, tokens + max(0.0, now - updated) * rate)
+    if tokens >= 1:
+        return [tokens - 1, now], 0.0
+    return [tokens, now], (1 - tokens) / rate if rate > 0 else math.inf
+
+
+class AdmissionController:
+    def __init__(self, state_dir: Optional[Path] = None, user_rate: Optional[float] = None,
+                 user_burst: Optional[float] = None, global_rate: Optional[float] = None,
+                 global_burst: Optional[float] = None, max_inflight: Optional[int] = None,
+                 queue_timeout: Optional[float] = None, free_failures: Optional[int] = None,
+                 backoff_base: Optional[float] = None, backoff_max: Optional[float] = None,
+                 source_share: Optional[float] = None):
+        """Initialize login admission control; every limit defaults to its LOGIN_* constant.
+
+        Args:
+            state_dir: Directory sharing the state between processes, usually the data directory; None keeps it here
+            user_rate: Attempts per second each username is allowed
+            user_burst: Attempts a username may make at once
+            global_rate: Attempts per second allowed for all usernames together
+            global_burst: Attempts all usernames together may make at once
+            max_inflight: Password verifications running at once
+            queue_timeout: Seconds an attempt waits for a verification slot
+            free_failures: Failures in a row before backoff starts
+            backoff_base: First backoff in seconds; doubled with every further failure
+            backoff_max: Longest backoff in seconds
+            source_share: Fraction of the global rate and burst one source may use
+        """
+        self.state_dir = Path(state_dir) if state_dir is not None else None
+        self.user_rate = user_rate or LOGIN_USER_RATE
+        self.user_burst = user_burst or LOGIN_USER_BURST
+        self.global_rate = global_rate or LOGIN_GLOBAL_RATE
+        self.global_burst = global_burst or LOGIN_GLOBAL_BURST
+        self.max_inflight = max_inflight or LOGIN_MAX_INFLIGHT
+        self.queue_timeout = LOGIN_QUEUE_TIMEOUT if queue_timeout is None else queue_timeout
+        self.free_failures = LOGIN_FREE_FAILURES if free_failures is None else free_failures
+        self.backoff_base = backoff_base or LOGIN_BACKOFF_BASE
+        self.backoff_max = backoff_max or LOGIN_BACKOFF_MAX
+        self.source_share = source_share or LOGIN_SOURCE_SHARE
+        self._state = _empty_state()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_inflight)
+        self._state_lock = None
+        if self.state_dir is not None:
+            self.state_file = self.state_dir / STATE_FILENAME
+            self.slots_dir = self.state_dir / SLOTS_DIRNAME
+            self._state_lock = DocumentLock(self.state_file, LOCK_TIMEOUT)
+
+    # Shared state
+    @contextmanager
+    def _shared_state(self, save: bool = True) -> Iterator[Dict[str, Any]]:
+        """Hold the admission state for a read-modify-write, loaded from and saved to the state file if shared.
+
+        The state is saved even if the block raises, so rejections are counted.
+        """
+        with self._lock:
+            if self._state_lock is None:
+                yield self._state
+                return
+            self.state_dir.mkdir(parents=True, exist_ok=True)
+            with self._state_lock.acquire(exclusive=save):
+                try:
+                    with open(self.state_file, 'r') as f:
+                        state = {**_empty_state(), **json.load(f)}
+                except (OSError, ValueError, TypeError):
+                    state = _empty_state()  # missing or torn: limits start over, which only admits more
+                try:
+                    yield state
+                finally:
+                    if save:
+                        temp_path = self.state_file.with_name(f"{self.state_file.name}.{os.getpid()}.tmp")
+                        with open(temp_path, 'w') as f:
+                            json.dump(state, f)
+                        os.replace(temp_path, self.state_file)
+
+    def _forget_idle(self, state: Dict[str, Any], now: float):
+        """Drop the buckets and failures that no longer limit anything, once too many usernames are tracked."""
+        users, sources, failures = state["users"], state["sources"], state["failures"]
+        if len(users) + len(sources) + len(failures) <= MAX_TRACKED_USERS:
+            return
+        for buckets, rate, burst in ((users, self.user_rate, self.user_burst),
+                                     (sources, self.global_rate * self.source_share,
+                                      self.global_burst * self.source_share)):
+            for key, (tokens, updated) in list(buckets.items()):
+                if tokens + (now - updated) * rate >= burst:
+                    del buckets[key]
+        for key, (count, last) in list(failures.items()):
+            if now - last > 2 * self.backoff_max:
+                del failures[key]
+
+    def _backoff(self, failures: int) -> float:
+        """Seconds a username is refused after some failures in a row."""
+        if failures < self.free_failures or failures == 0:
+            return 0.0
+        return min(self.backoff_max, self.backoff_base * 2 ** (failures - max(self.free_failures, 1)))
+
+    # Public API
+    def admit(self, username: str, source: Optional[str] = None):
+        """Let a login attempt proceed, taking a token from each of its buckets.
+
+        Args:
+            username: The username being logged in to
+            source: Who is attempting it (local_source() by default)
+
+        Raises:
+            LoginRejected: If the username is backing off for the source, or a bucket is empty
+        """
+        key = f"{source or local_source()}/{username}"
+        source = key[:-len(username) - 1]
+        now = time.time()
+        with self._shared_state() as state:
+            counters = state["counters"]
+            count, last = state["failures"].get(key, (0, now))
+            if now - last > 2 * self.backoff_max:
+                count = 0  # failures long ago are forgotten
+                state["failures"].pop(key, None)
+            wait = last + self._backoff(count) - now
+            if wait > 0:
+                counters["rejected_backoff"] += 1
+                raise LoginRejected("backoff", wait)
+
+            # Tokens are only taken once every bucket has one
+            user_bucket, wait = _take(state["users"].get(key), self.user_rate, self.user_burst, now)
+            if wait > 0:
+                counters["rejected_user_rate"] += 1
+                raise LoginRejected("user rate", wait)
+            source_bucket, wait = _take(state["sources"].get(source), self.global_rate * self.source_share,
+                                        self.global_burst * self.source_share, now)
+            if wait > 0:
+                counters["rejected_source_rate"] += 1
+                raise LoginRejected("source rate", wait)
+            global_bucket, wait = _take(state["global"], self.global_rate, self.global_burst, now)
+            if wait > 0:
+                counters["rejected_global_rate"] += 1
+                raise LoginRejected("global rate", wait)
+            state["users"][key], state["sources"][source], state["global"] = user_bucket, source_bucket, global_bucket
+            counters["admitted"] += 1
+            self._forget_idle(state, now)
+
+    def _try_slot(self) -> Optional[int]:
+        """Take a free in-flight slot shared with other processes, returning its file descriptor."""
+        self.slots_dir.mkdir(parents=True, exist_ok=True)
+        for slot in range(self.max_inflight):
+            fd = os.open(self.slots_dir / f"slot-{slot}.lock", os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return fd
+            except BlockingIOError:
+                os.close(fd)
+        return None
+
+    @contextmanager
+    def verifying(self):
+        """Hold one of the in-flight slots while a password is verified.
+
+        Raises:
+            LoginRejected: If no slot frees up within the queue timeout
+        """
+        deadline = time.monotonic() + self.queue_timeout
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            self._count("rejected_busy")
+            raise LoginRejected("busy", POLL_INTERVAL * 10)
+        fd = None
+        try:
+            if self._state_lock is not None and fcntl is not None:
+                fd = self._try_slot()
+                while fd is None:
+                    if time.monotonic() >= deadline:
+                        self._count("rejected_busy")
+                        raise LoginRejected("busy", POLL_INTERVAL * 10)
+                    time.sleep(POLL_INTERVAL)
+                    fd = self._try_slot()
+            yield
+        finally:
+            if fd is not None:
+                os.close(fd)  # releases the flock
+            self._slots.release()
+
+    def record(self, username: str, success: bool, source: Optional[str] = None):
+        """Record the outcome of an admitted attempt: a success resets the backoff of the username and source."""
+        key = f"{source or local_source()}/{username}"
+        with self._shared_state() as state:
+            if success:
+                state["counters"]["succeeded"] += 1
+                state["failures"].pop(key, None)
+            else:
+                state["counters"]["failed"] += 1
+                count, _ = state["failures"].get(key, (0, 0))
+                state["failures"][key] = [count + 1, time.time()]
+
+    def _count(self, counter: str):
+        with self._shared_state() as state:
+            state["counters"][counter] += 1
+
+    def stats(self) -> Dict[str, int]:
+        """Get the attempt counters: admitted and rejected by reason, and the outcomes of admitted ones."""
+        with self._shared_state(save=False) as state:
+            counters = dict(state["counters"])
+            counters["rejected"] = sum(counters[name] for name in COUNTERS if name.startswith("rejected_"))
+            counters["backing_off"] = sum(
+                1 for count, last in state["failures"].values() if last + self._backoff(count) > time.time()
+            )
+            return counters
+
+    def reset(self, username: Optional[str] = None):
+        """Clear the limits of one username from every source, or all limits and counters."""
+        with self._shared_state() as state:
+            if username is None:
+                state.clear()
+                state.update(_empty_state())
+                return
+            for tracked in (state["users"], state["failures"]):
+                for key in [key for key in tracked if key.endswith(f"/{username}")]:
+                    del tracked[key]
+
+
+_admission: Optional[AdmissionController] = None
+_admission_lock = threading.Lock()
+
+
+def get_admission() -> AdmissionController:
+    """Get the process-wide admission controller, sharing its state through DATA_DIR unless nothing is stored on disk."""
+    global _admission
+    with _admission_lock:
+        if _admission is None:
+            _admission = AdmissionController(DATA_DIR if DATABASE_BACKEND != "memory" else None)
+        return _admission
+
+
+def set_admission(admission: AdmissionController):
+    """Replace the process-wide admission controller, e.g. with one for another data directory."""
+    global _admission
+    with _admission_lock:
+        _admission = admission
@@ -2,11 +2,62 @@
 
 from .Register.Register import Register
 from .Login.Login import Login
+from .sessions import clear_token, get_session_store, load_token, save_token
+from ..constants import SESSIONS_ENABLED
+from ..database.backends import get_database
 from ..i18n import language_manager
 from ..utils import print_with_clear
 
 
 class Auth:
+    def __init__(self, db=None, sessions=None):
+        """Initialize authentication.
+
+        Args:
+            db: Database manager to share; defaults to the shared one
+            sessions: SessionStore remembering logins; defaults to the shared one, None if SESSIONS_ENABLED is off
+        """
+        self.db = db
+        self.sessions = sessions or (get_session_store() if SESSIONS_ENABLED else None)
+
+    def _remembers_logins(self):
+        """Check whether logins are remembered: sessions are enabled and the users outlive this process."""
+        return self.sessions is not None and getattr(self.db or get_database(), "persistent", True)
+
+    def resume_session(self):
+        """Resume the session saved by an earlier login, skipping the password.
+
+        Returns:
+            The username, or None if there is no valid session or its user no longer exists
+        """
+        if not self._remembers_logins():
+            return None
+        token = load_token()
+        username = self.sessions.verify(token) if token else None
+        if username is None or (self.db or get_database()).get_user_id(username) is None:
+            return None
+        return username
+
+    def start_session(self, username):
+        """Remember a successful login for the next start; failing to only costs a password prompt."""
+        if not self._remembers_logins():
+            return
+        try:
+            save_token(self.sessions.issue(username))
+        except OSError:
+            pass
+
+    def logout(self):
+        """End the saved session, so the next start asks for the password again."""
+        token = load_token()
+        if token and self.sessions is not None:
+            try:
+                self.sessions.revoke(token)
+            except OSError:
+                # The token file is removed below, which ends the session on this machine anyway
+                pass
+        clear_token()
+
     def welcome(self):
         """Handle user authentication choice and process."""
         print_with_clear(language_manager.get_text("AUTH_WELCOME"))
@@ -15,16 +66,18 @@ class Auth:
         # Handle registration
         if user_choice in ["r", "register", "new", "create"]:
             print_with_clear(language_manager.get_text("AUTH_REGISTER_START"))
-            registered_username = Register().register()
+            registered_username = Register(self.db).register()
             if registered_username:
+                self.start_session(registered_username)
                 return True, registered_username
             print(language_manager.get_text("AUTH_REGISTER_FAILED"))
 
         # Handle login
         elif user_choice in ["l", "login", "existing", "old"]:
             print_with_clear(language_manager.get_text("AUTH_LOGIN_START"))
-            logged_in_username = Login().login()
+            logged_in_username = Login(self.db).login()
             if logged_in_username:
+                self.start_session(logged_in_username)
                 return True, logged_in_username
             print(language_manager.get_text("AUTH_LOGIN_FAILED"))
 
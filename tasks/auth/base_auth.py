@@ -1,13 +1,25 @@
 """Base class for authentication operations."""
 
-from ..database.db_manager import DatabaseManager
+from .admission import get_admission
+from .hashing import get_hasher
+from ..constants import LOGIN_ADMISSION
+from ..database.backends import get_database
 from ..i18n import language_manager
 
 
 class BaseAuth:
-    def __init__(self):
-        """Initialize base authentication with database manager."""
-        self.db = DatabaseManager()
+    def __init__(self, db=None, hasher=None, admission=None):
+        """Initialize base authentication with database manager.
+
+        Args:
+            db: Database manager to use; defaults to the shared one
+            hasher: PasswordHasher to use; defaults to the shared one
+            admission: AdmissionController limiting login attempts; defaults to the shared one, None if
+                LOGIN_ADMISSION is off
+        """
+        self.db = db or get_database()
+        self.hasher = hasher or get_hasher()
+        self.admission = admission or (get_admission() if LOGIN_ADMISSION else None)
 
     def get_user_input(self, prompt):
         """Get validated user input."""
@@ -0,0 +1,209 @@
+"""Password hashing service.
+
+bcrypt is slow on purpose, and its cost doubles with every round. The service
+keeps that cost off the caller's hands:
+
+- the cost is configured (BCRYPT_ROUNDS) or calibrated so one hash takes about
+  HASH_TARGET_MS on this machine; the calibrated cost is saved next to the data
+  files and recomputed with `python -m tasks calibrate-hashing`
+- hashes run in a bounded pool of HASH_WORKERS threads (bcrypt releases the
+  GIL) or processes, so concurrent logins use several cores and callers such
+  as an event loop are never blocked
+- hashes made with a lower cost are reported by needs_rehash, so a login can
+  store a stronger hash while it still knows the password; a hash is never
+  replaced by a weaker one
+"""
+
+import asyncio
+import json
+import math
+import threading
+import time
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterable, Optional, Tuple
+
+import bcrypt
+
+from ..constants import BCRYPT_ROUNDS, DATA_DIR, HASH_POOL, HASH_TARGET_MS, HASH_WORKERS
+
+MIN_ROUNDS = 12  # calibration never goes below bcrypt's default cost, however slow the machine
+MAX_ROUNDS = 31  # bcrypt's limit
+PROBE_ROUNDS = 8  # cost timed to extrapolate the others
+SETTINGS_FILENAME = "hashing.json"
+
+
+def hash_password(password: str, rounds: int) -> str:
+    """Hash a password with a new salt at the given cost."""
+    return bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds)).decode()
+
+
+def check_password(password: str, hashed: str) -> bool:
+    """Check a password against a bcrypt hash; a malformed hash never matches."""
+    try:
+        return bcrypt.checkpw(password.encode(), hashed.encode())
+    except ValueError:
+        return False
+
+
+def hash_rounds(hashed: str) -> Optional[int]:
+    """Get the cost a bcrypt hash was made with, or None if it is not a bcrypt hash."""
+    parts = hashed.split("$")
+    if len(parts) != 4 or not parts[2].isdigit():
+        return None
+    return int(parts[2])
+
+
+def highest_rounds(hashes: Iterable[str]) -> int:
+    """Get the highest cost among bcrypt hashes, 0 if there are none."""
+    return max((hash_rounds(hashed) or 0 for hashed in hashes), default=0)
+
+
+def time_hash(rounds: int, repeat: int = 3) -> float:
+    """Seconds one hash takes at a cost, the fastest of a few runs."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        hash_password("calibration", rounds)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def calibrate(target_ms: float = HASH_TARGET_MS, minimum: int = 0) -> int:
+    """Find the highest cost whose hash takes at most target_ms here, but at least MIN_ROUNDS.
+
+    One cheap cost is timed and the others extrapolated, since each round
+    doubles the work; the chosen cost is then timed once to confirm it.
+
+    Args:
+        target_ms: Time one hash should take
+        minimum: Lowest cost to choose, e.g. the highest one stored hashes use
+    """
+    floor = min(MAX_ROUNDS, max(MIN_ROUNDS, minimum))
+    probe = time_hash(PROBE_ROUNDS)
+    rounds = PROBE_ROUNDS + math.floor(math.log2(target_ms / 1000 / probe))
+    rounds = max(floor, min(MAX_ROUNDS, rounds))
+    if rounds > floor and time_hash(rounds, repeat=1) * 1000 > target_ms:
+        rounds -= 1
+    return rounds
+
+
+def save_rounds(settings_file: Path, rounds: int, target_ms: float):
+    """Save a calibrated cost for later starts."""
+    settings_file.parent.mkdir(parents=True, exist_ok=True)
+    with open(settings_file, 'w') as f:
+        json.dump({"rounds": rounds, "target_ms": target_ms}, f, indent=4)
+
+
+class PasswordHasher:
+    def __init__(self, rounds: Optional[int] = None, workers: Optional[int] = None, pool: Optional[str] = None,
+                 settings_file: Optional[Path] = None):
+        """Initialize the hashing service.
+
+        Args:
+            rounds: bcrypt cost; BCRYPT_ROUNDS, else the saved calibration, else calibrated now and saved
+            workers: Hashes running at once (HASH_WORKERS by default)
+            pool: "thread" or "process" (HASH_POOL by default)
+            settings_file: Where the calibrated cost is saved (hashing.json in DATA_DIR by default)
+        """
+        self.settings_file = settings_file or DATA_DIR / SETTINGS_FILENAME
+        self.workers = workers or HASH_WORKERS
+        self.pool = (pool or HASH_POOL).lower()
+        if self.pool not in ("thread", "process"):
+            raise ValueError(f"Unknown hashing pool: {self.pool}")
+        self.rounds = rounds or BCRYPT_ROUNDS or self._saved_rounds() or self.calibrate()
+        self._executor: Optional[Executor] = None
+        self._lock = threading.Lock()
+
+    def _saved_rounds(self) -> Optional[int]:
+        """Get the cost saved by an earlier calibration."""
+        try:
+            with open(self.settings_file, 'r') as f:
+                return int(json.load(f)["rounds"])
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def calibrate(self, target_ms: float = HASH_TARGET_MS, minimum: int = 0) -> int:
+        """Calibrate the cost to a target time per hash, but at least minimum; use it from now on and save it."""
+        self.rounds = calibrate(target_ms, minimum)
+        try:
+            save_rounds(self.settings_file, self.rounds, target_ms)
+        except OSError:
+            # Calibrated again on the next start
+            pass
+        return self.rounds
+
+    def _pool(self) -> Executor:
+        """Get the worker pool, started on first use."""
+        with self._lock:
+            if self._executor is None:
+                if self.pool == "process":
+                    self._executor = ProcessPoolExecutor(self.workers)
+                else:
+                    self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="tasks-hash")
+            return self._executor
+
+    def close(self):
+        """Stop the worker pool; it is started again if the service is used afterwards."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def submit_hash(self, password: str) -> Future:
+        """Start hashing a password in the pool."""
+        return self._pool().submit(hash_password, password, self.rounds)
+
+    def submit_verify(self, password: str, hashed: str) -> Future:
+        """Start checking a password in the pool."""
+        return self._pool().submit(check_password, password, hashed)
+
+    def hash(self, password: str) -> str:
+        """Hash a password at the configured cost."""
+        return self.submit_hash(password).result()
+
+    def verify(self, password: str, hashed: str) -> bool:
+        """Check a password against a stored hash."""
+        return self.submit_verify(password, hashed).result()
+
+    async def hash_async(self, password: str) -> str:
+        """Hash a password without blocking the event loop."""
+        return await asyncio.wrap_future(self.submit_hash(password))
+
+    async def verify_async(self, password: str, hashed: str) -> bool:
+        """Check a password without blocking the event loop."""
+        return await asyncio.wrap_future(self.submit_verify(password, hashed))
+
+    def needs_rehash(self, hashed: str) -> bool:
+        """Check whether a stored hash was made with a lower cost than the configured one."""
+        return (hash_rounds(hashed) or 0) < self.rounds
+
+    def verify_and_update(self, password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+        """Check a password and, if it matches a hash of a lower cost, hash it again.
+
+        Returns:
+            Whether the password matches, and the hash to store instead or None
+        """
+        if not self.verify(password, hashed):
+            return False, None
+        return True, self.hash(password) if self.needs_rehash(hashed) else None
+
+
+_hasher: Optional[PasswordHasher] = None
+_hasher_lock = threading.Lock()
+
+
+def get_hasher() -> PasswordHasher:
+    """Get the process-wide hashing service, creating it on first use."""
+    global _hasher
+    with _hasher_lock:
+        if _hasher is None:
+            _hasher = PasswordHasher()
+        return _hasher
+
+
+def set_hasher(hasher: PasswordHasher):
+    """Replace the process-wide hashing service, e.g. with one using another cost."""
+    global _hasher
+    with _hasher_lock:
+        _hasher = hasher
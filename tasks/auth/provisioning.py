@@ -0,0 +1,135 @@
+"""Bulk user registration.
+
+Registering users one at a time hashes each password inline, and with the
+JSON backend commits every user on its own. BulkRegistration creates many
+accounts from records with plain-text passwords (as read by
+database.bulk.read_records) in one pass:
+
+- records are validated and checked against the usernames already taken,
+  held in one set, so a bad or duplicate record never costs a hash
+- passwords are hashed across a process pool, every core running bcrypt
+- user IDs are allocated as one block
+- every new user is saved in a single commit
+
+Nothing is written if hashing or the commit fails, so a run can be repeated:
+users it already registered are skipped.
+"""
+
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from .hashing import PasswordHasher, get_hasher
+from ..database.bulk import DEFAULT_CHUNK_SIZE
+
+MAX_PASSWORD_BYTES = 72  # bcrypt refuses longer passwords
+
+
+def validate_registration(record: Dict[str, Any]) -> Tuple[str, str]:
+    """Check a user record with a plain-text password.
+
+    Returns:
+        The username and the password
+
+    Raises:
+        ValueError: If a field is missing or invalid
+    """
+    username, password = record.get("username"), record.get("password")
+    if not isinstance(username, str) or not username or username != username.strip():
+        raise ValueError("username is required and must not start or end with spaces")
+    if not isinstance(password, str) or not password:
+        raise ValueError("password is required")
+    if len(password.encode()) > MAX_PASSWORD_BYTES:
+        raise ValueError(f"password must be at most {MAX_PASSWORD_BYTES} bytes")
+    return username, password
+
+
+class BulkRegistration:
+    def __init__(self, db, hasher: Optional[PasswordHasher] = None, workers: Optional[int] = None,
+                 progress: Optional[Callable[[Dict[str, Any]], None]] = None, every: int = DEFAULT_CHUNK_SIZE):
+        """Initialize a bulk registration into a database.
+
+        Args:
+            db: The database manager to register the users in (either backend)
+            hasher: Service whose cost the passwords are hashed at (the process-wide one by default);
+                they are hashed in a process pool of its size, or of workers processes
+            workers: Hashing processes
+            progress: Called with the statistics every `every` hashes and at the end
+            every: Hashes between progress reports
+        """
+        self.db = db
+        hasher = hasher or get_hasher()
+        self.hasher = PasswordHasher(rounds=hasher.rounds, workers=workers or hasher.workers, pool="process")
+        self.progress = progress
+        self.every = every
+        self.errors: List[Tuple[int, str]] = []
+        self.stats = {"read": 0, "hashed": 0, "registered": 0, "skipped": 0, "invalid": 0,
+                      "seconds": 0.0, "hash_seconds": 0.0}
+        self._start = 0.0
+
+    def run(self, records: Iterable[Tuple[int, Optional[Dict[str, Any]], Optional[str]]]) -> Dict[str, Any]:
+        """Register the users of records as returned by read_records.
+
+        Returns:
+            The statistics: records read, passwords hashed, users registered,
+            skipped (usernames already taken) and invalid, and the seconds taken
+            in all and until the last password was hashed
+
+        Raises:
+            OSError: If the users could not be saved
+        """
+        self._start = time.perf_counter()
+        try:
+            # Records are validated while the first passwords are already hashing
+            users = self._collect(self._submit(records))
+            self.stats["hash_seconds"] = time.perf_counter() - self._start
+            if users:
+                first_id = self.db.allocate_user_id(count=len(users))
+                for offset, user in enumerate(users.values()):
+                    user["userid"] = first_id + offset
+                with self.db.transaction():
+                    if not self.db.save_users(users):
+                        raise OSError("Failed to save users")
+            self.stats["registered"] = len(users)
+        finally:
+            self.hasher.close()
+        self._report()
+        return self.stats
+
+    def _submit(self, records: Iterable[Tuple[int, Optional[Dict[str, Any]], Optional[str]]]
+                ) -> List[Tuple[str, Future]]:
+        """Validate records and start hashing the passwords of the new users."""
+        taken = set(self.db.get_all_users())
+        pending = []
+        for line_number, record, error in records:
+            self.stats["read"] += 1
+            if error is None:
+                try:
+                    username, password = validate_registration(record)
+                except ValueError as e:
+                    error = str(e)
+            if error is not None:
+                self.stats["invalid"] += 1
+                self.errors.append((line_number, error))
+            elif username in taken:
+                self.stats["skipped"] += 1
+            else:
+                taken.add(username)
+                pending.append((username, self.hasher.submit_hash(password)))
+        return pending
+
+    def _collect(self, pending: List[Tuple[str, Future]]) -> Dict[str, Dict[str, Any]]:
+        """Wait for the hashes, in the order of the records."""
+        users = {}
+        for username, future in pending:
+            users[username] = {"password": future.result()}
+            self.stats["hashed"] += 1
+            if self.stats["hashed"] % self.every == 0:
+                self._report()
+        return users
+
+    def _report(self):
+        """Update the elapsed time and call the progress callback."""
+        self.stats["seconds"] = time.perf_counter() - self._start
+        if self.progress is not None:
+            self.progress(self.stats)
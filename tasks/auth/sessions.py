@@ -0,0 +1,275 @@
+"""Login sessions.
+
+A successful login issues a session token, so later starts skip the password
+and its bcrypt verification. A token is `<payload>.<signature>`: the payload
+names the user, the session and its expiry, and the signature is an
+HMAC-SHA256 over it with a secret kept in the data directory. Checking a token
+costs one HMAC and one small file read, microseconds instead of a hash.
+
+The store also keeps the live sessions of every user in sessions/, one small
+file per user mapping session ids to their expiry, so a session can be
+revoked before it expires:
+
+- revoke ends one session, revoke_all every session of a user
+- replacing session.key ends every session of every user
+- expired sessions are dropped whenever their user's file is written, and
+  sweep (`python -m tasks sweep-sessions`) removes the rest
+
+The client keeps its token in SESSION_FILE (~/.tasks_session by default),
+readable only by its owner.
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+from ..constants import DATA_DIR, DATABASE_FSYNC, LOCK_TIMEOUT, SESSION_FILE, SESSION_TTL
+from ..database.durability import Durability
+from ..database.locking import DocumentLock
+
+SECRET_FILENAME = "session.key"
+SESSIONS_DIRNAME = "sessions"
+SECRET_BYTES = 32
+
+
+def _encode(data: bytes) -> str:
+    """Encode bytes as unpadded URL-safe base64."""
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _decode(text: str) -> bytes:
+    """Decode unpadded URL-safe base64."""
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def _write_private(file_path: Path, content: bytes):
+    """Replace a file with contents only its owner can read."""
+    temp_path = file_path.with_name(f"{file_path.name}.{os.getpid()}.tmp")
+    try:
+        fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+        os.replace(temp_path, file_path)
+    except BaseException:
+        temp_path.unlink(missing_ok=True)
+        raise
+
+
+class SessionStore:
+    def __init__(self, base_dir: Optional[Path] = None, ttl: Optional[float] = None):
+        """Initialize the session store of a data directory.
+
+        Args:
+            base_dir: Data directory holding session.key and sessions/ (DATA_DIR by default)
+            ttl: Seconds a session lasts (SESSION_TTL by default)
+        """
+        self.base_dir = Path(base_dir or DATA_DIR)
+        self.directory = self.base_dir / SESSIONS_DIRNAME
+        self.ttl = ttl or SESSION_TTL
+        self._secret: Optional[bytes] = None
+        self._durability = Durability(DATABASE_FSYNC)
+        self._write_lock = DocumentLock(self.directory, LOCK_TIMEOUT)  # sessions.lock next to the directory
+        self._lock = threading.Lock()
+
+    # Secret and signatures
+    def _key(self) -> bytes:
+        """Get the signing secret, created on first use."""
+        if self._secret is None:
+            secret_file = self.base_dir / SECRET_FILENAME
+            try:
+                secret = secret_file.read_bytes()
+            except FileNotFoundError:
+                secret = b""
+            if len(secret) != SECRET_BYTES:
+                self.base_dir.mkdir(parents=True, exist_ok=True)
+                with self._write_lock.acquire(exclusive=True):
+                    try:
+                        secret = secret_file.read_bytes()  # another process may have just created it
+                    except FileNotFoundError:
+                        secret = b""
+                    if len(secret) != SECRET_BYTES:
+                        secret = secrets.token_bytes(SECRET_BYTES)
+                        _write_private(secret_file, secret)
+            self._secret = secret
+        return self._secret
+
+    def _sign(self, payload: str) -> str:
+        """Get the signature of an encoded payload."""
+        return _encode(hmac.new(self._key(), payload.encode("ascii"), hashlib.sha256).digest())
+
+    def _claims(self, token: str) -> Optional[dict]:
+        """Get the payload of a token with a valid signature that has not expired."""
+        payload, _, signature = token.strip().partition(".")
+        try:
+            if not payload or not hmac.compare_digest(signature.encode("ascii"), self._sign(payload).encode("ascii")):
+                return None
+            claims = json.loads(_decode(payload))
+        except ValueError:  # not ASCII or not base64-encoded JSON
+            return None
+        if not isinstance(claims, dict) or not isinstance(claims.get("exp"), (int, float)):
+            return None
+        return claims if claims["exp"] > time.time() else None
+
+    # Per-user session files
+    def _user_file(self, username: str) -> Path:
+        """Get the file holding a user's sessions; names are hashed so any username is a safe file name."""
+        return self.directory / f"{hashlib.sha256(username.encode()).hexdigest()[:32]}.json"
+
+    def _read_sessions(self, file_path: Path) -> Dict[str, float]:
+        """Get the session ids and expiry times in a user's file."""
+        try:
+            with open(file_path, 'r') as f:
+                return json.load(f)["sessions"]
+        except (OSError, ValueError, KeyError, TypeError):
+            return {}
+
+    def _write_sessions(self, file_path: Path, username: str, sessions: Dict[str, float]):
+        """Store a user's sessions, removing the file when none are left."""
+        if sessions:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self._durability.write_atomic(
+                file_path, json.dumps({"username": username, "sessions": sessions}).encode())
+        else:
+            file_path.unlink(missing_ok=True)
+
+    def _update(self, username: str, change):
+        """Change a user's sessions under the store's lock, dropping expired ones."""
+        file_path = self._user_file(username)
+        self.base_dir.mkdir(parents=True, exist_ok=True)
+        with self._lock, self._write_lock.acquire(exclusive=True):
+            now = time.time()
+            sessions = {sid: expires for sid, expires in self._read_sessions(file_path).items() if expires > now}
+            change(sessions)
+            self._write_sessions(file_path, username, sessions)
+
+    # Public API
+    def issue(self, username: str) -> str:
+        """Start a session for a user who just logged in.
+
+        Returns:
+            The session token
+        """
+        sid = secrets.token_urlsafe(16)
+        expires = int(time.time() + self.ttl)
+        self._update(username, lambda sessions: sessions.__setitem__(sid, expires))
+        payload = _encode(json.dumps({"u": username, "sid": sid, "exp": expires}, separators=(",", ":")).encode())
+        return f"{payload}.{self._sign(payload)}"
+
+    def verify(self, token: str) -> Optional[str]:
+        """Check a session token.
+
+        Returns:
+            The username of the session, or None if the token is forged, expired or revoked
+        """
+        claims = self._claims(token)
+        if claims is None or not isinstance(claims.get("u"), str):
+            return None
+        sessions = self._read_sessions(self._user_file(claims["u"]))
+        return claims["u"] if claims.get("sid") in sessions else None
+
+    def revoke(self, token: str) -> bool:
+        """End the session of a token.
+
+        Returns:
+            Whether the token named a live session
+        """
+        claims = self._claims(token)
+        if claims is None or not isinstance(claims.get("u"), str):
+            return False
+        revoked = []
+        self._update(claims["u"], lambda sessions: revoked.append(sessions.pop(claims.get("sid"), None)))
+        return revoked[0] is not None
+
+    def revoke_all(self, username: str) -> int:
+        """End every session of a user, e.g. after their password changed.
+
+        Returns:
+            The number of sessions ended
+        """
+        revoked = []
+
+        def clear(sessions):
+            revoked.append(len(sessions))
+            sessions.clear()
+
+        self._update(username, clear)
+        return revoked[0]
+
+    def sweep(self) -> int:
+        """Remove every expired session, and the files of users left without any.
+
+        Returns:
+            The number of sessions removed
+        """
+        removed = 0
+        try:
+            files = list(self.directory.glob("*.json"))
+        except OSError:
+            return 0
+        if not files:
+            return 0
+        with self._lock, self._write_lock.acquire(exclusive=True):
+            now = time.time()
+            for file_path in files:
+                try:
+                    with open(file_path, 'r') as f:
+                        document = json.load(f)
+                    sessions = document["sessions"]
+                except FileNotFoundError:
+                    continue
+                except (OSError, ValueError, KeyError, TypeError):
+                    file_path.unlink(missing_ok=True)  # unreadable, so it revokes nothing
+                    continue
+                live = {sid: expires for sid, expires in sessions.items() if expires > now}
+                if len(live) != len(sessions):
+                    removed += len(sessions) - len(live)
+                    self._write_sessions(file_path, document["username"], live)
+        return removed
+
+
+# Client side
+def load_token(session_file: Optional[Path] = None) -> Optional[str]:
+    """Get the token saved by the last login, if any."""
+    try:
+        return Path(session_file or SESSION_FILE).read_text().strip() or None
+    except (OSError, UnicodeDecodeError):
+        return None
+
+
+def save_token(token: str, session_file: Optional[Path] = None):
+    """Save a session token for the next start, readable only by its owner."""
+    session_file = Path(session_file or SESSION_FILE)
+    session_file.parent.mkdir(parents=True, exist_ok=True)
+    _write_private(session_file, token.encode("ascii"))
+
+
+def clear_token(session_file: Optional[Path] = None):
+    """Forget the saved session token."""
+    Path(session_file or SESSION_FILE).unlink(missing_ok=True)
+
+
+_store: Optional[SessionStore] = None
+_store_lock = threading.Lock()
+
+
+def get_session_store() -> SessionStore:
+    """Get the process-wide session store, creating it on first use."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = SessionStore()
+        return _store
+
+
+def set_session_store(store: SessionStore):
+    """Replace the process-wide session store, e.g. with one for another data directory."""
+    global _store
+    with _store_lock:
+        _store = store
@@ -5,7 +5,23 @@ from .constants import (
     APP_NAME, APP_VERSION, APP_AUTHOR,
     
     # Directory and File Paths
-    ROOT_DIR, DATABASE_DIR, DATABASE_DIR_NAME,
+    ROOT_DIR, DATABASE_DIR, DATABASE_DIR_NAME, DATA_DIR,
+    
+    # Storage Backend
+    DATABASE_BACKEND, SQLITE_FILENAME, DATABASE_JOURNAL, JOURNAL_COMPACT_THRESHOLD,
+    DATABASE_LAYOUT, DATABASE_FORMAT, DATABASE_LOCKING, LOCK_TIMEOUT,
+    DATABASE_ARCHIVE, ARCHIVE_COMPRESSION, ARCHIVE_SEGMENT_SIZE, DATABASE_VALIDATION,
+    ASYNC_MAX_WORKERS, WRITE_BEHIND_INTERVAL, WRITE_BEHIND_MAX_OPS, DATABASE_FSYNC, MIGRATION_CHECKPOINT_ENTRIES,
+    
+    # Password Hashing
+    BCRYPT_ROUNDS, HASH_TARGET_MS, HASH_WORKERS, HASH_POOL,
+    
+    # Login Sessions
+    SESSIONS_ENABLED, SESSION_TTL, SESSION_FILE,
+    
+    # Login Admission Control
+    LOGIN_ADMISSION, LOGIN_USER_RATE, LOGIN_USER_BURST, LOGIN_GLOBAL_RATE, LOGIN_GLOBAL_BURST,
+    LOGIN_SOURCE_SHARE, LOGIN_MAX_INFLIGHT, LOGIN_QUEUE_TIMEOUT, LOGIN_FREE_FAILURES, LOGIN_BACKOFF_BASE, LOGIN_BACKOFF_MAX,
     
     # Database Files
     USERS_FILENAME, ONGOING_TASKS_FILENAME, COMPLETED_TASKS_FILENAME,
@@ -23,7 +39,16 @@ from .constants import (
 # Re-export all constants
 __all__ = [
     'APP_NAME', 'APP_VERSION', 'APP_AUTHOR',
-    'ROOT_DIR', 'DATABASE_DIR', 'DATABASE_DIR_NAME',
+    'ROOT_DIR', 'DATABASE_DIR', 'DATABASE_DIR_NAME', 'DATA_DIR',
+    'DATABASE_BACKEND', 'SQLITE_FILENAME', 'DATABASE_JOURNAL', 'JOURNAL_COMPACT_THRESHOLD',
+    'DATABASE_LAYOUT', 'DATABASE_FORMAT', 'DATABASE_LOCKING', 'LOCK_TIMEOUT',
+    'DATABASE_ARCHIVE', 'ARCHIVE_COMPRESSION', 'ARCHIVE_SEGMENT_SIZE', 'DATABASE_VALIDATION',
+    'ASYNC_MAX_WORKERS', 'WRITE_BEHIND_INTERVAL', 'WRITE_BEHIND_MAX_OPS', 'DATABASE_FSYNC',
+    'MIGRATION_CHECKPOINT_ENTRIES',
+    'BCRYPT_ROUNDS', 'HASH_TARGET_MS', 'HASH_WORKERS', 'HASH_POOL',
+    'SESSIONS_ENABLED', 'SESSION_TTL', 'SESSION_FILE',
+    'LOGIN_ADMISSION', 'LOGIN_USER_RATE', 'LOGIN_USER_BURST', 'LOGIN_GLOBAL_RATE', 'LOGIN_GLOBAL_BURST',
+    'LOGIN_SOURCE_SHARE', 'LOGIN_MAX_INFLIGHT', 'LOGIN_QUEUE_TIMEOUT', 'LOGIN_FREE_FAILURES', 'LOGIN_BACKOFF_BASE', 'LOGIN_BACKOFF_MAX',
     'USERS_FILENAME', 'ONGOING_TASKS_FILENAME', 'COMPLETED_TASKS_FILENAME',
     'DATETIME_FORMAT', 'DATE_FORMAT', 'TIME_FORMAT',
     'VALID_STATUSES', 'PRIORITY_LEVELS', 'PRIORITY_ORDER', 'CATEGORIES',
@@ -1,5 +1,6 @@
 """Global constants used across the task management system."""
 
+import os
 from pathlib import Path
 from .i18n import language_manager
 
@@ -12,11 +13,79 @@ APP_AUTHOR = "EmpChief"
 ROOT_DIR = Path(__file__).resolve().parent
 DATABASE_DIR = ROOT_DIR / "database"
 DATABASE_DIR_NAME = "database"  # For backwards compatibility
+# Storage root of the data files; set TASKS_DATA_DIR to keep them outside the package, e.g. on a fast volume
+DATA_DIR = Path(os.environ.get("TASKS_DATA_DIR") or ROOT_DIR / "data").expanduser()
+
+# Storage Backend ("json", "sqlite" or "memory", which keeps nothing on disk)
+DATABASE_BACKEND = os.environ.get("TASKS_DB_BACKEND", "json").lower()
+SQLITE_FILENAME = "tasks.db"
+
+# Journaled Writes (JSON backend)
+DATABASE_JOURNAL = os.environ.get("TASKS_DB_JOURNAL", "0") == "1"
+JOURNAL_COMPACT_THRESHOLD = 1024 * 1024  # bytes
+
+# Task File Layout (JSON backend): "single" or "sharded" (one file per user)
+DATABASE_LAYOUT = os.environ.get("TASKS_DB_LAYOUT", "single").lower()
+
+# Data File Format (JSON backend): "pretty", "compact" or "marshal"
+DATABASE_FORMAT = os.environ.get("TASKS_DB_FORMAT", "pretty").lower()
+
+# Inter-process File Locking (JSON backend)
+DATABASE_LOCKING = os.environ.get("TASKS_DB_LOCKING", "1") != "0"
+LOCK_TIMEOUT = float(os.environ.get("TASKS_DB_LOCK_TIMEOUT", "10"))  # seconds
+
+# Completed Task Archive (JSON backend): monthly segments, sealed ones compressed ("gzip" or "lzma")
+DATABASE_ARCHIVE = os.environ.get("TASKS_DB_ARCHIVE", "0") == "1"
+ARCHIVE_COMPRESSION = os.environ.get("TASKS_DB_ARCHIVE_COMPRESSION", "gzip").lower()
+ARCHIVE_SEGMENT_SIZE = 4 * 1024 * 1024  # bytes; larger active segments are sealed early
+
+# Durability (JSON backend): fsync "always", "batched" (in the background every second) or "none"
+DATABASE_FSYNC = os.environ.get("TASKS_DB_FSYNC", "batched").lower()
+
+# Schema Validation of written records
+DATABASE_VALIDATION = os.environ.get("TASKS_DB_VALIDATE", "1") != "0"
+
+# Asyncio API: threads running blocking database calls
+ASYNC_MAX_WORKERS = int(os.environ.get("TASKS_DB_ASYNC_WORKERS", "4"))
+
+# Write-behind Buffering (JSON backend): seconds changes may wait in memory, 0 writes at once
+WRITE_BEHIND_INTERVAL = float(os.environ.get("TASKS_DB_WRITE_BEHIND", "0"))
+WRITE_BEHIND_MAX_OPS = int(os.environ.get("TASKS_DB_WRITE_BEHIND_OPS", "1000"))  # buffered operations forcing a flush
+
+# Password Hashing: bcrypt cost (unset: calibrated so one hash takes about HASH_TARGET_MS),
+# and the "thread" or "process" pool running HASH_WORKERS hashes at once
+BCRYPT_ROUNDS = int(os.environ.get("TASKS_BCRYPT_ROUNDS") or 0) or None
+HASH_TARGET_MS = float(os.environ.get("TASKS_HASH_TARGET_MS", "250"))
+HASH_WORKERS = int(os.environ.get("TASKS_HASH_WORKERS") or 0) or os.cpu_count() or 1
+HASH_POOL = os.environ.get("TASKS_HASH_POOL", "thread").lower()
+
+# Login Sessions: a login is remembered for SESSION_TTL seconds, its token saved in SESSION_FILE
+SESSIONS_ENABLED = os.environ.get("TASKS_SESSIONS", "1") != "0"
+SESSION_TTL = float(os.environ.get("TASKS_SESSION_TTL", str(7 * 24 * 3600)))
+SESSION_FILE = Path(os.environ.get("TASKS_SESSION_FILE") or Path.home() / ".tasks_session").expanduser()
+
+# Login Admission Control: token buckets per username and for all logins (attempts per second, burst),
+# the share of the global bucket one source (local account) may use, verifications running at once,
+# and backoff after LOGIN_FREE_FAILURES failures in a row (seconds, doubling)
+LOGIN_ADMISSION = os.environ.get("TASKS_LOGIN_ADMISSION", "1") != "0"
+LOGIN_USER_RATE = float(os.environ.get("TASKS_LOGIN_USER_RATE", "0.2"))
+LOGIN_USER_BURST = float(os.environ.get("TASKS_LOGIN_USER_BURST", "5"))
+LOGIN_GLOBAL_RATE = float(os.environ.get("TASKS_LOGIN_GLOBAL_RATE") or 0) or HASH_WORKERS * 500 / HASH_TARGET_MS  # half the cores
+LOGIN_GLOBAL_BURST = float(os.environ.get("TASKS_LOGIN_GLOBAL_BURST") or 0) or 4 * LOGIN_GLOBAL_RATE
+LOGIN_SOURCE_SHARE = float(os.environ.get("TASKS_LOGIN_SOURCE_SHARE", "0.5"))  # of the global bucket, per source
+LOGIN_MAX_INFLIGHT = int(os.environ.get("TASKS_LOGIN_MAX_INFLIGHT") or 0) or HASH_WORKERS
+LOGIN_QUEUE_TIMEOUT = float(os.environ.get("TASKS_LOGIN_QUEUE_TIMEOUT", "2"))
+LOGIN_FREE_FAILURES = int(os.environ.get("TASKS_LOGIN_FREE_FAILURES", "3"))
+LOGIN_BACKOFF_BASE = float(os.environ.get("TASKS_LOGIN_BACKOFF_BASE", "1"))
+LOGIN_BACKOFF_MAX = float(os.environ.get("TASKS_LOGIN_BACKOFF_MAX", "300"))
+
+# Format Migrations (JSON backend): entries upgraded between resumable checkpoints
+MIGRATION_CHECKPOINT_ENTRIES = int(os.environ.get("TASKS_DB_MIGRATION_CHECKPOINT", "1000"))
 
 # Database Files
 USERS_FILENAME = "users.json"
-ONGOING_TASKS_FILENAME = "ongoing.json"
-COMPLETED_TASKS_FILENAME = "completed.json"
+ONGOING_TASKS_FILENAME = "ongoing_tasks.json"
+COMPLETED_TASKS_FILENAME = "completed_tasks.json"
 
 # Date and Time Formats
 DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
@@ -0,0 +1,10 @@
+"""Database package for the task management system."""
+
+from .db_manager import DatabaseManager
+from .sqlite_manager import SQLiteDatabaseManager
+from .memory_manager import MemoryDatabaseManager
+from .backends import create_database_manager, get_database, set_database
+from .async_manager import AsyncDatabaseManager
+
+__all__ = ['DatabaseManager', 'SQLiteDatabaseManager', 'MemoryDatabaseManager', 'create_database_manager',
+           'get_database', 'set_database', 'AsyncDatabaseManager']
@@ -0,0 +1,267 @@
+"""Time-partitioned archive of completed tasks.
+
+Completed tasks are stored in segments named after the month they were
+archived in (`archive/2024-12.json`). Only the newest, active segment is ever
+written, so completing a task touches a document holding at most one month of
+completions. When the month changes, or the active segment outgrows
+ARCHIVE_SEGMENT_SIZE, it is sealed: compressed into `<segment>.json.gz` (or
+`.json.xz`) and recorded in `manifest.json` with the range of completion times
+and the users it holds, so readers skip segments that cannot match.
+"""
+
+import gzip
+import lzma
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+from . import formats, migrations
+from ..constants import DATETIME_FORMAT
+
+COMPRESSORS = {"gzip": (gzip, ".json.gz"), "lzma": (lzma, ".json.xz")}
+SEALED_CACHE_SIZE = 16  # decompressed sealed segments kept in memory
+
+
+def timestamp(value: Union[str, datetime, None]) -> Optional[str]:
+    """Convert a datetime to the stored timestamp format; strings are returned as is."""
+    if isinstance(value, datetime):
+        return value.strftime(DATETIME_FORMAT)
+    return value
+
+
+def completion_time(task: Dict[str, Any]) -> str:
+    """Get when a completed task was completed, falling back to when it was created."""
+    return task.get("completed_at") or task.get("created_at") or ""
+
+
+class CompletedArchive:
+    def __init__(self, db, directory: Path, compression: str, segment_size: int):
+        """Initialize the archive.
+
+        Args:
+            db: The DatabaseManager whose documents, locks and transactions the archive uses
+            directory: Directory holding the segments and the manifest
+            compression: Compression of sealed segments ("gzip" or "lzma")
+            segment_size: Size in bytes at which the active segment is sealed early
+        """
+        if compression not in COMPRESSORS:
+            raise ValueError(f"Unknown archive compression: {compression}")
+        self.db = db
+        self.directory = directory
+        self.directory.mkdir(exist_ok=True)
+        self.compression = compression
+        self.segment_size = segment_size
+        self.manifest_file = directory / "manifest.json"
+        self._sealed: "OrderedDict[str, dict]" = OrderedDict()
+        self._sealed_lock = threading.Lock()
+
+    def exists(self) -> bool:
+        """Check whether the archive holds any segment."""
+        return self.manifest_file.exists()
+
+    def _manifest(self) -> Dict[str, Any]:
+        """Load the manifest; the result is shared with the cache and must not be modified."""
+        return self.db._load_json(self.manifest_file) or {"active": None, "segments": []}
+
+    def segment_file(self, name: str) -> Path:
+        """Get the document of an unsealed segment."""
+        return self.directory / f"{name}.json"
+
+    def active_file(self) -> Optional[Path]:
+        """Get the document of the active segment, or None if there is none yet."""
+        active = self._manifest()["active"]
+        return self.segment_file(active) if active else None
+
+    # Writing
+    def add(self, user_id: str, tasks: List[Dict[str, Any]]) -> bool:
+        """Add completed tasks to the active segment."""
+        # A segment already written in this transaction cannot be sealed before it commits
+        if not any(file_path.parent == self.directory for file_path in self.db._pending or ()):
+            self._rollover()
+        # The manager's write lock comes first: it cannot be taken once the manifest is held for reading
+        with self.db._lock, self.db._locked(self.manifest_file):
+            return self.db._commit(self.active_file(), [
+                {"op": "upsert_many", "key": str(user_id), "id_field": "completed_id", "values": tasks}
+            ])
+
+    def _needs_rollover(self, manifest: Dict[str, Any], month: str) -> bool:
+        """Check whether the active segment must be replaced by a new one."""
+        active = manifest["active"]
+        if not active:
+            return True
+        if active[:7] != month:
+            return True
+        file_path = self.segment_file(active)
+        size = sum(path.stat().st_size for path in (file_path, self.db._journal(file_path).path) if path.exists())
+        return size > self.segment_size
+
+    def _rollover(self):
+        """Seal the active segment if it is from a past month or full, and start a new one."""
+        month = datetime.now().strftime("%Y-%m")
+        if not self._needs_rollover(self._manifest(), month):
+            return
+        # Buffered write-behind changes must reach the segment before it is sealed
+        self.db.flush()
+        with self.db._locked(self.manifest_file, exclusive=True):
+            manifest = self._manifest()
+            if not self._needs_rollover(manifest, month):
+                return
+            segments = list(manifest["segments"])
+            previous = manifest["active"]
+            if previous:
+                with self.db._locked(self.segment_file(previous), exclusive=True):
+                    data = self.db._load_json(self.segment_file(previous))
+                    if any(data.values()):
+                        segments.append(self._write_sealed(previous, data))
+            self._save_manifest(self._new_segment_name(segments, month), segments)
+            if previous:
+                self.db._remove_document(self.segment_file(previous))
+
+    def _new_segment_name(self, segments: List[Dict[str, Any]], month: str) -> str:
+        """Name a new segment of a month, numbering further segments of the same month."""
+        names = {info["name"] for info in segments}
+        name, number = month, 1
+        while name in names:
+            number += 1
+            name = f"{month}.{number:03d}"
+        return name
+
+    def _save_manifest(self, active: Optional[str], segments: List[Dict[str, Any]]):
+        """Write the manifest, keeping sealed segments in chronological order."""
+        segments = sorted(segments, key=lambda info: info["name"])
+        if not self.db._save_json(self.manifest_file, {"active": active, "segments": segments}):
+            raise OSError(f"Failed to write {self.manifest_file}")
+
+    def _write_sealed(self, name: str, data: Dict[str, list]) -> Dict[str, Any]:
+        """Write a compressed sealed segment and return its manifest entry."""
+        module, suffix = COMPRESSORS[self.compression]
+        file_path = self.directory / f"{name}{suffix}"
+        self.db.durability.write_atomic(file_path, formats.dumps(migrations.with_header(data), "compact"),
+                                        opener=module.open)
+
+        times = [completion_time(task) for tasks in data.values() for task in tasks]
+        return {
+            "name": name,
+            "file": file_path.name,
+            "first": min(times),
+            "last": max(times),
+            "users": sorted(user_id for user_id, tasks in data.items() if tasks),
+            "tasks": len(times)
+        }
+
+    # Reading
+    def _read_sealed(self, info: Dict[str, Any]) -> Dict[str, list]:
+        """Load a sealed segment; they never change, so recently used ones stay cached."""
+        with self._sealed_lock:
+            if info["file"] in self._sealed:
+                self._sealed.move_to_end(info["file"])
+                return self._sealed[info["file"]]
+
+        module = next(module for module, suffix in COMPRESSORS.values() if info["file"].endswith(suffix))
+        with module.open(self.directory / info["file"], 'rb') as f:
+            data = formats.loads(f.read())
+        # Sealed segments are never rewritten, so older ones are upgraded each time they are loaded
+        migrations.upgrade("completed", data, migrations.split_header(data))
+
+        with self._sealed_lock:
+            self._sealed[info["file"]] = data
+            if len(self._sealed) > SEALED_CACHE_SIZE:
+                self._sealed.popitem(last=False)
+        return data
+
+    def iter_tasks(self, user_id: str, since: Union[str, datetime, None] = None) -> Iterator[Dict[str, Any]]:
+        """Iterate over a user's completed tasks, oldest segment first.
+
+        Args:
+            user_id: The user's ID
+            since: Only yield tasks completed at or after this time; segments
+                that ended earlier are not read at all
+        """
+        key = str(user_id)
+        since = timestamp(since)
+        with self.db._locked(self.manifest_file):
+            manifest = self._manifest()
+            segments = [
+                info for info in manifest["segments"]
+                if key in info["users"] and not (since and info["last"] < since)
+            ]
+            active = manifest["active"]
+            # The active segment is small and may be sealed any time, so read it now
+            active_tasks = (self.db._load_key(self.segment_file(active), key) or []) if active else []
+
+        def tasks():
+            for info in segments:
+                yield from self._read_sealed(info).get(key, [])
+            yield from active_tasks
+
+        return (task for task in tasks() if not since or completion_time(task) >= since)
+
+    def get_tasks(self, user_id: str, since: Union[str, datetime, None] = None) -> list:
+        """Get a user's completed tasks, optionally only those completed since a time."""
+        return list(self.iter_tasks(user_id, since))
+
+    def export(self) -> Dict[str, list]:
+        """Load every user's archived tasks."""
+        tasks: Dict[str, list] = {}
+        with self.db._locked(self.manifest_file):
+            manifest = self._manifest()
+            documents = [self._read_sealed(info) for info in manifest["segments"]]
+            if manifest["active"]:
+                documents.append(self.db._load_json(self.segment_file(manifest["active"])))
+        for document in documents:
+            for user_id, user_tasks in document.items():
+                tasks.setdefault(user_id, []).extend(user_tasks)
+        return tasks
+
+    # Migration
+    def import_tasks(self, tasks: Dict[str, list]) -> int:
+        """Archive completed tasks stored elsewhere, grouped by the month they were completed.
+
+        Tasks that are already archived are skipped, so an interrupted import
+        can simply be run again.
+
+        Returns:
+            The number of tasks imported
+        """
+        current = datetime.now().strftime("%Y-%m")
+        with self.db._locked(self.manifest_file, exclusive=True):
+            archived = {
+                (user_id, task.get("completed_id"))
+                for user_id, user_tasks in self.export().items() for task in user_tasks
+            }
+            months: Dict[str, Dict[str, list]] = {}
+            for user_id, user_tasks in tasks.items():
+                for task in user_tasks:
+                    if (user_id, task.get("completed_id")) in archived:
+                        continue
+                    month = min(completion_time(task)[:7] or current, current)
+                    months.setdefault(month, {}).setdefault(user_id, []).append(task)
+
+            manifest = self._manifest()
+            segments = list(manifest["segments"])
+            for month, data in sorted(months.items()):
+                if month != current:
+                    segments.append(self._write_sealed(self._new_segment_name(segments, month), data))
+            self._save_manifest(manifest["active"], segments)
+
+            self._rollover()
+            for user_id, user_tasks in months.get(current, {}).items():
+                if not self.db._commit(self.active_file(), [
+                    {"op": "upsert_many", "key": user_id, "id_field": "completed_id", "values": user_tasks}
+                ], validate=False):
+                    raise OSError(f"Failed to import completed tasks of user {user_id}")
+        return sum(len(user_tasks) for data in months.values() for user_tasks in data.values())
+
+    def clear(self):
+        """Delete every segment and the manifest."""
+        with self.db._locked(self.manifest_file, exclusive=True):
+            manifest = self._manifest()
+            for info in manifest["segments"]:
+                (self.directory / info["file"]).unlink(missing_ok=True)
+            if manifest["active"]:
+                self.db._remove_document(self.segment_file(manifest["active"]))
+            self.db._remove_document(self.manifest_file)
+        with self._sealed_lock:
+            self._sealed.clear()
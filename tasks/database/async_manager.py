@@ -0,0 +1,273 @@
+"""Asyncio front end for the database managers.
+
+Every operation runs the blocking call of the wrapped manager (JSON or SQLite)
+in a bounded thread pool, so file I/O and parsing never run on the event loop.
+On top of that:
+
+- identical reads that are in flight at the same time share one call, and
+  threads loading the same uncached file wait for a single parse
+- writes are queued per data file and run one at a time, in order, so a burst
+  of writes occupies one worker thread instead of blocking many on file locks
+- reads of a file wait for a running write to that file, and a write waits for
+  the reads already running, so nobody sees a half-applied change
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple, Union
+
+from .backends import create_database_manager
+from .db_manager import DatabaseManager
+from ..constants import ASYNC_MAX_WORKERS
+
+
+class FileGate:
+    """Reader/writer exclusion between coroutines; waiting writers go first."""
+
+    def __init__(self):
+        self._readers = 0
+        self._writing = False
+        self._waiting_writers = 0
+        self._changed = asyncio.Condition()
+
+    @asynccontextmanager
+    async def reading(self):
+        """Hold the gate shared with other readers."""
+        async with self._changed:
+            await self._changed.wait_for(lambda: not self._writing and not self._waiting_writers)
+            self._readers += 1
+        try:
+            yield
+        finally:
+            async with self._changed:
+                self._readers -= 1
+                self._changed.notify_all()
+
+    @asynccontextmanager
+    async def writing(self):
+        """Hold the gate alone."""
+        async with self._changed:
+            self._waiting_writers += 1
+            try:
+                await self._changed.wait_for(lambda: not self._writing and not self._readers)
+            finally:
+                self._waiting_writers -= 1
+            self._writing = True
+        try:
+            yield
+        finally:
+            async with self._changed:
+                self._writing = False
+                self._changed.notify_all()
+
+
+class AsyncDatabaseManager:
+    def __init__(self, db=None, max_workers: Optional[int] = None):
+        """Wrap a database manager for use from asyncio.
+
+        Args:
+            db: The DatabaseManager or SQLiteDatabaseManager to wrap; the configured backend if None
+            max_workers: Threads running blocking calls (ASYNC_MAX_WORKERS by default)
+        """
+        self.db = db if db is not None else create_database_manager()
+        self._executor = ThreadPoolExecutor(max_workers or ASYNC_MAX_WORKERS, thread_name_prefix="tasks-db")
+        self._reads: Dict[Hashable, asyncio.Future] = {}
+        self._gates: Dict[Hashable, FileGate] = {}
+        self._queues: Dict[Hashable, asyncio.Queue] = {}
+        self._workers: List[asyncio.Task] = []
+        self._global_gate: Optional[FileGate] = None  # held alone by transactions
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        """Finish queued writes and flush buffered ones, then stop the write queues and the thread pool."""
+        for queue in self._queues.values():
+            await queue.join()
+        if hasattr(self.db, "flush"):
+            await self._call(self.db.flush)
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers.clear()
+        self._queues.clear()
+        self._executor.shutdown(wait=True)
+
+    # Plumbing
+    def _target(self, kind: str, user_id: Optional[str] = None) -> Hashable:
+        """Get the data file an operation reads or writes."""
+        db = self.db
+        if not isinstance(db, DatabaseManager):
+            return ("sqlite", kind)  # the connection serializes its own writes
+        if kind == "users":
+            return db.users_file
+        if kind == "completed" and db.archive is not None:
+            return db.archive.manifest_file
+        file_path = db.ongoing_tasks_file if kind == "tasks" else db.completed_tasks_file
+        return db._tasks_file(file_path, user_id)
+
+    def _gate(self, target: Hashable = None) -> FileGate:
+        """Get the gate of a data file, or the global gate if target is None.
+
+        Created on first use, inside the event loop they belong to.
+        """
+        if target is None:
+            if self._global_gate is None:
+                self._global_gate = FileGate()
+            return self._global_gate
+        if target not in self._gates:
+            self._gates[target] = FileGate()
+        return self._gates[target]
+
+    async def _call(self, func: Callable, *args) -> Any:
+        """Run a blocking call in the thread pool."""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    async def _read(self, kind: str, user_id: Optional[str], method: str, *args) -> Any:
+        """Run a read of the wrapped manager, sharing it with identical reads in flight."""
+        target = self._target(kind, user_id)
+        gate = self._gate(target)
+        key: Optional[Tuple] = (method, *args)
+        try:
+            hash(key)
+        except TypeError:  # e.g. query conditions
+            key = None
+
+        if key is not None and key in self._reads:
+            return await asyncio.shield(self._reads[key])
+
+        future = asyncio.get_running_loop().create_future()
+        if key is not None:
+            self._reads[key] = future
+        try:
+            async with self._gate().reading(), gate.reading():
+                result = await self._call(getattr(self.db, method), *args)
+            future.set_result(result)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # retrieved, so it is not logged when nobody shares the read
+            raise
+        finally:
+            if key is not None:
+                del self._reads[key]
+        return result
+
+    async def _write(self, kind: str, user_id: Optional[str], method: str, *args) -> Any:
+        """Queue a write of the wrapped manager behind earlier writes to the same file."""
+        target = self._target(kind, user_id)
+        if target not in self._queues:
+            self._queues[target] = asyncio.Queue()
+            self._workers.append(asyncio.create_task(self._write_worker(target)))
+        future = asyncio.get_running_loop().create_future()
+        await self._queues[target].put((getattr(self.db, method), args, future))
+        return await future
+
+    async def _write_worker(self, target: Hashable):
+        """Run the queued writes of one file, one at a time."""
+        queue, gate = self._queues[target], self._gate(target)
+        while True:
+            func, args, future = await queue.get()
+            try:
+                if not future.cancelled():
+                    async with self._gate().reading(), gate.writing():
+                        result = await self._call(func, *args)
+                    if not future.cancelled():
+                        future.set_result(result)
+            except Exception as e:
+                if not future.cancelled():
+                    future.set_exception(e)
+            finally:
+                queue.task_done()
+
+    async def transaction(self, func: Callable, *args) -> Any:
+        """Run func(db, *args) in one transaction of the wrapped manager.
+
+        The function runs in a worker thread with every other operation held
+        off, and may call any synchronous method of the manager.
+        """
+        def run():
+            with self.db.transaction():
+                return func(self.db, *args)
+
+        async with self._gate().writing():
+            return await self._call(run)
+
+    # User operations
+    async def get_user(self, username: str) -> Optional[Dict[str, Any]]:
+        """Get user data by username."""
+        return await self._read("users", None, "get_user", username)
+
+    async def get_user_id(self, username: str) -> Optional[int]:
+        """Get the ID of a user, or None if there is no such user."""
+        return await self._read("users", None, "get_user_id", username)
+
+    async def get_username(self, user_id: Union[int, str]) -> Optional[str]:
+        """Get the name of the user with an ID, or None if no user has it."""
+        return await self._read("users", None, "get_username", user_id)
+
+    async def get_all_users(self) -> Dict[str, Any]:
+        """Get all users data."""
+        return await self._read("users", None, "get_all_users")
+
+    async def save_user(self, username: str, user_data: Dict[str, Any]) -> bool:
+        """Save or update user data."""
+        return await self._write("users", None, "save_user", username, user_data)
+
+    async def save_users(self, users: Dict[str, Dict[str, Any]]) -> bool:
+        """Save or update many users in one commit."""
+        return await self._write("users", None, "save_users", users)
+
+    async def allocate_user_id(self, count: int = 1) -> int:
+        """Allocate new unique user IDs and return the first."""
+        return await self._call(self.db.allocate_user_id, count)
+
+    # Task operations
+    async def get_user_tasks(self, user_id: str) -> list:
+        """Get all ongoing tasks for a user."""
+        return await self._read("tasks", user_id, "get_user_tasks", user_id)
+
+    async def get_user_tasks_by(self, user_id: str, field: str, start: Any = None, end: Any = None) -> list:
+        """Get a user's ongoing tasks in the order of an indexed field."""
+        return await self._read("tasks", user_id, "get_user_tasks_by", user_id, field, start, end)
+
+    async def query(self, user_id: str, where: Optional[Dict[str, Any]] = None, order_by: Optional[str] = None,
+                    limit: Optional[int] = None, offset: int = 0, fields: Optional[List[str]] = None,
+                    completed: bool = False) -> list:
+        """Select a page of a user's tasks; see DatabaseManager.query."""
+        return await self._read("completed" if completed else "tasks", user_id, "query",
+                                user_id, where, order_by, limit, offset, fields, completed)
+
+    async def save_user_task(self, user_id: str, task_data: Dict[str, Any]) -> bool:
+        """Save a new task for a user."""
+        return await self._write("tasks", user_id, "save_user_task", user_id, task_data)
+
+    async def save_user_tasks(self, user_id: str, tasks: List[Dict[str, Any]]) -> bool:
+        """Save many tasks of a user in one commit."""
+        return await self._write("tasks", user_id, "save_user_tasks", user_id, tasks)
+
+    async def update_user_task(self, user_id: str, task_id: int, task_data: Dict[str, Any]) -> bool:
+        """Update an existing task."""
+        return await self._write("tasks", user_id, "update_user_task", user_id, task_id, task_data)
+
+    async def delete_user_task(self, user_id: str, task_id: int) -> bool:
+        """Delete a task."""
+        return await self._write("tasks", user_id, "delete_user_task", user_id, task_id)
+
+    async def add_completed_task(self, user_id: str, task_data: Dict[str, Any]) -> bool:
+        """Add a task to completed tasks."""
+        return await self._write("completed", user_id, "add_completed_task", user_id, task_data)
+
+    async def add_completed_tasks(self, user_id: str, tasks: List[Dict[str, Any]]) -> bool:
+        """Add many completed tasks of a user in one commit."""
+        return await self._write("completed", user_id, "add_completed_tasks", user_id, tasks)
+
+    async def get_completed_tasks(self, user_id: str, since=None) -> list:
+        """Get all completed tasks for a user, optionally only those completed since a time."""
+        return await self._read("completed", user_id, "get_completed_tasks", user_id, since)
@@ -0,0 +1,57 @@
+"""Factory for the configured database backend and the shared storage context."""
+
+import threading
+from pathlib import Path
+from typing import Optional
+from .db_manager import DatabaseManager
+from .memory_manager import MemoryDatabaseManager
+from .sqlite_manager import SQLiteDatabaseManager
+from ..constants import DATABASE_BACKEND
+
+
+BACKENDS = {
+    "json": DatabaseManager,
+    "sqlite": SQLiteDatabaseManager,
+    "memory": MemoryDatabaseManager
+}
+
+
+def create_database_manager(backend: Optional[str] = None, base_dir: Optional[Path] = None):
+    """Create a database manager for the given backend name, or the configured one.
+
+    Args:
+        backend: "json", "sqlite" or "memory"; DATABASE_BACKEND if None
+        base_dir: Storage root of the file backends; DATA_DIR if None
+    """
+    backend = (backend or DATABASE_BACKEND).lower()
+    try:
+        factory = BACKENDS[backend]
+    except KeyError:
+        raise ValueError(f"Unknown database backend: {backend}") from None
+    if factory is MemoryDatabaseManager:
+        return factory()
+    return factory(base_dir=base_dir)
+
+
+_database = None
+_database_lock = threading.Lock()
+
+
+def get_database():
+    """Get the process-wide database manager, creating it on first use.
+
+    Sharing one manager keeps its caches, locks and connections alive across
+    actions instead of rebuilding them for every menu choice.
+    """
+    global _database
+    with _database_lock:
+        if _database is None:
+            _database = create_database_manager()
+        return _database
+
+
+def set_database(db):
+    """Replace the process-wide database manager, e.g. with another backend."""
+    global _database
+    with _database_lock:
+        _database = db
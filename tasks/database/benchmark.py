@@ -0,0 +1,870 @@
+"""Benchmarks for the database package.
+
+Usage:
+    python -m tasks.database.benchmark formats [--users N] [--tasks N]
+    python -m tasks.database.benchmark stream [--users N] [--tasks N]
+    python -m tasks.database.benchmark indexes [--tasks N]
+    python -m tasks.database.benchmark archive [--users N] [--tasks N] [--months N]
+    python -m tasks.database.benchmark stress [--processes N] [--operations N] [--journal] [--no-locking]
+    python -m tasks.database.benchmark validation [--users N] [--tasks N] [--writes N]
+    python -m tasks.database.benchmark async [--users N] [--tasks N] [--requests N]
+    python -m tasks.database.benchmark writebehind [--users N] [--tasks N] [--writes N] [--journal]
+    python -m tasks.database.benchmark fsync [--users N] [--tasks N] [--writes N] [--dir DIR]
+    python -m tasks.database.benchmark backends [--users N] [--tasks N] [--operations N] [--dir DIR]
+    python -m tasks.database.benchmark migrate [--users N] [--tasks N]
+    python -m tasks.database.benchmark hashing [--logins N] [--rounds N] [--workers N]
+    python -m tasks.database.benchmark sessions [--starts N] [--rounds N]
+    python -m tasks.database.benchmark directory [--users N] [--lookups N]
+    python -m tasks.database.benchmark admission [--attackers N] [--seconds N] [--rounds N] [--spray]
+    python -m tasks.database.benchmark provision [--users N] [--rounds N] [--workers N]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime, timedelta
+from multiprocessing import Pool
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from ..constants import LOGIN_USER_RATE
+from . import formats, migrations, stream
+from .async_manager import AsyncDatabaseManager
+from .db_manager import DatabaseManager
+from .directory import directory_path, dumps_directory
+
+STRESS_USER_ID = 1
+
+
+def make_task(name: str) -> Dict[str, str]:
+    """Build a new task the way adding one from the menu does."""
+    now = datetime.now()
+    return {
+        "name": name,
+        "description": f"Description of {name}",
+        "priority": "Medium",
+        "category": "Work",
+        "created_at": now.strftime("%Y-%m-%d %H:%M:%S"),
+        "due_date": (now + timedelta(days=1)).strftime("%Y-%m-%d %H:%M:%S"),
+        "status": "In Progress"
+    }
+
+
+def make_completed_task(task: Dict[str, str]) -> Dict[str, str]:
+    """Build the completed copy of a task the way deleting one from the menu does."""
+    completed = {field: value for field, value in task.items() if field != "task_id"}
+    completed.update(status="Completed", completed_at=datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+    return completed
+
+
+def make_tasks_document(users: int, tasks_per_user: int) -> Dict[str, list]:
+    """Build a synthetic ongoing tasks document."""
+    return {
+        str(user_id): [
+            {
+                "task_id": task_id,
+                "name": f"Task {task_id}",
+                "description": f"Description of task {task_id} for user {user_id}",
+                "priority": ("Low", "Medium", "High", "Urgent")[task_id % 4],
+                "category": ("Work", "Personal", "Shopping", "Health", "Study", "Other")[task_id % 6],
+                "created_at": f"2024-12-{task_id % 28 + 1:02d} 10:00:00",
+                "due_date": f"2024-12-{(task_id + 1) % 28 + 1:02d} 10:00:00",
+                "status": "In Progress"
+            }
+            for task_id in range(1, tasks_per_user + 1)
+        ]
+        for user_id in range(1, users + 1)
+    }
+
+
+def best_of(func: Callable[[], object], repeat: int = 5) -> float:
+    """Run a function several times and return the fastest run in seconds."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def print_table(headers, rows):
+    """Print rows as an aligned text table."""
+    widths = [max(len(str(cell)) for cell in column) for column in zip(headers, *rows)]
+    for row in [headers] + rows:
+        print("  ".join(str(cell).rjust(width) for cell, width in zip(row, widths)))
+
+
+def bench_formats(args):
+    """Compare save/load time and file size of every storage format."""
+    document = make_tasks_document(args.users, args.tasks)
+    print(f"{args.users} users x {args.tasks} tasks")
+
+    rows = []
+    with tempfile.TemporaryDirectory() as directory:
+        for storage_format in formats.FORMATS:
+            path = Path(directory) / f"tasks.{storage_format}"
+
+            def save():
+                with open(path, 'wb') as f:
+                    f.write(formats.dumps(document, storage_format))
+
+            def load():
+                with open(path, 'rb') as f:
+                    return formats.loads(f.read())
+
+            save_time = best_of(save, args.repeat)
+            load_time = best_of(load, args.repeat)
+            label = f"{storage_format} (current)" if storage_format == "pretty" else storage_format
+            rows.append([label, f"{save_time * 1000:.1f}", f"{load_time * 1000:.1f}", os.path.getsize(path)])
+
+    print_table(["format", "save ms", "load ms", "bytes"], rows)
+
+
+def peak_memory(func: Callable[[], object]) -> int:
+    """Run a function and return the peak memory it allocated in bytes."""
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def bench_stream(args):
+    """Compare reading one user's tasks through the offset index with parsing the whole file."""
+    document = make_tasks_document(args.users, args.tasks)
+    key = str(args.users // 2)
+    content, offsets = stream.dumps_with_offsets(document, "pretty")
+    print(f"{args.users} users x {args.tasks} tasks, {len(content)} bytes")
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / "completed_tasks.json"
+        path.write_bytes(content)
+
+        def full():
+            with open(path, 'rb') as f:
+                return formats.loads(f.read())[key]
+
+        def partial():
+            return stream.read_value(path, offsets[key])
+
+        def streamed():
+            with open(path, 'rb') as f:
+                return sum(1 for _ in stream.iter_items(f, offsets[key]))
+
+        rows = [
+            [name, f"{best_of(func, args.repeat) * 1000:.3f}", peak_memory(func)]
+            for name, func in (("full parse", full), ("indexed read", partial), ("indexed stream", streamed))
+        ]
+    print_table(["read", "ms", "peak bytes"], rows)
+
+
+def bench_indexes(args):
+    """Compare ordering a user's tasks through the secondary indexes, and paging through them, with sorting."""
+    from .indexes import INDEXED_FIELDS, sort_key
+
+    tasks = make_tasks_document(1, args.tasks)["1"]
+    for task in tasks:
+        del task["task_id"]
+    print(f"1 user x {args.tasks} tasks")
+
+    with tempfile.TemporaryDirectory() as directory:
+        # Journaled, so the update timing shows index maintenance rather than the file rewrite
+        db = DatabaseManager(base_dir=Path(directory), journal=True)
+        with db.transaction():
+            for task in tasks:
+                db.save_user_task(1, task)
+
+        rows = []
+        for field in INDEXED_FIELDS:
+            def sort():
+                return sorted(db.get_user_tasks(1), key=lambda task: sort_key(field, task.get(field)))
+
+            def indexed():
+                return db.get_user_tasks_by(1, field)
+
+            def page():
+                return db.query(1, order_by=field, limit=20, offset=args.tasks // 2)
+
+            rows.append([field, f"{best_of(sort, args.repeat) * 1000:.3f}",
+                         f"{best_of(indexed, args.repeat) * 1000:.3f}", f"{best_of(page, args.repeat) * 1000:.3f}"])
+
+        def update():
+            task = dict(db.get_user_tasks(1)[args.tasks // 2])
+            task["due_date"] = "2025-01-01 10:00:00"
+            with db.transaction():
+                db.update_user_task(1, task["task_id"], task)
+
+        print_table(["order by", "sort ms", "index ms", "middle page ms"], rows)
+        print(f"update one task: {best_of(update, args.repeat) * 1000:.3f} ms")
+
+
+def make_completed_history(users: int, tasks_per_user: int, months: int) -> Dict[str, list]:
+    """Build completed tasks spread evenly over the last few months."""
+    now = datetime.now()
+    step = timedelta(days=30 * months) / tasks_per_user
+    return {
+        str(user_id): [
+            {
+                "completed_id": completed_id,
+                "name": f"Task {completed_id}",
+                "description": f"Description of task {completed_id} for user {user_id}",
+                "created_at": (now - step * (tasks_per_user - completed_id + 1)).strftime("%Y-%m-%d %H:%M:%S"),
+                "due_date": (now - step * (tasks_per_user - completed_id)).strftime("%Y-%m-%d %H:%M:%S"),
+                "completed_at": (now - step * (tasks_per_user - completed_id)).strftime("%Y-%m-%d %H:%M:%S"),
+                "status": "Completed",
+                "priority": None,
+                "category": None
+            }
+            for completed_id in range(1, tasks_per_user + 1)
+        ]
+        for user_id in range(1, users + 1)
+    }
+
+
+def bench_archive(args):
+    """Compare completing a task and reading recent completions with and without the archive."""
+    history = make_completed_history(args.users, args.tasks, args.months)
+    print(f"{args.users} users x {args.tasks} completed tasks over {args.months} months")
+    since = datetime.now() - timedelta(days=30)
+
+    rows = []
+    for archive in (False, True):
+        with tempfile.TemporaryDirectory() as directory:
+            db = DatabaseManager(base_dir=Path(directory), archive=False)
+            db._save_json(db.completed_tasks_file, history)
+            # Opening with the archive enabled moves the history into segments
+            db = DatabaseManager(base_dir=Path(directory), archive=archive)
+            user_id = str(args.users // 2)
+
+            def complete():
+                db.add_completed_task(user_id, make_completed_task(make_task("Done")))
+
+            def recent():
+                db.cache.invalidate()
+                if db.archive is not None:
+                    db.archive._sealed.clear()
+                return db.get_completed_tasks(user_id, since=since)
+
+            size = sum(path.stat().st_size for path in Path(directory).rglob("*") if path.is_file())
+            rows.append([
+                "archive" if archive else "single file (current)",
+                f"{best_of(complete, args.repeat) * 1000:.2f}",
+                f"{best_of(recent, args.repeat) * 1000:.2f}",
+                size
+            ])
+    print_table(["completed tasks", "complete ms", "last 30 days ms", "bytes on disk"], rows)
+
+
+def _stress_worker(base_dir: str, worker: int, operations: int, options: dict) -> List[str]:
+    """Add tasks and move every third one to completed tasks, like the CLI does."""
+    db = DatabaseManager(base_dir=Path(base_dir), **options)
+    prefix = f"w{worker}-"
+    created = []
+    for i in range(operations):
+        name = f"{prefix}{i}"
+        db.save_user_task(STRESS_USER_ID, make_task(name))
+        created.append(name)
+        if i % 3 == 2:
+            with db.transaction():
+                tasks = [task for task in db.get_user_tasks(STRESS_USER_ID) if task["name"].startswith(prefix)]
+                if not tasks:  # lost to a concurrent writer
+                    continue
+                task = tasks[0]
+                db.add_completed_task(STRESS_USER_ID, make_completed_task(task))
+                db.delete_user_task(STRESS_USER_ID, task["task_id"])
+    db.flush()  # pool workers exit without running atexit handlers
+    return created
+
+
+def bench_stress(args):
+    """Run concurrent writer processes against one data directory and check no task is lost."""
+    options = {"journal": args.journal, "layout": args.layout, "locking": not args.no_locking}
+    with tempfile.TemporaryDirectory() as directory:
+        DatabaseManager(base_dir=Path(directory), **options)
+        start = time.perf_counter()
+        with Pool(args.processes) as pool:
+            results = pool.starmap(
+                _stress_worker, [(directory, worker, args.operations, options) for worker in range(args.processes)]
+            )
+        elapsed = time.perf_counter() - start
+
+        db = DatabaseManager(base_dir=Path(directory), **options)
+        stored = Counter(task["name"] for task in db.get_user_tasks(STRESS_USER_ID))
+        stored.update(task["name"] for task in db.get_completed_tasks(STRESS_USER_ID))
+
+    created = {name for names in results for name in names}
+    lost = created - set(stored)
+    duplicated = [name for name, count in stored.items() if count > 1]
+    print(f"{args.processes} processes x {args.operations} tasks in {elapsed:.2f}s "
+          f"({len(created) / elapsed:.0f} tasks/s)")
+    print(f"created: {len(created)}, stored: {sum(stored.values())}, "
+          f"lost: {len(lost)}, duplicated: {len(duplicated)}")
+    if lost or duplicated:
+        raise SystemExit(1)
+
+
+def bench_validation(args):
+    """Measure what schema validation adds to a write, and how fast fsck checks whole files."""
+    import jsonschema
+
+    from .schemas import ONGOING_TASKS_SCHEMA, TASK_SCHEMA
+    from .validation import check_documents, validate_record
+
+    document = make_tasks_document(args.users, args.tasks)
+    task = document["1"][0]
+    print(f"{args.users} users x {args.tasks} tasks")
+
+    rows = []
+    with tempfile.TemporaryDirectory() as directory:
+        for journal in (False, True):
+            for validate in (False, True):
+                db = DatabaseManager(base_dir=Path(directory) / f"{journal}-{validate}", journal=journal,
+                                     validate=validate)
+                db._save_json(db.ongoing_tasks_file, document)
+
+                def write():
+                    for i in range(args.writes):
+                        db.update_user_task(1, task["task_id"], dict(task, name=f"Task {i}"))
+
+                elapsed = best_of(write, args.repeat) / args.writes
+                rows.append(["journal" if journal else "rewrite", "on" if validate else "off",
+                             f"{elapsed * 1000:.3f}"])
+    print_table(["write mode", "validation", "ms per write"], rows)
+
+    record_validator = jsonschema.validators.validator_for(TASK_SCHEMA)(TASK_SCHEMA)
+    document_validator = jsonschema.validators.validator_for(ONGOING_TASKS_SCHEMA)(ONGOING_TASKS_SCHEMA)
+    rows = [
+        ["compiled record", f"{best_of(lambda: validate_record('tasks', task), args.repeat) * 1e6:.1f} us"],
+        ["jsonschema record", f"{best_of(lambda: record_validator.is_valid(task), args.repeat) * 1e6:.1f} us"],
+        ["jsonschema whole file", f"{best_of(lambda: document_validator.is_valid(document), 1) * 1000:.1f} ms"],
+        ["fsck, 1 process", f"{best_of(lambda: check_documents({'tasks': document}, 1), 1) * 1000:.1f} ms"],
+        [f"fsck, {os.cpu_count()} processes",
+         f"{best_of(lambda: check_documents({'tasks': document}), 1) * 1000:.1f} ms"]
+    ]
+    print_table(["validation", "time"], rows)
+
+
+def _count_calls(module, name: str, calls: List[str]):
+    """Record every call of a module or object function in calls, and return the original."""
+    func = getattr(module, name)
+
+    def counted(*args, **kwargs):
+        calls.append(name)
+        return func(*args, **kwargs)
+    setattr(module, name, counted)
+    return func
+
+
+async def _async_workload(db: DatabaseManager, mode: str, requests: int, tasks: int) -> float:
+    """Run a burst of reads and writes of a few users, and return the longest event loop stall."""
+    lag = 0.0
+    running = True
+
+    async def ticker():
+        nonlocal lag
+        while running:
+            start = time.perf_counter()
+            await asyncio.sleep(0.001)
+            lag = max(lag, time.perf_counter() - start - 0.001)
+
+    def operations(target):
+        for i in range(requests):
+            user_id = str(i % 10 + 1)
+            if i % 10 == 9:
+                task_id = i % tasks + 1
+                yield target.update_user_task, (user_id, task_id, dict(make_task(f"Task {i}"), task_id=task_id))
+            else:
+                yield target.get_user_tasks, (user_id,)
+
+    tick = asyncio.ensure_future(ticker())
+    await asyncio.sleep(0.01)
+    loop = asyncio.get_running_loop()
+    if mode == "blocking":
+        for func, args in operations(db):
+            func(*args)
+            await asyncio.sleep(0)
+    elif mode == "executor":
+        await asyncio.gather(*(loop.run_in_executor(None, func, *args) for func, args in operations(db)))
+    else:
+        async with AsyncDatabaseManager(db) as adb:
+            await asyncio.gather(*(func(*args) for func, args in operations(adb)))
+    running = False
+    await tick
+    return lag
+
+
+def bench_async(args):
+    """Compare a burst of concurrent requests on a cold file: blocking calls, a plain executor and the asyncio API."""
+    document = make_tasks_document(args.users, args.tasks)
+    rows = []
+    with tempfile.TemporaryDirectory() as directory:
+        for mode in ("blocking", "executor", "async"):
+            base_dir = Path(directory) / mode
+            writer = DatabaseManager(base_dir=base_dir)
+            writer._save_json(writer.ongoing_tasks_file, document)
+            db = DatabaseManager(base_dir=base_dir)  # nothing cached
+
+            calls: List[str] = []
+            originals = [(module, name, _count_calls(module, name, calls))
+                         for module, name in ((formats, "loads"), (stream, "loads_by_offsets"),
+                                              (stream, "read_value"), (db, "get_user_tasks"))]
+            try:
+                start = time.perf_counter()
+                lag = asyncio.run(_async_workload(db, mode, args.requests, args.tasks))
+                elapsed = time.perf_counter() - start
+            finally:
+                for module, name, func in originals:
+                    setattr(module, name, func)
+
+            counts = Counter(calls)
+            rows.append([mode, counts["get_user_tasks"], counts["loads"] + counts["loads_by_offsets"],
+                         counts["read_value"], f"{lag * 1000:.1f}", f"{elapsed * 1000:.0f}"])
+
+    print(f"{args.users} users x {args.tasks} tasks, {args.requests} requests (1 in 10 a write)")
+    print_table(["mode", "task reads", "file parses", "user decodes", "max loop stall ms", "total ms"], rows)
+
+
+def bench_write_behind(args):
+    """Compare a burst of task writes with and without write-behind buffering."""
+    document = make_tasks_document(args.users, args.tasks)
+    print(f"{args.users} users x {args.tasks} tasks, {args.writes} writes to {min(args.users, 10)} users")
+
+    rows = []
+    with tempfile.TemporaryDirectory() as directory:
+        for interval in (0, 1.0):
+            base_dir = Path(directory) / str(interval)
+            db = DatabaseManager(base_dir=base_dir, journal=args.journal, write_behind=interval)
+            db._save_json(db.ongoing_tasks_file, document)
+
+            written = []
+            persist = db._persist
+
+            def counted(file_path, data, ops):
+                result = persist(file_path, data, ops)
+                written.append(os.path.getsize(file_path))
+                return result
+            db._persist = counted
+
+            start = time.perf_counter()
+            for i in range(args.writes):
+                db.save_user_task(str(i % 10 + 1), make_task(f"Burst {i}"))
+            db.flush()
+            elapsed = time.perf_counter() - start
+            rewritten = "-" if args.journal else f"{sum(written) / 1e6:.1f}"  # journals are appended to
+            rows.append(["write-behind" if interval else "write-through", len(written), rewritten,
+                         f"{elapsed * 1000:.0f}", f"{args.writes / elapsed:.0f}"])
+    print_table(["mode", "file writes", "MB rewritten", "total ms", "writes/s"], rows)
+
+
+def bench_fsync(args):
+    """Compare write throughput under each fsync policy, rewriting files and appending to journals."""
+    from .durability import FSYNC_POLICIES
+
+    document = make_tasks_document(args.users, args.tasks)
+    print(f"{args.users} users x {args.tasks} tasks, {args.writes} task updates")
+
+    rows = []
+    # /tmp is often in memory, where fsync costs nothing
+    with tempfile.TemporaryDirectory(dir=args.dir) as directory:
+        for journal in (False, True):
+            for policy in FSYNC_POLICIES:
+                db = DatabaseManager(base_dir=Path(directory) / f"{journal}-{policy}", journal=journal, fsync=policy)
+                db._save_json(db.ongoing_tasks_file, document)
+                task = document["1"][0]
+
+                start = time.perf_counter()
+                for i in range(args.writes):
+                    db.update_user_task("1", task["task_id"], dict(task, name=f"Task {i}"))
+                elapsed = time.perf_counter() - start
+                db.durability.sync()
+                rows.append(["journal" if journal else "rewrite", policy,
+                             f"{elapsed / args.writes * 1000:.3f}", f"{args.writes / elapsed:.0f}"])
+    print_table(["write mode", "fsync", "ms per write", "writes/s"], rows)
+
+
+def bench_backends(args):
+    """Run one workload on every backend; the memory backend shows the engine cost without disk I/O."""
+    from .backends import BACKENDS, create_database_manager
+
+    print(f"{args.users} users x {args.tasks} tasks, {args.operations} operations of each kind")
+    rows = []
+    with tempfile.TemporaryDirectory(dir=args.dir) as directory:
+        for backend in BACKENDS:
+            db = create_database_manager(backend, base_dir=Path(directory) / backend)
+            user_ids = [str(user_id) for user_id in range(1, args.users + 1)]
+
+            start = time.perf_counter()
+            for user_id in user_ids:
+                db.save_user_tasks(user_id, [make_task(f"Task {i}") for i in range(args.tasks)])
+            load = time.perf_counter() - start
+
+            def add():
+                for i in range(args.operations):
+                    db.save_user_task(user_ids[i % len(user_ids)], make_task(f"Added {i}"))
+
+            def read():
+                for i in range(args.operations):
+                    db.get_user_tasks(user_ids[i % len(user_ids)])
+
+            def query():
+                for i in range(args.operations):
+                    db.query(user_ids[i % len(user_ids)], {"status": "In Progress"}, order_by="due_date", limit=10)
+
+            timings = [best_of(func, 1) / args.operations * 1000 for func in (add, read, query)]
+            rows.append([backend, f"{load:.2f}"] + [f"{timing:.3f}" for timing in timings])
+            if hasattr(db, "close"):
+                db.close()
+    print_table(["backend", "load s", "add ms", "read ms", "query ms"], rows)
+
+
+def bench_migrate(args):
+    """Compare upgrading a data file from format version 1 by streaming it with loading it whole."""
+    from .durability import Durability
+
+    document = make_tasks_document(args.users, args.tasks)
+    for tasks in document.values():
+        for task in tasks:
+            del task["priority"], task["category"]
+    content = formats.dumps(document, "pretty")
+    del document
+    print(f"{args.users} users x {args.tasks} tasks, {len(content)} bytes")
+
+    rows = []
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / "ongoing_tasks.json"
+        durability = Durability("none")
+
+        def whole():
+            with open(path, 'rb') as f:
+                data = formats.loads(f.read())
+            migrations.upgrade("tasks", data, migrations.split_header(data))
+            durability.write_atomic(path, formats.dumps(migrations.with_header(data), "pretty"))
+
+        def streamed():
+            migrations.migrate_file(path, "tasks", durability)
+
+        for name, func in (("load whole", whole), ("stream", streamed)):
+            path.write_bytes(content)
+            start = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - start
+            path.write_bytes(content)
+            rows.append([name, f"{elapsed:.2f}", f"{args.users / elapsed:.0f}", peak_memory(func)])
+    print_table(["migration", "s", "users/s", "peak bytes"], rows)
+
+
+def bench_hashing(args):
+    """Compare a burst of password verifications run inline with the hashing service's pools."""
+    from ..auth import hashing
+
+    print("cost  ms per hash")
+    for rounds in range(hashing.PROBE_ROUNDS, args.rounds + 1):
+        print(f"{rounds:4d}  {hashing.time_hash(rounds, repeat=1) * 1000:11.1f}")
+
+    stored = hashing.hash_password("secret", args.rounds)
+    print(f"\n{args.logins} logins at cost {args.rounds}, {args.workers} workers")
+
+    def inline():
+        for _ in range(args.logins):
+            hashing.check_password("secret", stored)
+
+    timings = [("inline", best_of(inline, 1))]
+    for pool in ("thread", "process"):
+        hasher = hashing.PasswordHasher(rounds=args.rounds, workers=args.workers, pool=pool)
+        hasher.verify("secret", stored)  # start the workers
+
+        def pooled():
+            futures = [hasher.submit_verify("secret", stored) for _ in range(args.logins)]
+            assert all(future.result() for future in futures)
+
+        timings.append((f"{pool} pool", best_of(pooled, 1)))
+        hasher.close()
+    print_table(["verification", "total s", "logins/s"],
+                [[name, f"{elapsed:.2f}", f"{args.logins / elapsed:.1f}"] for name, elapsed in timings])
+
+
+def bench_sessions(args):
+    """Compare resuming a session token with verifying the password at every start."""
+    from ..auth import hashing, sessions
+
+    stored = hashing.hash_password("secret", args.rounds)
+    with tempfile.TemporaryDirectory() as directory:
+        store = sessions.SessionStore(Path(directory))
+        token = store.issue("user")
+
+        def password():
+            for _ in range(args.starts):
+                assert hashing.check_password("secret", stored)
+
+        def session():
+            for _ in range(args.starts):
+                assert store.verify(token) == "user"
+
+        issue = best_of(lambda: store.issue("user"), args.repeat)
+        timings = [(f"password (cost {args.rounds})", best_of(password, 1)),
+                   ("session token", best_of(session, args.repeat))]
+    print(f"{args.starts} starts; issuing a session takes {issue * 1e6:.0f} us")
+    print_table(["authentication", "total s", "us per start"],
+                [[name, f"{elapsed:.3f}", f"{elapsed / args.starts * 1e6:.1f}"] for name, elapsed in timings])
+
+
+def bench_directory(args):
+    """Compare user lookups through the user directory with the users file and its offset index."""
+    users = {f"user{i}": {"userid": i, "password": "$2b$12$" + "x" * 53} for i in range(1, args.users + 1)}
+    sample = random.Random(0).sample(range(1, args.users + 1), min(args.lookups, args.users))
+    print(f"{args.users} users, {len(sample)} lookups")
+
+    with tempfile.TemporaryDirectory() as base_dir:
+        db = DatabaseManager(base_dir=Path(base_dir), validate=False, fsync="none")
+        start = time.perf_counter()
+        db.save_users(users)
+        saved = time.perf_counter() - start
+        signature, offsets = db._file_signature(db.users_file), db._offsets(db.users_file)
+        built = best_of(lambda: dumps_directory(signature, users, offsets), 1)
+        size = directory_path(db.users_file).stat().st_size
+        print(f"saving the users took {saved:.2f}s, of which {built:.2f}s building the {size} byte directory")
+        del users
+
+        def fresh():
+            """A manager as a new process would open it, with nothing loaded."""
+            return DatabaseManager(base_dir=Path(base_dir), validate=False)
+
+        def whole():
+            return fresh().get_all_users()[f"user{sample[0]}"]["userid"]
+
+        def offset_index():
+            manager = fresh()
+            return stream.read_value(manager.users_file, manager._offsets(manager.users_file)[f"user{sample[0]}"])
+
+        rows = [["first lookup: load users file", f"{best_of(whole, 1) * 1000:.1f}"],
+                ["first lookup: offset index", f"{best_of(offset_index, 1) * 1000:.1f}"]]
+        for name, lookup in (("get_user_id", lambda m, i: m.get_user_id(f"user{i}")),
+                             ("get_username", lambda m, i: m.get_username(i)),
+                             ("get_user", lambda m, i: m.get_user(f"user{i}"))):
+            managers = [fresh() for _ in range(min(20, len(sample)))]
+            first = best_of(lambda: [lookup(manager, i) for manager, i in zip(managers, sample)], 1) / len(managers)
+            manager = fresh()
+            each = best_of(lambda: [lookup(manager, i) for i in sample], args.repeat) / len(sample)
+            rows.append([f"first lookup: directory {name}", f"{first * 1000:.3f}"])
+            rows.append([f"later lookups: directory {name}", f"{each * 1000:.3f}"])
+    print_table(["lookup", "ms"], rows)
+
+
+def bench_admission(args):
+    """Measure a legitimate user's logins during a storm of failed logins, with and without admission control.
+
+    The attackers all log in from one source and the user from another, as two local accounts would.
+    """
+    import threading
+    from ..auth import admission, hashing
+
+    stored = hashing.hash_password("secret", args.rounds)
+    hash_ms = hashing.time_hash(args.rounds) * 1000
+    workers = os.cpu_count() or 1
+    target = "all usernames" if args.spray else "the user's own username"
+    print(f"{args.attackers} attackers failing logins for {target} for {args.seconds}s; "
+          f"{hash_ms:.0f} ms per hash, {workers} CPU(s)")
+
+    def storm(controller):
+        stop = time.monotonic() + args.seconds
+        verifications, legit = Counter(), []
+
+        def attempt(username, password, source):
+            try:
+                if controller is not None:
+                    controller.admit(username, source)
+                    with controller.verifying():
+                        ok = hashing.check_password(password, stored)
+                    controller.record(username, ok, source)
+                else:
+                    ok = hashing.check_password(password, stored)
+                verifications["run"] += 1
+                return ok
+            except admission.LoginRejected:
+                verifications["rejected"] += 1
+                # A client's round trip; attackers spinning in this interpreter would otherwise starve
+                # the threads holding verification slots of the GIL
+                time.sleep(0.001)
+                return False
+
+        def attacker(number):
+            attempts = 0
+            while time.monotonic() < stop:
+                attempts += 1
+                attempt(f"user{number}-{attempts}" if args.spray else "alice", "wrong", "attacker")
+
+        def user():
+            while time.monotonic() < stop:
+                start = time.perf_counter()
+                ok = attempt("alice", "secret", "user")
+                legit.append((ok, time.perf_counter() - start))
+                time.sleep(1 / LOGIN_USER_RATE)  # as often as the user's own limit allows
+
+        threads = [threading.Thread(target=attacker, args=(n,)) for n in range(args.attackers)]
+        threads.append(threading.Thread(target=user))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        succeeded = [elapsed for ok, elapsed in legit if ok]
+        return [f"{verifications['run'] / args.seconds:.1f}", verifications["rejected"],
+                f"{len(succeeded)}/{len(legit)}",
+                f"{sum(succeeded) / len(succeeded) * 1000:.0f}" if succeeded else "-"]
+
+    controller = admission.AdmissionController(max_inflight=workers, global_rate=workers * 500 / hash_ms)
+    rows = [["none"] + storm(None), ["admission control"] + storm(controller)]
+    print_table(["limits", "hashes/s", "rejected", "user logins ok", "user login ms"], rows)
+    print(controller.stats())
+
+
+def bench_provision(args):
+    """Compare registering users one at a time with bulk registration."""
+    from ..auth import hashing
+    from ..auth.provisioning import BulkRegistration
+
+    records = [(number, {"username": f"user{number}", "password": f"secret{number}"}, None)
+               for number in range(1, args.users + 1)]
+    hasher = hashing.PasswordHasher(rounds=args.rounds, workers=args.workers, pool="thread")
+    print(f"{args.users} users at cost {args.rounds}, {args.workers} hashing process(es)")
+
+    def one_by_one(db):
+        # What Register does for each user
+        for _, record, _ in records:
+            if db.get_user(record["username"]):
+                continue
+            password = hashing.hash_password(record["password"], args.rounds)
+            db.save_user(record["username"], {"userid": db.allocate_user_id(), "password": password})
+
+    def bulk(db):
+        stats = BulkRegistration(db, hasher, args.workers).run(records)
+        assert stats["registered"] == args.users
+
+    rows = []
+    for name, register in (("one by one", one_by_one), ("bulk", bulk)):
+        with tempfile.TemporaryDirectory() as directory:
+            db = DatabaseManager(base_dir=Path(directory))
+            start = time.perf_counter()
+            register(db)
+            elapsed = time.perf_counter() - start
+            assert len(db.get_all_users()) == args.users
+        rows.append([name, f"{elapsed:.2f}", f"{args.users / elapsed:.1f}"])
+    print_table(["registration", "total s", "users/s"], rows)
+
+
+def build_parser():
+    """Build the benchmark command line parser."""
+    parser = argparse.ArgumentParser(prog="python -m tasks.database.benchmark")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per measurement (fastest is reported)")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    formats_parser = subparsers.add_parser("formats", help="Compare storage formats")
+    formats_parser.add_argument("--users", type=int, default=1000)
+    formats_parser.add_argument("--tasks", type=int, default=20, help="Tasks per user")
+    formats_parser.set_defaults(func=bench_formats)
+
+    stream_parser = subparsers.add_parser("stream", help="Compare single-user reads with full parses")
+    stream_parser.add_argument("--users", type=int, default=5000)
+    stream_parser.add_argument("--tasks", type=int, default=20, help="Tasks per user")
+    stream_parser.set_defaults(func=bench_stream)
+
+    indexes_parser = subparsers.add_parser("indexes", help="Compare indexed ordering with sorting")
+    indexes_parser.add_argument("--tasks", type=int, default=20000, help="Tasks of the user")
+    indexes_parser.set_defaults(func=bench_indexes)
+
+    archive_parser = subparsers.add_parser("archive", help="Compare the completed task archive with one file")
+    archive_parser.add_argument("--users", type=int, default=1000)
+    archive_parser.add_argument("--tasks", type=int, default=100, help="Completed tasks per user")
+    archive_parser.add_argument("--months", type=int, default=12, help="Months the history spans")
+    archive_parser.set_defaults(func=bench_archive)
+
+    stress_parser = subparsers.add_parser("stress", help="Check concurrent processes never lose a task")
+    stress_parser.add_argument("--processes", type=int, default=8)
+    stress_parser.add_argument("--operations", type=int, default=60, help="Tasks added per process")
+    stress_parser.add_argument("--journal", action="store_true", help="Use journaled writes")
+    stress_parser.add_argument("--layout", choices=["single", "sharded"], default="single")
+    stress_parser.add_argument("--no-locking", action="store_true", help="Disable file locking")
+    stress_parser.set_defaults(func=bench_stress)
+
+    validation_parser = subparsers.add_parser("validation", help="Measure schema validation overhead")
+    validation_parser.add_argument("--users", type=int, default=1000)
+    validation_parser.add_argument("--tasks", type=int, default=20, help="Tasks per user")
+    validation_parser.add_argument("--writes", type=int, default=20, help="Writes per measurement")
+    validation_parser.set_defaults(func=bench_validation)
+
+    async_parser = subparsers.add_parser("async", help="Compare concurrent requests through the asyncio API")
+    async_parser.add_argument("--users", type=int, default=2000)
+    async_parser.add_argument("--tasks", type=int, default=20, help="Tasks per user")
+    async_parser.add_argument("--requests", type=int, default=100, help="Concurrent requests")
+    async_parser.set_defaults(func=bench_async)
+
+    write_behind_parser = subparsers.add_parser("writebehind", help="Compare a burst of writes with buffering")
+    write_behind_parser.add_argument("--users", type=int, default=1000)
+    write_behind_parser.add_argument("--tasks", type=int, default=20, help="Tasks per user")
+    write_behind_parser.add_argument("--writes", type=int, default=100, help="Tasks added in the burst")
+    write_behind_parser.add_argument("--journal", action="store_true", help="Use journaled writes")
+    write_behind_parser.set_defaults(func=bench_write_behind)
+
+    fsync_parser = subparsers.add_parser("fsync", help="Compare write throughput of the fsync policies")
+    fsync_parser.add_argument("--users", type=int, default=100)
+    fsync_parser.add_argument("--tasks", type=int, default=20, help="Tasks per user")
+    fsync_parser.add_argument("--writes", type=int, default=200, help="Task updates per policy")
+    fsync_parser.add_argument("--dir", help="Directory on the disk to measure (a temporary directory by default)")
+    fsync_parser.set_defaults(func=bench_fsync)
+
+    backends_parser = subparsers.add_parser("backends", help="Compare the JSON, SQLite and memory backends")
+    backends_parser.add_argument("--users", type=int, default=200)
+    backends_parser.add_argument("--tasks", type=int, default=20, help="Tasks per user")
+    backends_parser.add_argument("--operations", type=int, default=200, help="Operations of each kind")
+    backends_parser.add_argument("--dir", help="Directory on the disk to measure (a temporary directory by default)")
+    backends_parser.set_defaults(func=bench_backends)
+
+    migrate_parser = subparsers.add_parser("migrate", help="Compare streamed and in-memory format migrations")
+    migrate_parser.add_argument("--users", type=int, default=5000)
+    migrate_parser.add_argument("--tasks", type=int, default=20, help="Tasks per user")
+    migrate_parser.set_defaults(func=bench_migrate)
+
+    hashing_parser = subparsers.add_parser("hashing", help="Compare password verification inline and in pools")
+    hashing_parser.add_argument("--logins", type=int, default=32, help="Verifications in the burst")
+    hashing_parser.add_argument("--rounds", type=int, default=10, help="bcrypt cost")
+    hashing_parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Pool size")
+    hashing_parser.set_defaults(func=bench_hashing)
+
+    sessions_parser = subparsers.add_parser("sessions", help="Compare session tokens with password verification")
+    sessions_parser.add_argument("--starts", type=int, default=20, help="Authenticated starts")
+    sessions_parser.add_argument("--rounds", type=int, default=10, help="bcrypt cost")
+    sessions_parser.set_defaults(func=bench_sessions)
+
+    directory_parser = subparsers.add_parser("directory", help="Compare user lookups with and without the directory")
+    directory_parser.add_argument("--users", type=int, default=1000000)
+    directory_parser.add_argument("--lookups", type=int, default=1000, help="Random users looked up")
+    directory_parser.set_defaults(func=bench_directory)
+
+    admission_parser = subparsers.add_parser("admission", help="Measure logins during a storm of failed logins")
+    admission_parser.add_argument("--attackers", type=int, default=8, help="Threads failing logins")
+    admission_parser.add_argument("--seconds", type=float, default=30)
+    admission_parser.add_argument("--rounds", type=int, default=10, help="bcrypt cost")
+    admission_parser.add_argument("--spray", action="store_true", help="Attack a new username with every attempt")
+    admission_parser.set_defaults(func=bench_admission)
+
+    provision_parser = subparsers.add_parser("provision", help="Compare one-by-one and bulk user registration")
+    provision_parser.add_argument("--users", type=int, default=1000)
+    provision_parser.add_argument("--rounds", type=int, default=10, help="bcrypt cost")
+    provision_parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Hashing processes")
+    provision_parser.set_defaults(func=bench_provision)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
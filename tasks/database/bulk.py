@@ -0,0 +1,369 @@
+"""Streaming bulk import and export of users and tasks.
+
+Records are read from and written to CSV or JSON Lines files one at a time, so
+memory stays bounded by the chunk size however large the file is. Every chunk
+is validated, grouped by user and written in a single transaction, with the
+IDs of each user's new records allocated as one block.
+
+Tasks name their owner with a `user_id` or `username` column. Records that do
+not validate are reported with their line number and skipped.
+"""
+
+import csv
+import json
+import sys
+import time
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
+
+from . import schemas
+from .indexes import PRIORITY_RANKS
+from ..constants import DATE_FORMAT, DATETIME_FORMAT
+from ..i18n import language_manager
+
+KINDS = ("tasks", "completed", "users")
+FILE_FORMATS = ("csv", "jsonl")
+DEFAULT_CHUNK_SIZE = 10000
+
+TASK_FIELDS = ("task_id", "name", "description", "priority", "category", "status", "created_at", "due_date")
+COMPLETED_FIELDS = ("completed_id", "name", "description", "priority", "category", "status",
+                    "created_at", "due_date", "completed_at")
+USER_FIELDS = ("username", "userid", "password")
+OWNER_FIELDS = ("user_id", "username")
+
+BCRYPT_HASH_LENGTH = 60
+
+
+# The texts schemas.py allows, as sets for membership tests
+STATUSES = set(schemas.STATUSES)
+COMPLETED_STATUSES = set(schemas._translations("STATUS_COMPLETED"))
+CATEGORIES = set(schemas.CATEGORIES)
+
+
+def columns(kind: str) -> Tuple[str, ...]:
+    """Get the columns of an exported file of some kind."""
+    if kind == "users":
+        return USER_FIELDS
+    return OWNER_FIELDS + (COMPLETED_FIELDS if kind == "completed" else TASK_FIELDS)
+
+
+def detect_format(path: str, file_format: Optional[str] = None) -> str:
+    """Get the format of a file from its extension unless given; stdin and stdout default to JSON Lines."""
+    if file_format:
+        if file_format not in FILE_FORMATS:
+            raise ValueError(f"Unknown file format: {file_format}")
+        return file_format
+    return "csv" if Path(path).suffix.lower() == ".csv" else "jsonl"
+
+
+@contextmanager
+def open_text(path: str, mode: str):
+    """Open a text file for streaming, with "-" meaning stdin or stdout."""
+    if path == "-":
+        yield sys.stdin if mode == "r" else sys.stdout
+        return
+    with open(path, mode, encoding="utf-8", newline="") as f:
+        yield f
+
+
+# Reading
+def read_records(f: TextIO, file_format: str) -> Iterator[Tuple[int, Optional[Dict[str, Any]], Optional[str]]]:
+    """Read records one at a time.
+
+    Yields:
+        (line number, record, error) triples; the record is None if the line could not be parsed
+    """
+    if file_format == "csv":
+        reader = csv.DictReader(f)
+        for row in reader:
+            if None in row:
+                yield reader.line_num, None, "too many columns"
+                continue
+            # CSV cannot tell an empty value from a missing one
+            yield reader.line_num, {key: value for key, value in row.items() if value not in ("", None)}, None
+        return
+
+    for line_number, line in enumerate(f, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield line_number, None, f"invalid JSON: {e}"
+            continue
+        if isinstance(record, dict):
+            yield line_number, {key: value for key, value in record.items() if value is not None}, None
+        else:
+            yield line_number, None, "not a JSON object"
+
+
+# Validation
+def _text(record: Dict[str, Any], field: str, default: Optional[str] = None) -> Optional[str]:
+    """Get a text field of a record."""
+    value = record.get(field, default)
+    if value is not None and not isinstance(value, str):
+        raise ValueError(f"{field} must be text")
+    return value
+
+
+def _positive_int(record: Dict[str, Any], field: str) -> Optional[int]:
+    """Get an optional positive integer field of a record; CSV values arrive as text."""
+    value = record.get(field)
+    if value is None:
+        return None
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{field} must be an integer") from None
+    if isinstance(value, (bool, float)) or number < 1:
+        raise ValueError(f"{field} must be a positive integer")
+    return number
+
+
+def _choice(record: Dict[str, Any], field: str, choices, default: Optional[str] = None) -> Optional[str]:
+    """Get a field that must be one of the texts any language uses for it."""
+    value = _text(record, field, default)
+    if value is not None and value not in choices:
+        raise ValueError(f"unknown {field}: {value!r}")
+    return value
+
+
+def _datetime(record: Dict[str, Any], field: str, default: datetime) -> datetime:
+    """Get a date or date-time field, parsed in the stored formats."""
+    value = _text(record, field)
+    if value is None:
+        return default
+    for date_format in (DATETIME_FORMAT, DATE_FORMAT):
+        try:
+            return datetime.strptime(value, date_format)
+        except ValueError:
+            pass
+    raise ValueError(f"{field} must look like {datetime(2024, 12, 31).strftime(DATETIME_FORMAT)}")
+
+
+def validate_task(record: Dict[str, Any], completed: bool = False) -> Dict[str, Any]:
+    """Check a task record and fill in the fields adding or completing a task would set.
+
+    Returns:
+        The task as it is stored
+
+    Raises:
+        ValueError: If a field is missing or invalid
+    """
+    name = _text(record, "name")
+    if not name or not name.strip():
+        raise ValueError("name is required")
+    created_at = _datetime(record, "created_at", datetime.now())
+    due_date = _datetime(record, "due_date", created_at + timedelta(days=1))
+
+    task = {
+        "name": name,
+        "description": _text(record, "description", ""),
+        "priority": _choice(record, "priority", PRIORITY_RANKS),
+        "category": _choice(record, "category", CATEGORIES),
+        "created_at": created_at.strftime(DATETIME_FORMAT),
+        "due_date": due_date.strftime(DATETIME_FORMAT)
+    }
+    id_field = "completed_id" if completed else "task_id"
+    task_id = _positive_int(record, id_field)
+    if task_id is not None:
+        task[id_field] = task_id
+    if completed:
+        task["status"] = _choice(record, "status", COMPLETED_STATUSES, language_manager.get_text("STATUS_COMPLETED"))
+        task["completed_at"] = _datetime(record, "completed_at", datetime.now()).strftime(DATETIME_FORMAT)
+    else:
+        task["status"] = _choice(record, "status", STATUSES, language_manager.get_text("STATUS_IN_PROGRESS"))
+    return task
+
+
+def validate_user(record: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+    """Check a user record; passwords must already be bcrypt hashes.
+
+    Returns:
+        The username and the user data as it is stored, without a userid if none was given
+
+    Raises:
+        ValueError: If a field is missing or invalid
+    """
+    username = _text(record, "username")
+    if not username or username != username.strip():
+        raise ValueError("username is required and must not start or end with spaces")
+    password = _text(record, "password")
+    if not password or len(password) != BCRYPT_HASH_LENGTH or not password.startswith("$2"):
+        raise ValueError("password must be a bcrypt hash")
+    user = {"password": password}
+    userid = _positive_int(record, "userid")
+    if userid is not None:
+        user["userid"] = userid
+    return username, user
+
+
+# Import
+class BulkImporter:
+    def __init__(self, db, kind: str, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 progress: Optional[Callable[[Dict[str, Any]], None]] = None):
+        """Initialize an import into a database.
+
+        Args:
+            db: The database manager to import into (either backend)
+            kind: What the records are: "tasks", "completed" or "users"
+            chunk_size: Records written per transaction
+            progress: Called with the statistics after every chunk
+        """
+        if kind not in KINDS:
+            raise ValueError(f"Unknown record kind: {kind}")
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be positive")
+        self.db = db
+        self.kind = kind
+        self.chunk_size = chunk_size
+        self.progress = progress
+        self.errors: List[Tuple[int, str]] = []
+        self.stats = {"read": 0, "imported": 0, "skipped": 0, "invalid": 0, "seconds": 0.0}
+
+        users = db.get_all_users()
+        self._usernames = {username: str(user["userid"]) for username, user in users.items()}
+        self._user_ids = set(self._usernames.values())
+
+    def _owner(self, record: Dict[str, Any]) -> str:
+        """Get the ID of the existing user a task record belongs to."""
+        if record.get("user_id") is not None:
+            user_id = str(record["user_id"])
+            if user_id not in self._user_ids:
+                raise ValueError(f"unknown user_id: {user_id}")
+            return user_id
+        username = record.get("username")
+        if username is None:
+            raise ValueError("user_id or username is required")
+        if username not in self._usernames:
+            raise ValueError(f"unknown username: {username!r}")
+        return self._usernames[username]
+
+    def _invalid(self, line_number: int, error: str):
+        """Count a record that could not be imported, keeping its error for the report."""
+        self.stats["invalid"] += 1
+        self.errors.append((line_number, error))
+
+    def run(self, records: Iterable[Tuple[int, Optional[Dict[str, Any]], Optional[str]]]) -> Dict[str, Any]:
+        """Import records as returned by read_records.
+
+        Returns:
+            The statistics: records read, imported, skipped (existing users) and
+            invalid, and the seconds taken
+        """
+        # Journaled JSON databases compact once at the end instead of after every few chunks
+        with getattr(self.db, "deferred_compaction", nullcontext)():
+            self._run(records)
+        return self.stats
+
+    def _run(self, records: Iterable[Tuple[int, Optional[Dict[str, Any]], Optional[str]]]):
+        """Validate and write records chunk by chunk."""
+        start = time.perf_counter()
+        chunk = []
+        for line_number, record, error in records:
+            self.stats["read"] += 1
+            if error is None:
+                try:
+                    chunk.append(self._validate(record))
+                except ValueError as e:
+                    error = str(e)
+            if error is not None:
+                self._invalid(line_number, error)
+            if len(chunk) >= self.chunk_size:
+                self._write(chunk)
+                chunk = []
+                self._report(start)
+        if chunk:
+            self._write(chunk)
+        self._report(start)
+
+    def _validate(self, record: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+        """Validate a record into the key it is stored under and its stored data."""
+        if self.kind == "users":
+            username, user = validate_user(record)
+            if username not in self._usernames and "userid" in user and str(user["userid"]) in self._user_ids:
+                raise ValueError(f"userid already in use: {user['userid']}")
+            return username, user
+        return self._owner(record), validate_task(record, completed=self.kind == "completed")
+
+    def _write(self, chunk: List[Tuple[str, Dict[str, Any]]]):
+        """Write one chunk of validated records in a single transaction."""
+        if self.kind == "users":
+            users = {}
+            for username, user in chunk:
+                if username in self._usernames or username in users:
+                    self.stats["skipped"] += 1
+                else:
+                    users[username] = user
+            # Users without a userid get new ones, allocated after the imported IDs
+            with self.db.transaction():
+                if users and not self.db.save_users(users):
+                    raise OSError("Failed to save users")
+            for username, user in users.items():
+                self._usernames[username] = str(user["userid"])
+                self._user_ids.add(str(user["userid"]))
+            self.stats["imported"] += len(users)
+            return
+
+        by_user: Dict[str, list] = {}
+        for user_id, task in chunk:
+            by_user.setdefault(user_id, []).append(task)
+        save = self.db.add_completed_tasks if self.kind == "completed" else self.db.save_user_tasks
+        with self.db.transaction():
+            for user_id, tasks in by_user.items():
+                if not save(user_id, tasks):
+                    raise OSError(f"Failed to save tasks of user {user_id}")
+        self.stats["imported"] += len(chunk)
+
+    def _report(self, start: float):
+        """Update the elapsed time and call the progress callback."""
+        self.stats["seconds"] = time.perf_counter() - start
+        if self.progress is not None:
+            self.progress(self.stats)
+
+
+# Export
+def iter_export(db, kind: str) -> Iterator[Dict[str, Any]]:
+    """Iterate over every record of a kind, one user at a time."""
+    if kind not in KINDS:
+        raise ValueError(f"Unknown record kind: {kind}")
+    users = db.get_all_users()
+    if kind == "users":
+        for username, user in users.items():
+            yield {"username": username, "userid": user.get("userid"), "password": user.get("password")}
+        return
+
+    fields = COMPLETED_FIELDS if kind == "completed" else TASK_FIELDS
+    for username, user in users.items():
+        user_id = str(user.get("userid"))
+        tasks = db.iter_completed_tasks(user_id) if kind == "completed" else db.get_user_tasks(user_id)
+        for task in tasks:
+            record = {"user_id": user_id, "username": username}
+            record.update((field, task.get(field)) for field in fields)
+            yield record
+
+
+def write_records(f: TextIO, file_format: str, kind: str, records: Iterable[Dict[str, Any]],
+                  progress: Optional[Callable[[int], None]] = None, every: int = DEFAULT_CHUNK_SIZE) -> int:
+    """Write records one at a time.
+
+    Returns:
+        The number of records written
+    """
+    if file_format == "csv":
+        writer = csv.DictWriter(f, fieldnames=columns(kind), extrasaction="ignore")
+        writer.writeheader()
+        write = writer.writerow
+    else:
+        def write(record):
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    count = 0
+    for record in records:
+        write(record)
+        count += 1
+        if progress is not None and count % every == 0:
+            progress(count)
+    return count
@@ -1,75 +1,1137 @@
 """Database manager for handling JSON database operations."""
 
 import json
+import os
+import threading
+from contextlib import ExitStack, contextmanager, nullcontext
 from pathlib import Path
-from typing import Dict, Any, Optional
-from .schemas import USERS_SCHEMA, ONGOING_TASKS_SCHEMA, COMPLETED_TASKS_SCHEMA
+from datetime import datetime
+from typing import Dict, Any, Callable, Iterator, List, Mapping, Optional, Tuple, Union
+from . import formats, indexes, migrations, stream
+from .archive import CompletedArchive, completion_time, timestamp
+from .directory import DirectoryFile, UserDirectory, read_directory, write_directory
+from .durability import CorruptDocumentError, Durability
+from .indexes import TaskIndexes
+from .journal import Journal, apply_op
+from .query import Query
+from .locking import DocumentLock, LockTimeout, SharedLock
+from .migrations import DocumentVersionError
+from .sequences import SequenceAllocator
+from .shutdown import flush_at_exit
+from .validation import check_documents, validate_record
+from ..constants import (
+    DATA_DIR, DATABASE_JOURNAL, JOURNAL_COMPACT_THRESHOLD, DATABASE_LAYOUT, DATABASE_FORMAT,
+    DATABASE_LOCKING, LOCK_TIMEOUT, DATABASE_ARCHIVE, ARCHIVE_COMPRESSION, ARCHIVE_SEGMENT_SIZE,
+    DATABASE_VALIDATION, WRITE_BEHIND_INTERVAL, WRITE_BEHIND_MAX_OPS, DATABASE_FSYNC,
+    USERS_FILENAME, ONGOING_TASKS_FILENAME, COMPLETED_TASKS_FILENAME
+)
 from ..i18n import language_manager
 
 
-try:
-    import jsonschema
-    SCHEMA_VALIDATION_ENABLED = True
-except ImportError:
-    SCHEMA_VALIDATION_ENABLED = False
-    print("Warning: jsonschema package not found. Schema validation will be disabled.")
+class DocumentCache:
+    """In-process cache of parsed JSON documents keyed by file path.
+
+    Each entry remembers the (mtime, size, inode) signature of the file it was
+    parsed from, so changes made by other processes invalidate it. Cached
+    documents are shared between callers and must be treated as read-only.
+    """
+
+    def __init__(self, signature: Optional[Callable[[Path], Any]] = None):
+        """Initialize an empty cache.
+
+        Args:
+            signature: Function computing a file's validation signature
+        """
+        self._entries: Dict[Path, Tuple[Any, dict]] = {}
+        self._signature = signature or self.signature
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def signature(file_path: Path) -> Optional[Tuple[int, int, int]]:
+        """Return the (mtime, size, inode) signature of a file, or None if missing."""
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+    def get(self, file_path: Path) -> Optional[dict]:
+        """Return the cached document if the file is unchanged since it was cached."""
+        entry = self._entries.get(file_path)
+        if entry is not None and entry[0] == self._signature(file_path):
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        return None
+
+    def put(self, file_path: Path, data: dict):
+        """Cache a document using the file's current signature."""
+        signature = self._signature(file_path)
+        if signature is None:
+            self._entries.pop(file_path, None)
+        else:
+            self._entries[file_path] = (signature, data)
+
+    def invalidate(self, file_path: Optional[Path] = None):
+        """Drop one cached document, or all of them when no path is given."""
+        if file_path is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(file_path, None)
+
+    def stats(self) -> Dict[str, int]:
+        """Return hit/miss counters and the number of cached documents."""
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+
 
 class DatabaseManager:
-    def __init__(self):
-        """Initialize the database manager."""
-        self.base_dir = Path(__file__).parent.parent / "data"
-        self.base_dir.mkdir(exist_ok=True)
+    persistent = True  # False for managers that keep their documents in memory only
+
+    def __init__(self, base_dir: Optional[Path] = None, journal: Optional[bool] = None,
+                 compact_threshold: Optional[int] = None, layout: Optional[str] = None,
+                 storage_format: Optional[str] = None, locking: Optional[bool] = None,
+                 lock_timeout: Optional[float] = None, archive: Optional[bool] = None,
+                 validate: Optional[bool] = None, write_behind: Optional[float] = None,
+                 flush_threshold: Optional[int] = None, fsync: Optional[str] = None):
+        """Initialize the database manager.
+
+        Args:
+            base_dir: Directory holding the data files (DATA_DIR, set with TASKS_DATA_DIR, by default)
+            journal: Record mutations in an append-only journal instead of rewriting files
+            compact_threshold: Journal size in bytes that triggers a background compaction
+            layout: "single" for one task file per kind, "sharded" for one file per user
+            storage_format: Format data files are written in ("pretty", "compact" or "marshal")
+            locking: Guard data files with inter-process reader/writer locks
+            lock_timeout: Seconds to wait for a file lock before raising LockTimeout
+            archive: Store completed tasks in a time-partitioned, compressed archive
+            validate: Check every written user and task against its schema
+            write_behind: Seconds a change may stay buffered in memory before it is written; 0 writes at once
+            flush_threshold: Buffered operations that trigger an immediate flush in write-behind mode
+            fsync: When written data is synced to disk ("always", "batched" or "none")
+        """
+        self.base_dir = Path(base_dir) if base_dir else DATA_DIR
+        if self.persistent:
+            self.base_dir.mkdir(parents=True, exist_ok=True)
         
-        self.users_file = self.base_dir / "users.json"
-        self.ongoing_tasks_file = self.base_dir / "ongoing_tasks.json"
-        self.completed_tasks_file = self.base_dir / "completed_tasks.json"
+        self.users_file = self.base_dir / USERS_FILENAME
+        self.ongoing_tasks_file = self.base_dir / ONGOING_TASKS_FILENAME
+        self.completed_tasks_file = self.base_dir / COMPLETED_TASKS_FILENAME
+        self.shard_dirs = {
+            self.ongoing_tasks_file: self.base_dir / "ongoing",
+            self.completed_tasks_file: self.base_dir / "completed"
+        }
         
+        self.layout = (layout or DATABASE_LAYOUT).lower()
+        if self.layout not in ("single", "sharded"):
+            raise ValueError(f"Unknown database layout: {self.layout}")
+        self.storage_format = (storage_format or DATABASE_FORMAT).lower()
+        if self.storage_format not in formats.FORMATS:
+            raise ValueError(f"Unknown storage format: {self.storage_format}")
+        self.journal_enabled = DATABASE_JOURNAL if journal is None else journal
+        self.compact_threshold = compact_threshold or JOURNAL_COMPACT_THRESHOLD
+        self.locking = DATABASE_LOCKING if locking is None else locking
+        self.lock_timeout = lock_timeout or LOCK_TIMEOUT
+        self.validation_enabled = DATABASE_VALIDATION if validate is None else validate
+        self.durability = Durability((fsync or DATABASE_FSYNC).lower())
+        self._journals: Dict[Path, Journal] = {}
+        self._document_locks: Dict[Path, DocumentLock] = {}
+        self._offset_indexes: Dict[Path, Tuple[Tuple[int, int, int], Dict[str, List[int]]]] = {}
+        self._task_indexes: Dict[Path, TaskIndexes] = {}
+        self._user_directory: Optional[UserDirectory] = None
+        self._directory_file: Optional[DirectoryFile] = None
+        self._compacting = set()
+        self._compaction_deferred = False
+        self._load_locks: Dict[Path, threading.Lock] = {}
+        self._lock = SharedLock()
+        self._pending: Optional[Dict[Path, Tuple[dict, List[Dict[str, Any]]]]] = None
+        self._transaction_locks: Optional[ExitStack] = None
+        self._dirty: Dict[Path, Tuple[dict, List[Dict[str, Any]]]] = {}
+        self._dirty_ops = 0
+        self._flush_timer: Optional[threading.Timer] = None
+        self.write_behind = 0.0  # off until startup migrations and recovery are written
+        self.transaction_log = self.base_dir / f"transaction-{os.getpid()}.log"
+        self.sequences = SequenceAllocator(self.base_dir / "sequences" if self.persistent else None)
+        self.archive_dir = self.base_dir / "archive"
+        use_archive = DATABASE_ARCHIVE if archive is None else archive
+        self.archive = self._open_archive() if use_archive else None
+
+        self.cache = DocumentCache(self._document_signature)
         self._initialize_files()
 
+        self.write_behind = WRITE_BEHIND_INTERVAL if write_behind is None else write_behind
+        self.flush_threshold = flush_threshold or WRITE_BEHIND_MAX_OPS
+        if self.write_behind > 0:
+            flush_at_exit(self)
+
     def _initialize_files(self):
         """Initialize JSON files if they don't exist."""
         for file_path in [self.users_file, self.ongoing_tasks_file, self.completed_tasks_file]:
             if not file_path.exists():
-                with open(file_path, 'w') as f:
-                    json.dump({}, f)
+                with self._locked(file_path, exclusive=True):
+                    if not file_path.exists():
+                        self._save_json(file_path, {})
+        self._migrate_versions()
+        if not self.journal_enabled:
+            # Fold journals left behind by a journaled run into the data files
+            for file_path in [self.users_file, self.ongoing_tasks_file, self.completed_tasks_file]:
+                if self._journal(file_path).exists():
+                    self.compact(file_path)
+            for directory in [*self.shard_dirs.values(), self.archive_dir]:
+                for journal_path in directory.glob("*.json.journal"):
+                    self.compact(journal_path.with_suffix(""))
+        self._recover_transaction()
+        self._migrate_layout()
+        self._migrate_archive()
+
+    # Format versions
+    def _migrate_versions(self):
+        """Upgrade data files written by older versions, unless the data directory is known to be current."""
+        if migrations.read_stamp(self.base_dir) < migrations.CURRENT_VERSION:
+            self.migrate_format()
+
+    def migrate_format(self) -> int:
+        """Upgrade every data file to the current format version.
+
+        Files are streamed entry by entry with resumable checkpoints (see
+        migrations.py); afterwards the data directory is stamped with the
+        version, so later starts skip the scan.
+
+        Returns:
+            The number of files upgraded
+
+        Raises:
+            CorruptDocumentError: If a data file cannot be decoded
+            DocumentVersionError: If a data file was written by a newer version
+        """
+        stamp = self.base_dir / migrations.STAMP_FILENAME
+        upgraded = 0
+        with self._locked(stamp, exclusive=True):
+            self.flush()
+            for file_path in self._document_files():
+                if file_path.exists() and self._migrate_file(file_path):
+                    upgraded += 1
+            if upgraded:
+                self._advance_task_sequences()
+            migrations.write_stamp(self.base_dir, self.durability)
+        return upgraded
+
+    def _advance_task_sequences(self):
+        """Move task sequences past the IDs the upgrade gave to tasks that shared one."""
+        for scope in self.sequences.scopes():
+            kind, _, user_id = scope.partition("-")
+            if kind in ("tasks", "completed"):
+                self.sequences.advance(scope, self._highest_task_id(user_id, is_completed=kind == "completed"))
+
+    def _migrate_file(self, file_path: Path) -> bool:
+        """Upgrade one data file to the current format version; return whether it was older."""
+        with self._locked(file_path, exclusive=True):
+            version = migrations.read_version(file_path)
+            if version >= migrations.CURRENT_VERSION:
+                migrations.discard_progress(file_path)
+                return False
+            journal = self._journal(file_path)
+            if journal.size():
+                # The journal was appended by the older version too: fold it in and upgrade the result
+                data = journal.replay(self._read_snapshot(file_path))
+                migrations.upgrade(self._record_kind(file_path), data, version)
+                if not self._save_json(file_path, data):
+                    raise OSError(f"Failed to upgrade {file_path}")
+                journal.discard(journal.size())
+                return True
+            offsets = migrations.migrate_file(file_path, self._record_kind(file_path), self.durability)
+            self._bump_generation(file_path)
+            self._write_offsets(file_path, offsets)
+            self.cache.invalidate(file_path)
+            return True
+
+    # Sharded layout
+    def _tasks_file(self, file_path: Path, user_id: str, create: bool = False) -> Path:
+        """Get the file holding a user's tasks of the given kind.
+
+        Args:
+            file_path: The single-layout task file (ongoing or completed)
+            user_id: The user's ID
+            create: Register the user's shard in the shard index if it is new
+        """
+        if self.layout != "sharded":
+            return file_path
+        if create:
+            self._register_shard(file_path, str(user_id))
+        return self._shard_file(file_path, user_id)
+
+    def _shard_file(self, file_path: Path, user_id: str) -> Path:
+        """Get the shard of a task file that holds one user's tasks."""
+        return self.shard_dirs[file_path] / f"{user_id}.json"
+
+    def _shard_index_file(self, file_path: Path) -> Path:
+        """Get the index listing every shard of a task file."""
+        return self.shard_dirs[file_path] / "_index.json"
+
+    def _register_shard(self, file_path: Path, user_id: str):
+        """Add a user's shard to the shard index."""
+        index_file = self._shard_index_file(file_path)
+        with self._locked(index_file, exclusive=True):
+            index = self._load_json(index_file)
+            if user_id not in index:
+                index[user_id] = f"{user_id}.json"
+                self._save_json(index_file, index)
+
+    def get_shard_user_ids(self, file_path: Path) -> List[str]:
+        """Get the IDs of every user with a shard of the given task file."""
+        return list(self._load_json(self._shard_index_file(file_path)))
+
+    def _load_all_tasks(self, file_path: Path) -> Dict[str, list]:
+        """Load every user's tasks of one kind, whatever the layout."""
+        if self.layout != "sharded":
+            return self._load_json(file_path)
+        return self._load_shards(file_path)
+
+    def _load_shards(self, file_path: Path) -> Dict[str, list]:
+        """Load every shard listed in a task file's shard index."""
+        return {
+            user_id: self._load_json(self._shard_file(file_path, user_id)).get(user_id, [])
+            for user_id in self.get_shard_user_ids(file_path)
+        }
+
+    def _migrate_layout(self):
+        """Move task data written under the other layout into the configured one."""
+        for file_path, shard_dir in self.shard_dirs.items():
+            if self.layout == "sharded":
+                shard_dir.mkdir(exist_ok=True)
+                tasks = self._load_json(file_path)
+                if not tasks:
+                    continue
+                for user_id, user_tasks in tasks.items():
+                    self._commit(self._tasks_file(file_path, user_id, create=True),
+                                 [{"op": "put", "key": user_id, "value": user_tasks}], validate=False)
+                self._reset_document(file_path)
+            elif self._shard_index_file(file_path).exists():
+                tasks = self._load_shards(file_path)
+                self._commit(file_path, [
+                    {"op": "put", "key": user_id, "value": user_tasks} for user_id, user_tasks in tasks.items()
+                ], validate=False)
+                self._remove_shards(file_path)
+
+    def _remove_shards(self, file_path: Path):
+        """Delete every shard of a task file and its shard index."""
+        for user_id in self.get_shard_user_ids(file_path):
+            self._remove_document(self._shard_file(file_path, user_id))
+        self._remove_document(self._shard_index_file(file_path))
+
+    # Completed task archive
+    def _open_archive(self) -> CompletedArchive:
+        """Open the completed task archive in the data directory."""
+        return CompletedArchive(self, self.archive_dir, ARCHIVE_COMPRESSION, ARCHIVE_SEGMENT_SIZE)
+
+    def _load_all_completed_tasks(self) -> Dict[str, list]:
+        """Load every user's completed tasks, whether archived or not."""
+        if self.archive is not None:
+            return self.archive.export()
+        return self._load_all_tasks(self.completed_tasks_file)
+
+    def _migrate_archive(self):
+        """Move completed tasks into the archive, or back out of it, as configured."""
+        if self.archive is not None:
+            tasks = self._load_all_tasks(self.completed_tasks_file)
+            if not any(tasks.values()):
+                return
+            self.archive.import_tasks(tasks)
+            if self.layout == "sharded":
+                self._remove_shards(self.completed_tasks_file)
+            else:
+                self._reset_document(self.completed_tasks_file)
+        elif (self.archive_dir / "manifest.json").exists():
+            archive = self._open_archive()
+            for user_id, archived in archive.export().items():
+                file_path = self._tasks_file(self.completed_tasks_file, user_id, create=True)
+                # Skip tasks copied by an earlier, interrupted migration
+                archived_ids = {task.get("completed_id") for task in archived}
+                current = [
+                    task for task in self._load_key(file_path, user_id) or []
+                    if task.get("completed_id") not in archived_ids
+                ]
+                if not self._commit(file_path, [{"op": "put", "key": user_id, "value": archived + current}],
+                                    validate=False):
+                    raise OSError(f"Failed to restore archived tasks of user {user_id}")
+            archive.clear()
+
+    def _reset_document(self, file_path: Path):
+        """Replace a document with an empty one, dropping its journal."""
+        with self._locked(file_path, exclusive=True):
+            self._save_json(file_path, {})
+            journal = self._journal(file_path)
+            journal.discard(journal.size())
+            self.cache.invalidate(file_path)
+
+    def _remove_document(self, file_path: Path):
+        """Delete a document, its journal and its offset index."""
+        with self._locked(file_path, exclusive=True):
+            for path in (file_path, self._journal(file_path).path, stream.index_path(file_path),
+                         indexes.index_path(file_path)):
+                if path.exists():
+                    path.unlink()
+            self.cache.invalidate(file_path)
+
+    def _journal(self, file_path: Path) -> Journal:
+        """Get the journal belonging to a data file."""
+        journal = self._journals.get(file_path)
+        if journal is None:
+            journal = self._journals.setdefault(file_path, Journal(file_path, self.durability))
+        return journal
+
+    # Locking
+    def _document_lock(self, file_path: Path) -> DocumentLock:
+        """Get the inter-process lock guarding a data file."""
+        lock = self._document_locks.get(file_path)
+        if lock is None:
+            lock = self._document_locks.setdefault(file_path, DocumentLock(file_path, self.lock_timeout))
+        return lock
+
+    @contextmanager
+    def _locked(self, file_path: Path, exclusive: bool = False):
+        """Hold the in-process lock and the data file's file lock, both shared or both exclusive.
+
+        Threads holding the shared locks read in parallel; a thread that will
+        write must take them exclusive from the start.
+        """
+        with (self._lock if exclusive else self._lock.reading()):
+            if not self.locking:
+                yield
+                return
+            with self._document_lock(file_path).acquire(exclusive):
+                yield
+
+    def _bump_generation(self, file_path: Path):
+        """Record that a data file changed, so other processes drop their cached copy."""
+        if self.locking:
+            self._document_lock(file_path).bump()
+
+    def _file_signature(self, file_path: Path) -> Optional[Tuple[int, ...]]:
+        """Signature of a data file: (mtime, size, inode) plus its lock's write generation."""
+        signature = DocumentCache.signature(file_path)
+        if signature is None or not self.locking:
+            return signature
+        return signature + (self._document_lock(file_path).generation(),)
+
+    def _document_signature(self, file_path: Path):
+        """Signature of everything a document is built from: the data file and its journal."""
+        signature = self._file_signature(file_path)
+        if not self.journal_enabled:
+            return signature
+        return (signature, DocumentCache.signature(self._journal(file_path).path))
 
     def _load_json(self, file_path: Path) -> dict:
-        """Load data from a JSON file."""
+        """Load data from a JSON file, reusing the cached copy if the file is unchanged.
+
+        Threads that need the same uncached file at the same time wait for one
+        of them to parse it instead of each parsing it.
+        """
+        with self._locked(file_path):
+            data = self._buffered(file_path)
+            if data is not None:
+                return data
+            data = self.cache.get(file_path)
+            if data is not None:
+                return data
+            with self._load_locks.setdefault(file_path, threading.Lock()):
+                data = self.cache.get(file_path)
+                if data is not None:
+                    return data
+                return self._read_document(file_path)
+
+    def _buffered(self, file_path: Path) -> Optional[dict]:
+        """Get a document changed in memory but not written yet, in a transaction or write-behind."""
+        if self._pending and file_path in self._pending:
+            return self._pending[file_path][0]
+        buffered = self._dirty.get(file_path)
+        return buffered[0] if buffered is not None else None
+
+    def _read_document(self, file_path: Path) -> dict:
+        """Parse a whole document from its snapshot and journal, and cache it."""
+        data = self._read_snapshot(file_path)
+        if self.journal_enabled:
+            self._journal(file_path).replay(data)
+        self.cache.put(file_path, data)
+        return data
+
+    def _load_key(self, file_path: Path, key: str) -> Any:
+        """Load one top-level value of a document.
+
+        If the document is not cached but has a valid offset index, only that
+        value is read and decoded, so the cost does not depend on the size of
+        the rest of the file.
+        """
+        with self._locked(file_path):
+            data = self._buffered(file_path)
+            if data is None:
+                data = self.cache.get(file_path)
+            if data is not None:
+                return data.get(key)
+            offsets = self._key_offsets(file_path)
+            if offsets is None:
+                return self._read_document(file_path).get(key)
+
+            document = {key: stream.read_value(file_path, offsets[key])} if key in offsets else {}
+            if self.journal_enabled:
+                for op in self._journal(file_path).read():
+                    if op["key"] == key:
+                        apply_op(document, op)
+            return document.get(key)
+
+    def _iter_key_items(self, file_path: Path, key: str) -> Iterator[Any]:
+        """Iterate over the items of one top-level array of a document.
+
+        Items are streamed from disk when the document has a valid offset index
+        and no journaled changes for the key; otherwise the array is loaded.
+        """
+        with self._locked(file_path):
+            offsets = None
+            if self._buffered(file_path) is None and self.cache.get(file_path) is None:
+                offsets = self._offsets(file_path)
+                if offsets is not None and self.journal_enabled:
+                    if any(op["key"] == key for op in self._journal(file_path).read()):
+                        offsets = None
+            if offsets is None:
+                return iter(self._load_key(file_path, key) or [])
+            if key not in offsets:
+                return iter([])
+            f = open(file_path, 'rb')
+
+        def items():
+            with f:
+                yield from stream.iter_items(f, offsets[key])
+        return items()
+
+    def _offsets(self, file_path: Path) -> Optional[Dict[str, List[int]]]:
+        """Get a data file's offset index if it matches the file's current contents."""
+        signature = self._file_signature(file_path)
+        if signature is None:
+            return None
+        cached = self._offset_indexes.get(file_path)
+        if cached is None or cached[0] != signature:
+            index = stream.read_index(file_path)
+            if index is None or tuple(index["signature"]) != signature:
+                return None
+            meta = index["offsets"].get(migrations.META_KEY)
+            # Values of older files must go through the upgrade of a full read
+            if meta is None or stream.read_value(file_path, meta).get("version") != migrations.CURRENT_VERSION:
+                return None
+            cached = (signature, index["offsets"])
+            self._offset_indexes[file_path] = cached
+        return cached[1]
+
+    def _key_offsets(self, file_path: Path) -> Optional[Mapping[str, List[int]]]:
+        """Get the byte ranges of a data file's values: the user directory's for users, else the offset index."""
+        if file_path == self.users_file:
+            persisted = self._persisted_directory()
+            if persisted is not None and persisted.spanned:
+                return persisted
+        return self._offsets(file_path)
+
+    def _serialize(self, data: dict) -> Tuple[bytes, Optional[Dict[str, List[int]]]]:
+        """Serialize a document behind the format version header, with value offsets for the JSON formats."""
+        if self.storage_format == "marshal":
+            return formats.dumps(migrations.with_header(data), self.storage_format), None
+        return stream.dumps_with_offsets(data, self.storage_format, (migrations.META_KEY, migrations.header()))
+
+    def _write_offsets(self, file_path: Path, offsets: Optional[Dict[str, List[int]]]):
+        """Rebuild a data file's offset index after the file was written."""
+        self._offset_indexes.pop(file_path, None)
         try:
-            with open(file_path, 'r') as f:
-                return json.load(f)
-        except json.JSONDecodeError:
-            return {}
+            if offsets is None:
+                stream.index_path(file_path).unlink(missing_ok=True)
+                return
+            signature = self._file_signature(file_path)
+            stream.write_index(file_path, signature, offsets)
+            self._offset_indexes[file_path] = (signature, offsets)
+        except OSError:
+            # A missing or stale index only disables partial reads
+            pass
+
+    # Secondary indexes
+    def _is_indexed(self, file_path: Path) -> bool:
+        """Check whether a document holds ongoing tasks, which have secondary indexes."""
+        if file_path == self.ongoing_tasks_file:
+            return True
+        return file_path.parent == self.shard_dirs[self.ongoing_tasks_file] and file_path.name != "_index.json"
+
+    def _indexes_for(self, file_path: Path, data: dict) -> TaskIndexes:
+        """Get the secondary indexes of a loaded document.
+
+        Indexes are kept in memory for as long as the document is the loaded
+        copy. Otherwise they are read from the index file written with the
+        snapshot; only users changed by later journal entries are re-sorted.
+        """
+        current = self._task_indexes.get(file_path)
+        if current is not None and current.document is data:
+            return current
+        persisted = indexes.read_indexes(file_path, self._file_signature(file_path)) if self.persistent else None
+        if persisted is not None and self.journal_enabled:
+            for op in self._journal(file_path).read():
+                persisted.pop(op["key"], None)
+        current = TaskIndexes(data, persisted)
+        self._task_indexes[file_path] = current
+        return current
+
+    def _write_task_indexes(self, file_path: Path, data: dict):
+        """Persist a document's secondary indexes after its snapshot was written."""
+        if not self._is_indexed(file_path):
+            return
+        try:
+            indexes.write_indexes(file_path, self._file_signature(file_path), self._indexes_for(file_path, data))
+        except OSError:
+            # A missing or stale index file only means the orders are rebuilt on load
+            pass
+
+    # User directory
+    def _directory_for(self, data: dict) -> UserDirectory:
+        """Get the user directory of a loaded users document, kept for as long as it is the loaded copy."""
+        current = self._user_directory
+        if current is None or current.document is not data:
+            current = UserDirectory(data)
+            self._user_directory = current
+        return current
+
+    def _persisted_directory(self) -> Optional[DirectoryFile]:
+        """Get the user directory file if it matches the users file's snapshot, rebuilding it if it does not."""
+        if not self.persistent:
+            return None
+        signature = self._file_signature(self.users_file)
+        if signature is None:
+            return None
+        current = self._directory_file
+        if current is not None and current.signature == list(signature):
+            return current
+        persisted = read_directory(self.users_file, signature)
+        if persisted is None:
+            # Missing or stale, e.g. written by an older version: build it once for every later process
+            try:
+                write_directory(self.users_file, signature, self._read_snapshot(self.users_file),
+                                self._offsets(self.users_file))
+            except OSError:
+                return None
+            persisted = read_directory(self.users_file, signature)
+        self._directory_file = persisted
+        return persisted
+
+    def _write_user_directory(self, file_path: Path, data: dict, offsets: Optional[Dict[str, List[int]]]):
+        """Persist the user directory after the users file's snapshot was written."""
+        if file_path != self.users_file or not self.persistent:
+            return
+        try:
+            signature = self._file_signature(file_path)
+            write_directory(file_path, signature, data, offsets)
+            self._directory_file = read_directory(file_path, signature)
+        except OSError:
+            # A missing or stale directory file is rebuilt on the next lookup
+            self._directory_file = None
 
     def _save_json(self, file_path: Path, data: dict) -> bool:
-        """Save data to a JSON file."""
+        """Save data to a data file in the configured format and refresh its cache entry."""
         try:
-            with open(file_path, 'w') as f:
-                json.dump(data, f, indent=4)
+            content, offsets = self._serialize(data)
+            self.durability.write_atomic(file_path, content)
+        except Exception:
+            # The in-memory document may hold changes that never reached disk
+            self.cache.invalidate(file_path)
+            return False
+        self._bump_generation(file_path)
+        self._write_offsets(file_path, offsets)
+        self._write_task_indexes(file_path, data)
+        self._write_user_directory(file_path, data, offsets)
+        self.cache.put(file_path, data)
+        return True
+
+    def _commit(self, file_path: Path, ops: List[Dict[str, Any]], validate: bool = True) -> bool:
+        """Apply mutations to a document and persist them.
+
+        The document's exclusive lock is held from loading to writing, so
+        concurrent processes cannot lose each other's updates. Inside a
+        transaction the operations are only applied in memory, and the lock is
+        held until the transaction ends.
+
+        Args:
+            file_path: The document to change
+            ops: The mutations to apply
+            validate: Check the written records first; off for data that is only moved
+
+        Raises:
+            RecordValidationError: If a written record does not match its schema
+            ValueError: If a key is reserved for the file header
+        """
+        if any(op["key"] == migrations.META_KEY for op in ops):
+            raise ValueError(f"{migrations.META_KEY} is reserved for the format version header")
+        if validate and self.validation_enabled:
+            self._validate_ops(file_path, ops)
+        with self._lock:
+            if self._pending is None and self.write_behind > 0:
+                return self._buffer(file_path, ops)
+            if self._pending is None:
+                lock = self._locked(file_path, exclusive=True)
+            else:
+                if file_path not in self._pending:
+                    self._transaction_locks.enter_context(self._locked(file_path, exclusive=True))
+                lock = nullcontext()
+
+            with lock:
+                data = self._load_json(file_path)
+                self._apply(file_path, data, ops)
+                if self._pending is not None:
+                    self._pending.setdefault(file_path, (data, []))[1].extend(ops)
+                    return True
+                return self._persist(file_path, data, ops)
+
+    def _apply(self, file_path: Path, data: dict, ops: List[Dict[str, Any]]):
+        """Apply mutations to a loaded document and its secondary indexes."""
+        task_indexes = self._indexes_for(file_path, data) if self._is_indexed(file_path) else None
+        user_directory = self._user_directory if file_path == self.users_file else None
+        if user_directory is not None and user_directory.document is not data:
+            user_directory = None  # built again from the document on the next lookup
+        for op in ops:
+            if task_indexes is not None:
+                task_indexes.apply(op)
+            if user_directory is not None:
+                user_directory.apply(op)
+            apply_op(data, op)
+
+    def _buffer(self, file_path: Path, ops: List[Dict[str, Any]]) -> bool:
+        """Apply mutations in memory and leave writing them to the next flush."""
+        data = self._load_json(file_path)
+        self._apply(file_path, data, ops)
+        self._dirty.setdefault(file_path, (data, []))[1].extend(ops)
+        self._dirty_ops += len(ops)
+        if self._dirty_ops >= self.flush_threshold:
+            return self.flush()
+        self._schedule_flush()
+        return True
+
+    def _schedule_flush(self):
+        """Start the timer of the next write-behind flush unless one is running."""
+        if self._flush_timer is None:
+            self._flush_timer = threading.Timer(self.write_behind, self.flush)
+            self._flush_timer.daemon = True
+            self._flush_timer.start()
+
+    def flush(self) -> bool:
+        """Write every change buffered in write-behind mode now, as one commit.
+
+        Each document is written once however many changes it collected. If
+        another process wrote a document since it was loaded, the buffered
+        operations are applied again on top of its current contents.
+
+        Returns:
+            True if nothing is left buffered; on failure the changes stay buffered and are retried
+        """
+        with self._lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            if not self._dirty:
+                return True
+
+            with ExitStack() as locks:
+                pending = {}
+                for file_path, (data, ops) in self._dirty.items():
+                    locks.enter_context(self._locked(file_path, exclusive=True))
+                    if self.cache.get(file_path) is not data:
+                        data = self._read_document(file_path)
+                        self._apply(file_path, data, ops)
+                    pending[file_path] = (data, ops)
+                if self._flush(pending):
+                    self._dirty, self._dirty_ops = {}, 0
+                    return True
+            self._schedule_flush()
+            return False
+
+    def _record_kind(self, file_path: Path) -> Optional[str]:
+        """Get the kind of records a document holds: "users", "tasks", "completed" or None."""
+        if file_path == self.users_file:
+            return "users"
+        if file_path.name == "_index.json" or file_path == self.archive_dir / "manifest.json":
+            return None
+        if file_path == self.ongoing_tasks_file or file_path.parent == self.shard_dirs[self.ongoing_tasks_file]:
+            return "tasks"
+        return "completed"
+
+    def _validate_ops(self, file_path: Path, ops: List[Dict[str, Any]]):
+        """Check the records written by some mutations, and nothing else of the document."""
+        kind = self._record_kind(file_path)
+        if kind is None:
+            return
+        for op in ops:
+            if op["op"] == "put":
+                records = [op["value"]] if kind == "users" else op["value"]
+            elif op["op"] == "upsert":
+                records = [op["value"]]
+            elif op["op"] == "upsert_many":
+                records = op["values"]
+            else:
+                continue
+            for record in records:
+                validate_record(kind, record)
+
+    def _persist(self, file_path: Path, data: dict, ops: List[Dict[str, Any]]) -> bool:
+        """Write a mutated document to disk.
+
+        In journal mode the operations are appended to the document's journal;
+        otherwise the whole document is rewritten.
+        """
+        if not self.journal_enabled:
+            return self._save_json(file_path, data)
+
+        journal = self._journal(file_path)
+        if not journal.append(ops):
+            self.cache.invalidate(file_path)
+            return False
+        # Appends always grow the journal, which is part of the document signature,
+        # so the snapshot's generation (and its offset and secondary indexes) stays valid
+        self.cache.put(file_path, data)
+        if (journal.size() > self.compact_threshold and file_path not in self._compacting
+                and not self._compaction_deferred):
+            self._compacting.add(file_path)
+            threading.Thread(target=self.compact, args=(file_path,), daemon=True).start()
+        return True
+
+    @contextmanager
+    def transaction(self):
+        """Group several operations into one atomic commit.
+
+        Each touched document is loaded once and modified in memory; all of them
+        are written when the block exits. If the block raises, nothing is written.
+        Nested transactions join the outermost one.
+
+        Raises:
+            OSError: If the changes could not be committed
+        """
+        with self._lock:
+            if self._pending is not None:
+                yield self
+                return
+
+            self.flush()
+            self._pending = {}
+            with ExitStack() as self._transaction_locks:
+                try:
+                    yield self
+                except BaseException:
+                    for file_path in self._pending:
+                        self.cache.invalidate(file_path)
+                    raise
+                finally:
+                    pending, self._pending = self._pending, None
+
+                if not self._flush(pending):
+                    raise OSError(f"Failed to commit transaction touching {len(pending)} file(s)")
+            self._transaction_locks = None
+
+    @contextmanager
+    def deferred_compaction(self):
+        """Hold off journal compaction during the block, then compact oversized journals once.
+
+        Bulk writes would otherwise rewrite the snapshot every time their
+        appends pass the compaction threshold.
+        """
+        with self._lock:
+            if self._compaction_deferred:
+                yield self
+                return
+            self._compaction_deferred = True
+            try:
+                yield self
+            finally:
+                self._compaction_deferred = False
+                for file_path in self._document_files():
+                    if self._journal(file_path).size() > self.compact_threshold and file_path not in self._compacting:
+                        self._compacting.add(file_path)
+                        self.compact(file_path)
+
+    def _flush(self, pending: Dict[Path, Tuple[dict, List[Dict[str, Any]]]]) -> bool:
+        """Persist buffered documents, all or nothing.
+
+        Changes spanning several files are first written to a transaction log,
+        which is replayed on the next start if writing the files is interrupted.
+        """
+        if not pending:
+            return True
+        logged = len(pending) > 1
+        with self._locked(self.transaction_log, exclusive=True) if logged else nullcontext():
+            if logged and not self._write_transaction_log(pending):
+                for file_path in pending:
+                    self.cache.invalidate(file_path)
+                return False
+
+            results = [self._persist(file_path, data, ops) for file_path, (data, ops) in pending.items()]
+            if not all(results):
+                for file_path in pending:
+                    self.cache.invalidate(file_path)
+                return False
+            if logged:
+                self.transaction_log.unlink()
+                if self.locking:
+                    # Removed while held, so a recovering process never locks a file nobody else does
+                    self._document_lock(self.transaction_log).remove()
+        return True
+
+    def _write_transaction_log(self, pending: Dict[Path, Tuple[dict, List[Dict[str, Any]]]]) -> bool:
+        """Durably record the operations of a multi-file commit."""
+        entries = [
+            {"path": str(file_path.relative_to(self.base_dir)), "ops": ops}
+            for file_path, (_, ops) in pending.items()
+        ]
+        try:
+            with open(self.transaction_log, 'w') as f:
+                json.dump(entries, f)
+                if self.durability.policy != "none":
+                    f.flush()
+                    os.fsync(f.fileno())
+            return True
+        except Exception:
+            return False
+
+    def _recover_transaction(self):
+        """Finish multi-file commits that were interrupted after their log was written.
+
+        A log whose lock is held belongs to a process that is still committing,
+        and is left alone; by the time the lock is released that process has
+        removed it.
+        """
+        for log_path in self.base_dir.glob("transaction-*.log"):
+            lock = self._document_lock(log_path)
+            try:
+                with self._lock, lock.acquire(exclusive=True, timeout=0) if self.locking else nullcontext():
+                    if log_path.exists():
+                        try:
+                            with open(log_path, 'r') as f:
+                                entries = json.load(f)
+                        except FileNotFoundError:
+                            entries = []
+                        except json.JSONDecodeError:
+                            # The log itself was torn, so none of the files were touched yet
+                            entries = []
+                        if not all(self._commit(self.base_dir / entry["path"], entry["ops"], validate=False)
+                                   for entry in entries):
+                            continue
+                        log_path.unlink(missing_ok=True)
+                    if self.locking:
+                        lock.remove()
+            except LockTimeout:
+                continue
+
+    def compact(self, file_path: Path) -> bool:
+        """Fold a document's journal into a new snapshot of the data file."""
+        journal = self._journal(file_path)
+        try:
+            with self._locked(file_path, exclusive=True):
+                data = self._load_json(file_path) if self.journal_enabled else journal.replay(self._read_snapshot(file_path))
+                content, offsets = self._serialize(data)
+                self.durability.write_atomic(file_path, content)
+                journal.discard(journal.size())
+                self._bump_generation(file_path)
+                self._write_offsets(file_path, offsets)
+                self._write_task_indexes(file_path, data)
+                self._write_user_directory(file_path, data, offsets)
+                self.cache.put(file_path, data)
             return True
         except Exception:
             return False
+        finally:
+            self._compacting.discard(file_path)
+
+    def _read_snapshot(self, file_path: Path) -> dict:
+        """Read a data file in any storage format, without its journal or the cache.
+
+        The format version header is removed, and files older than the current
+        version are upgraded in memory.
+
+        Raises:
+            CorruptDocumentError: If the file exists but cannot be decoded
+            DocumentVersionError: If the file was written by a newer version
+        """
+        signature = self._file_signature(file_path)
+        offsets = self._offsets(file_path)
+        try:
+            with open(file_path, 'rb') as f:
+                raw = f.read()
+            # Decode user by user if the offset index describes exactly what was read
+            if offsets is not None and self._file_signature(file_path) == signature:
+                data = stream.loads_by_offsets(raw, offsets)
+            else:
+                data = formats.loads(raw)
+        except FileNotFoundError:
+            return {}
+        except ValueError as e:
+            raise CorruptDocumentError(f"{file_path} is corrupt: {e}") from e
+        return migrations.upgrade(self._record_kind(file_path), data, migrations.split_header(data))
+
+    def _document_files(self) -> List[Path]:
+        """List every data document: users, task files and task shards."""
+        files = [self.users_file, self.ongoing_tasks_file, self.completed_tasks_file]
+        if self.layout == "sharded":
+            for file_path, shard_dir in self.shard_dirs.items():
+                if not shard_dir.exists():
+                    continue  # not migrated to the sharded layout yet
+                files.append(self._shard_index_file(file_path))
+                files.extend(self._shard_file(file_path, user_id) for user_id in self.get_shard_user_ids(file_path))
+        if self.archive is not None:
+            files.append(self.archive.manifest_file)
+            active_file = self.archive.active_file()
+            if active_file:
+                files.append(active_file)
+        return files
+
+    def convert_format(self, storage_format: str) -> int:
+        """Rewrite every data document in another storage format.
+
+        Journals are folded into the rewritten files along the way.
+
+        Returns:
+            The number of documents converted
+        """
+        if storage_format not in formats.FORMATS:
+            raise ValueError(f"Unknown storage format: {storage_format}")
+        with self._lock:
+            self.flush()
+            self.storage_format = storage_format
+            files = [file_path for file_path in self._document_files() if file_path.exists()]
+            for file_path in files:
+                if not self.compact(file_path):
+                    raise OSError(f"Failed to convert {file_path}")
+        return len(files)
 
-    def _generate_task_id(self, user_id: str, is_completed: bool = False) -> int:
-        """Generate a new task ID for a user.
+    def fsck(self, processes: Optional[int] = None) -> List[str]:
+        """Validate every stored user and task against its schema, in parallel across users.
+
+        Args:
+            processes: Worker processes; None uses one per CPU
+
+        Returns:
+            A description of every problem found
+        """
+        self.flush()
+        try:
+            documents = {
+                "users": self.get_all_users(),
+                "tasks": self._load_all_tasks(self.ongoing_tasks_file),
+                "completed": self._load_all_completed_tasks()
+            }
+        except (CorruptDocumentError, DocumentVersionError) as e:
+            return [str(e)]
+        return check_documents(documents, processes)
+
+    def cache_stats(self) -> Dict[str, int]:
+        """Get read cache hit/miss counters."""
+        return self.cache.stats()
+
+    def _generate_task_id(self, user_id: str, is_completed: bool = False, count: int = 1) -> int:
+        """Generate new task IDs for a user.
         
         Args:
             user_id: The user's ID
             is_completed: Whether this is for a completed task
+            count: Number of consecutive IDs to allocate
             
         Returns:
-            A new unique task ID
+            The first of the new unique task IDs
+        """
+        scope = f"completed-{user_id}" if is_completed else f"tasks-{user_id}"
+
+        def highest_id():
+            return self._highest_task_id(user_id, is_completed)
+
+        return self.sequences.allocate(scope, count, seed=highest_id)
+
+    def _highest_task_id(self, user_id: str, is_completed: bool = False) -> int:
+        """Get the highest ID of a user's stored tasks, 0 if there are none."""
+        if is_completed:
+            tasks, id_field = self.iter_completed_tasks(user_id), "completed_id"
+        else:
+            tasks, id_field = self.get_user_tasks(user_id), "task_id"
+        return max((task.get(id_field) or 0 for task in tasks), default=0)
+
+    def _assign_task_ids(self, user_id: str, tasks: List[Dict[str, Any]], is_completed: bool = False):
+        """Give every task without an ID a new one, allocating them as one block.
+
+        The sequence is first advanced past the IDs tasks already carry (e.g.
+        imported ones), so they are never allocated again.
         """
-        file_path = self.completed_tasks_file if is_completed else self.ongoing_tasks_file
-        tasks = self._load_json(file_path)
-        user_tasks = tasks.get(str(user_id), [])
-        return len(user_tasks) + 1
+        id_field = "completed_id" if is_completed else "task_id"
+        highest = max((task[id_field] for task in tasks if isinstance(task.get(id_field), int)), default=0)
+        if highest:
+            scope = f"completed-{user_id}" if is_completed else f"tasks-{user_id}"
+            self.sequences.advance(scope, highest, seed=lambda: self._highest_task_id(user_id, is_completed))
+        new_tasks = [task for task in tasks if id_field not in task]
+        if new_tasks:
+            first_id = self._generate_task_id(user_id, is_completed, count=len(new_tasks))
+            for offset, task in enumerate(new_tasks):
+                task[id_field] = first_id + offset
+
+    def allocate_user_id(self, count: int = 1) -> int:
+        """Allocate new unique user IDs and return the first."""
+        return self.sequences.allocate("users", count, seed=self._max_user_id)
+
+    def _assign_user_ids(self, users: Dict[str, Dict[str, Any]]):
+        """Give every user without a userid a new one, after advancing the sequence past the given ones."""
+        highest = max((user["userid"] for user in users.values() if isinstance(user.get("userid"), int)), default=0)
+        if highest:
+            self.sequences.advance("users", highest, seed=self._max_user_id)
+        new_users = [user for user in users.values() if "userid" not in user]
+        if new_users:
+            first_id = self.allocate_user_id(count=len(new_users))
+            for offset, user in enumerate(new_users):
+                user["userid"] = first_id + offset
 
     # User operations
+    def _users_directory(self) -> Tuple[Union[UserDirectory, DirectoryFile], List[Dict[str, Any]]]:
+        """Get the user directory, and the journaled user changes it does not cover yet.
+
+        The loaded document's directory is used if there is one, else the
+        directory file, so looking up a user never loads the users file.
+        """
+        data = self._buffered(self.users_file)
+        if data is None:
+            data = self.cache.get(self.users_file)
+        if data is None:
+            persisted = self._persisted_directory()
+            if persisted is not None:
+                return persisted, self._journal(self.users_file).read() if self.journal_enabled else []
+            data = self._read_document(self.users_file)
+        return self._directory_for(data), []
+
+    def _max_user_id(self) -> int:
+        """Get the highest user ID in use, 0 if there are no users."""
+        with self._locked(self.users_file):
+            directory, ops = self._users_directory()
+            return max([directory.max_user_id()] + [op["value"].get("userid") or 0 for op in ops])
+
+    def get_user_id(self, username: str) -> Optional[int]:
+        """Get the ID of a user, or None if there is no such user."""
+        with self._locked(self.users_file):
+            directory, ops = self._users_directory()
+            for op in reversed(ops):
+                if op["key"] == username:
+                    return op["value"].get("userid")
+            return directory.user_id(username)
+
+    def get_username(self, user_id: Union[int, str]) -> Optional[str]:
+        """Get the name of the user with an ID, or None if no user has it."""
+        user_id = int(user_id)
+        with self._locked(self.users_file):
+            directory, ops = self._users_directory()
+            changed = set()
+            for op in reversed(ops):
+                if op["key"] in changed:
+                    continue
+                changed.add(op["key"])
+                if op["value"].get("userid") == user_id:
+                    return op["key"]
+            username = directory.username(user_id)
+            # A user changed since the directory file was written may no longer have the ID
+            return username if username not in changed else None
+
     def get_user(self, username: str) -> Optional[Dict[str, Any]]:
         """Get user data by username."""
-        users = self._load_json(self.users_file)
-        return users.get(username)
+        return self._load_key(self.users_file, username)
 
     def get_all_users(self) -> Dict[str, Any]:
         """Get all users data."""
@@ -77,67 +1139,137 @@ class DatabaseManager:
 
     def save_user(self, username: str, user_data: Dict[str, Any]) -> bool:
         """Save or update user data."""
-        users = self._load_json(self.users_file)
-        users[username] = user_data
-        return self._save_json(self.users_file, users)
+        return self._commit(self.users_file, [{"op": "put", "key": username, "value": user_data}])
+
+    def save_users(self, users: Dict[str, Dict[str, Any]]) -> bool:
+        """Save or update many users in one commit; users without a userid get new IDs."""
+        self._assign_user_ids(users)
+        return self._commit(self.users_file, [
+            {"op": "put", "key": username, "value": user_data} for username, user_data in users.items()
+        ])
 
     # Task operations
     def get_user_tasks(self, user_id: str) -> list:
         """Get all ongoing tasks for a user."""
-        tasks = self._load_json(self.ongoing_tasks_file)
-        return tasks.get(str(user_id), [])
+        return self._load_key(self._tasks_file(self.ongoing_tasks_file, user_id), str(user_id)) or []
 
     def save_user_task(self, user_id: str, task_data: Dict[str, Any]) -> bool:
         """Save a new task for a user."""
-        tasks = self._load_json(self.ongoing_tasks_file)
-        if str(user_id) not in tasks:
-            tasks[str(user_id)] = []
-        
         # Generate new task ID if not provided
-        if 'task_id' not in task_data:
-            task_data['task_id'] = self._generate_task_id(user_id)
-            
-        tasks[str(user_id)].append(task_data)
-        return self._save_json(self.ongoing_tasks_file, tasks)
+        self._assign_task_ids(user_id, [task_data])
+        return self._commit(self._tasks_file(self.ongoing_tasks_file, user_id, create=True), [
+            {"op": "upsert", "key": str(user_id), "id_field": "task_id", "value": task_data}
+        ])
+
+    def save_user_tasks(self, user_id: str, tasks: List[Dict[str, Any]]) -> bool:
+        """Save many tasks of a user in one commit; tasks without a task_id get new IDs."""
+        self._assign_task_ids(user_id, tasks)
+        return self._commit(self._tasks_file(self.ongoing_tasks_file, user_id, create=True), [
+            {"op": "upsert_many", "key": str(user_id), "id_field": "task_id", "values": tasks}
+        ])
+
+    def get_user_tasks_by(self, user_id: str, field: str, start: Any = None, end: Any = None) -> list:
+        """Get a user's ongoing tasks in the order of an indexed field.
+
+        Args:
+            user_id: The user's ID
+            field: One of "priority", "due_date", "category", "status" or "created_at"
+            start: Only include tasks whose field value is at least this (inclusive)
+            end: Only include tasks whose field value is at most this (inclusive)
+
+        Returns:
+            The matching tasks; for priority the most urgent come first, so a
+            priority range runs from the more urgent bound (e.g. "Urgent" to "High")
+        """
+        file_path = self._tasks_file(self.ongoing_tasks_file, user_id)
+        with self._locked(file_path):
+            data = self._load_json(file_path)
+            return self._indexes_for(file_path, data).user(str(user_id)).ordered(field, start, end)
+
+    def query(self, user_id: str, where: Optional[Dict[str, Any]] = None, order_by: Optional[str] = None,
+              limit: Optional[int] = None, offset: int = 0, fields: Optional[List[str]] = None,
+              completed: bool = False) -> list:
+        """Select a page of a user's tasks; see query.py for the syntax of each argument.
+
+        Ongoing tasks are read through the secondary indexes: an indexed
+        order_by is read in index order and stops once the page is full, and
+        conditions on indexed fields only visit the tasks in their range.
+        Completed tasks are streamed, and a lower bound on completed_at skips
+        archive segments.
+
+        Args:
+            user_id: The user's ID
+            where: Conditions every returned task satisfies
+            order_by: Field to order by, "-field" for descending order
+            limit: Maximum number of tasks to return
+            offset: Number of matching tasks to skip
+            fields: Fields to return for each task
+            completed: Query completed tasks instead of ongoing ones
+
+        Raises:
+            ValueError: If the query is invalid
+        """
+        query = Query(where, order_by, limit, offset, fields)
+        if completed:
+            since = query.lower_value("completed_at")
+            return query.execute(self.iter_completed_tasks(user_id, since), id_field="completed_id")
+
+        file_path = self._tasks_file(self.ongoing_tasks_file, user_id)
+        with self._locked(file_path):
+            data = self._load_json(file_path)
+            index = self._indexes_for(file_path, data).user(str(user_id))
+            return query.execute(data.get(str(user_id), []), index)
 
     def update_user_task(self, user_id: str, task_id: int, task_data: Dict[str, Any]) -> bool:
         """Update an existing task."""
-        tasks = self._load_json(self.ongoing_tasks_file)
-        user_tasks = tasks.get(str(user_id), [])
-        
-        for i, task in enumerate(user_tasks):
-            if task["task_id"] == task_id:
-                # Preserve the original task ID
-                task_data['task_id'] = task_id
-                user_tasks[i] = task_data
-                return self._save_json(self.ongoing_tasks_file, tasks)
-        return False
+        file_path = self._tasks_file(self.ongoing_tasks_file, user_id)
+        with self._locked(file_path, exclusive=True):
+            if not any(task["task_id"] == task_id for task in self.get_user_tasks(user_id)):
+                return False
+            # Preserve the original task ID
+            task_data['task_id'] = task_id
+            return self._commit(file_path, [
+                {"op": "upsert", "key": str(user_id), "id_field": "task_id", "value": task_data}
+            ])
 
     def delete_user_task(self, user_id: str, task_id: int) -> bool:
         """Delete a task."""
-        tasks = self._load_json(self.ongoing_tasks_file)
-        user_tasks = tasks.get(str(user_id), [])
-        
-        for task in user_tasks[:]:
-            if task["task_id"] == task_id:
-                user_tasks.remove(task)
-                return self._save_json(self.ongoing_tasks_file, tasks)
-        return False
+        file_path = self._tasks_file(self.ongoing_tasks_file, user_id)
+        with self._locked(file_path, exclusive=True):
+            if not any(task["task_id"] == task_id for task in self.get_user_tasks(user_id)):
+                return False
+            return self._commit(file_path, [
+                {"op": "delete", "key": str(user_id), "id_field": "task_id", "id": task_id}
+            ])
 
     def add_completed_task(self, user_id: str, task_data: Dict[str, Any]) -> bool:
         """Add a task to completed tasks."""
-        completed = self._load_json(self.completed_tasks_file)
-        if str(user_id) not in completed:
-            completed[str(user_id)] = []
-            
         # Generate new completed task ID if not provided
-        if 'completed_id' not in task_data:
-            task_data['completed_id'] = self._generate_task_id(user_id, is_completed=True)
-            
-        completed[str(user_id)].append(task_data)
-        return self._save_json(self.completed_tasks_file, completed)
+        self._assign_task_ids(user_id, [task_data], is_completed=True)
+        if self.archive is not None:
+            return self.archive.add(user_id, [task_data])
+        return self._commit(self._tasks_file(self.completed_tasks_file, user_id, create=True), [
+            {"op": "upsert", "key": str(user_id), "id_field": "completed_id", "value": task_data}
+        ])
+
+    def add_completed_tasks(self, user_id: str, tasks: List[Dict[str, Any]]) -> bool:
+        """Add many completed tasks of a user in one commit; tasks without a completed_id get new IDs."""
+        self._assign_task_ids(user_id, tasks, is_completed=True)
+        if self.archive is not None:
+            return self.archive.add(user_id, tasks)
+        return self._commit(self._tasks_file(self.completed_tasks_file, user_id, create=True), [
+            {"op": "upsert_many", "key": str(user_id), "id_field": "completed_id", "values": tasks}
+        ])
+
+    def get_completed_tasks(self, user_id: str, since: Union[str, datetime, None] = None) -> list:
+        """Get all completed tasks for a user, optionally only those completed since a time."""
+        return list(self.iter_completed_tasks(user_id, since))
 
-    def get_completed_tasks(self, user_id: str) -> list:
-        """Get all completed tasks for a user."""
-        completed = self._load_json(self.completed_tasks_file)
-        return completed.get(str(user_id), []) 
\ No newline at end of file
+    def iter_completed_tasks(self, user_id: str,
+                             since: Union[str, datetime, None] = None) -> Iterator[Dict[str, Any]]:
+        """Iterate over a user's completed tasks without loading them all at once."""
+        if self.archive is not None:
+            return self.archive.iter_tasks(user_id, since)
+        tasks = self._iter_key_items(self._tasks_file(self.completed_tasks_file, user_id), str(user_id))
+        since = timestamp(since)
+        return (task for task in tasks if not since or completion_time(task) >= since)
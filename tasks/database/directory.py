@@ -0,0 +1,273 @@
+"""User directory: username and user ID lookups in constant time.
+
+Logins and every task action map a username to its user ID. The directory
+keeps two hash indexes over the users document, by username and by user ID:
+
+- UserDirectory holds both as dictionaries for the loaded document and is
+  updated by every mutation applied to it
+- `<file>.dir` is written with every snapshot of the users file, so a fresh
+  process answers a lookup without loading users.json or its offset index
+
+The file is a JSON header line followed by fixed-size records and two
+open-addressing hash tables of record numbers, one probed by a hash of the
+username and one by the user ID. A lookup reads a few slots at computed
+positions of a memory map, however many users there are. Each record also
+holds the byte range of the user's value in the data file, so get_user
+decodes only that user. Like the other side indexes, the file carries the
+data file's signature and is rebuilt when it no longer matches.
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+from array import array
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Mapping, Optional
+
+# userid (0 if none), name offset in the heap, name length, value start and end (0, 0 if unknown)
+RECORD = struct.Struct("<qQIqq")
+SLOT = struct.Struct("<I")  # record number + 1; 0 marks an empty slot
+MAX_LOAD = 0.5  # tables are at most half full, so probe sequences stay short
+ID_MULTIPLIER = 0x9E3779B97F4A7C15  # Fibonacci hashing spreads consecutive IDs over the table
+MASK64 = (1 << 64) - 1
+
+
+def name_hash(username: str) -> int:
+    """Hash a username the same way in every process (str hashes are salted per process)."""
+    return int.from_bytes(hashlib.blake2b(username.encode(), digest_size=8).digest(), "little")
+
+
+def id_hash(user_id: int) -> int:
+    """Hash a user ID."""
+    return (user_id * ID_MULTIPLIER) & MASK64
+
+
+def table_size(count: int) -> int:
+    """Get the number of slots of the hash tables for some number of users: a power of two."""
+    slots = 8
+    while slots * MAX_LOAD < count:
+        slots *= 2
+    return slots
+
+
+class UserDirectory:
+    def __init__(self, users: Dict[str, Dict[str, Any]]):
+        """Index a loaded users document.
+
+        Args:
+            users: The document; the directory stays valid while it is the loaded copy
+        """
+        self.document = users
+        self._ids: Dict[str, Optional[int]] = {}
+        self._names: Dict[int, str] = {}
+        for username, user in users.items():
+            self._add(username, user)
+
+    def _add(self, username: str, user: Dict[str, Any]):
+        user_id = user.get("userid") if isinstance(user, dict) else None
+        self._ids[username] = user_id
+        if isinstance(user_id, int):
+            self._names.setdefault(user_id, username)
+
+    def apply(self, op: Dict[str, Any]):
+        """Update the directory for a mutation of the users document."""
+        if op["op"] != "put":
+            return
+        username = op["key"]
+        old_id = self._ids.get(username)
+        if old_id is not None and self._names.get(old_id) == username:
+            del self._names[old_id]
+        self._add(username, op["value"])
+
+    def user_id(self, username: str) -> Optional[int]:
+        """Get the ID of a user, or None if there is no such user."""
+        return self._ids.get(username)
+
+    def username(self, user_id: int) -> Optional[str]:
+        """Get the name of the user with an ID, or None if no user has it."""
+        return self._names.get(user_id)
+
+    def max_user_id(self) -> int:
+        """Get the highest user ID in use, 0 if there are no users."""
+        return max(self._names, default=0)
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+
+class DirectoryFile(Mapping):
+    def __init__(self, file_path: Path, header: Dict[str, Any], content: mmap.mmap):
+        """Wrap an opened directory file; use read_directory to open one.
+
+        Also a read-only mapping of usernames to the byte ranges of their values,
+        like a data file's offset index, if the ranges were known when it was written.
+        """
+        self.path = file_path
+        self.signature = header["signature"]
+        self.count = header["count"]
+        self.spanned = header["spanned"]
+        self._max_user_id = header["max_id"]
+        self._mask = header["slots"] - 1
+        self._records = header["records"]
+        self._names = header["names"]
+        self._ids = header["ids"]
+        self._heap = header["heap"]
+        self._content = content
+
+    def close(self):
+        """Release the memory map."""
+        self._content.close()
+
+    def _record(self, number: int):
+        return RECORD.unpack_from(self._content, self._records + number * RECORD.size)
+
+    def _name(self, offset: int, length: int) -> str:
+        return self._content[self._heap + offset:self._heap + offset + length].decode()
+
+    def _find_name(self, username: str):
+        """Get the record of a username, or None."""
+        slot = name_hash(username) & self._mask
+        while True:
+            number, = SLOT.unpack_from(self._content, self._names + slot * SLOT.size)
+            if number == 0:
+                return None
+            record = self._record(number - 1)
+            if self._name(record[1], record[2]) == username:
+                return record
+            slot = (slot + 1) & self._mask
+
+    def user_id(self, username: str) -> Optional[int]:
+        """Get the ID of a user, or None if there is no such user."""
+        record = self._find_name(username)
+        return (record[0] or None) if record is not None else None
+
+    def username(self, user_id: int) -> Optional[str]:
+        """Get the name of the user with an ID, or None if no user has it."""
+        slot = id_hash(user_id) >> 32 & self._mask
+        while True:
+            number, = SLOT.unpack_from(self._content, self._ids + slot * SLOT.size)
+            if number == 0:
+                return None
+            record = self._record(number - 1)
+            if record[0] == user_id:
+                return self._name(record[1], record[2])
+            slot = (slot + 1) & self._mask
+
+    def max_user_id(self) -> int:
+        """Get the highest user ID in use, 0 if there are no users."""
+        return self._max_user_id
+
+    # Mapping of byte ranges, as used for partial reads
+    def __getitem__(self, username: str) -> List[int]:
+        record = self._find_name(username) if self.spanned else None
+        if record is None:
+            raise KeyError(username)
+        return [record[3], record[4]]
+
+    def __contains__(self, username) -> bool:
+        return self.spanned and isinstance(username, str) and self._find_name(username) is not None
+
+    def __iter__(self) -> Iterator[str]:
+        for number in range(self.count):
+            record = self._record(number)
+            yield self._name(record[1], record[2])
+
+    def __len__(self) -> int:
+        return self.count
+
+
+def directory_path(file_path: Path) -> Path:
+    """Get the directory file belonging to a users data file."""
+    return file_path.with_name(file_path.name + ".dir")
+
+
+def dumps_directory(signature, users: Dict[str, Dict[str, Any]],
+                    offsets: Optional[Dict[str, List[int]]] = None) -> bytes:
+    """Build the directory file of a users document.
+
+    Args:
+        signature: Signature of the data file the document was written to
+        users: The document
+        offsets: Byte ranges of the users' values in the data file, if known
+    """
+    slots = table_size(len(users))
+    mask = slots - 1
+    records, heap = bytearray(), bytearray()
+    names, ids = array("I", bytes(slots * SLOT.size)), array("I", bytes(slots * SLOT.size))
+    max_id = 0
+    for number, (username, user) in enumerate(users.items(), 1):
+        encoded = username.encode()
+        user_id = user.get("userid") if isinstance(user, dict) else None
+        user_id = user_id if isinstance(user_id, int) and user_id > 0 else 0
+        start, end = offsets[username] if offsets is not None else (0, 0)
+        records += RECORD.pack(user_id, len(heap), len(encoded), start, end)
+        heap += encoded
+
+        slot = name_hash(username) & mask
+        while names[slot]:
+            slot = (slot + 1) & mask
+        names[slot] = number
+        if user_id:
+            max_id = max(max_id, user_id)
+            slot = id_hash(user_id) >> 32 & mask
+            while ids[slot]:
+                slot = (slot + 1) & mask
+            ids[slot] = number
+
+    if sys.byteorder == "big":
+        names.byteswap()  # the tables are little-endian on disk
+        ids.byteswap()
+    header = {"signature": list(signature), "count": len(users), "slots": slots, "max_id": max_id,
+              "spanned": offsets is not None}
+    # Section offsets depend on the header's own length, which they do not change by more than a few digits
+    layout = {"records": 0, "names": 0, "ids": 0, "heap": 0, "size": 0}
+    while True:
+        first_line = (json.dumps({**header, **layout}) + "\n").encode()
+        position = len(first_line)
+        new_layout = {}
+        for name, size in (("records", len(records)), ("names", slots * SLOT.size),
+                           ("ids", slots * SLOT.size), ("heap", len(heap))):
+            new_layout[name] = position
+            position += size
+        new_layout["size"] = position
+        if new_layout == layout:
+            break
+        layout = new_layout
+    return b"".join([first_line, records, names.tobytes(), ids.tobytes(), heap])
+
+
+def write_directory(file_path: Path, signature, users: Dict[str, Dict[str, Any]],
+                    offsets: Optional[Dict[str, List[int]]] = None):
+    """Write the directory file of a users data file that was just written.
+
+    It is replaced, never rewritten in place: other processes may have the
+    old one mapped into memory.
+    """
+    target = directory_path(file_path)
+    temp_path = target.with_name(f"{target.name}.{os.getpid()}-{threading.get_ident()}.tmp")
+    try:
+        with open(temp_path, 'wb') as f:
+            f.write(dumps_directory(signature, users, offsets))
+        os.replace(temp_path, target)
+    except BaseException:
+        temp_path.unlink(missing_ok=True)
+        raise
+
+
+def read_directory(file_path: Path, signature) -> Optional[DirectoryFile]:
+    """Open the directory file of a users data file if it matches the data file's signature."""
+    try:
+        with open(directory_path(file_path), 'rb') as f:
+            header = json.loads(f.readline())
+            if signature is None or header.get("signature") != list(signature):
+                return None
+            if os.fstat(f.fileno()).st_size != header["size"]:
+                return None  # torn
+            content = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return DirectoryFile(file_path, header, content)
+    except (FileNotFoundError, ValueError, TypeError, AttributeError, KeyError):
+        return None
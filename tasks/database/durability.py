@@ -0,0 +1,106 @@
+"""Atomic data file replacement and the fsync policy.
+
+Data files are never rewritten in place. New contents go to a temporary file
+next to the target, which is then renamed over it, so a crash leaves either
+the old or the new file. What reaches the disk before a write returns depends
+on the policy:
+
+- "always": the temporary file is synced before the rename and the directory
+  after it, and every journal append is synced; a returned write survives a
+  power loss
+- "batched": the temporary file is synced before the rename, so a power loss
+  cannot leave a torn file; directories and journal appends are synced by a
+  background thread every FSYNC_INTERVAL seconds, so the last moments of
+  writes may be lost
+- "none": nothing is synced; renames still protect against process crashes,
+  but a power loss can lose or tear recent writes
+"""
+
+import os
+import threading
+from pathlib import Path
+from typing import BinaryIO, Callable, Optional, Set
+
+FSYNC_POLICIES = ("always", "batched", "none")
+FSYNC_INTERVAL = 1.0  # seconds between batched syncs
+
+
+class CorruptDocumentError(ValueError):
+    """Raised when a data file exists but cannot be decoded."""
+
+
+def fsync_path(path: Path):
+    """Flush a file or directory to disk, where the platform allows it."""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        # Directories cannot be synced on some platforms
+        pass
+    finally:
+        os.close(fd)
+
+
+class Durability:
+    def __init__(self, policy: str, interval: float = FSYNC_INTERVAL):
+        """Initialize the fsync policy of one database.
+
+        Args:
+            policy: "always", "batched" or "none"
+            interval: Seconds between syncs of the "batched" policy
+        """
+        if policy not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy: {policy}")
+        self.policy = policy
+        self.interval = interval
+        self._due: Set[Path] = set()
+        self._lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+
+    def write_atomic(self, file_path: Path, content: bytes, opener: Callable[..., BinaryIO] = open):
+        """Replace a file with new contents; readers and crashes see the old or the new file.
+
+        Args:
+            file_path: The file to replace
+            content: Its new contents
+            opener: Opens the temporary file for writing, e.g. gzip.open to compress
+
+        Raises:
+            OSError: If the file could not be written; the old file is left as it was
+        """
+        temp_path = file_path.with_name(f"{file_path.name}.{os.getpid()}-{threading.get_ident()}.tmp")
+        try:
+            with opener(temp_path, 'wb') as f:
+                f.write(content)
+            if self.policy != "none":
+                fsync_path(temp_path)
+            os.replace(temp_path, file_path)
+        except BaseException:
+            temp_path.unlink(missing_ok=True)
+            raise
+        self.written(file_path.parent)
+
+    def written(self, path: Path):
+        """Sync a changed file or directory as the policy requires."""
+        if self.policy == "always":
+            fsync_path(path)
+        elif self.policy == "batched":
+            with self._lock:
+                self._due.add(path)
+                if self._timer is None:
+                    self._timer = threading.Timer(self.interval, self.sync)
+                    self._timer.daemon = True
+                    self._timer.start()
+
+    def sync(self):
+        """Sync everything written since the last batched sync."""
+        with self._lock:
+            due, self._due = self._due, set()
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        for path in due:
+            fsync_path(path)
@@ -0,0 +1,51 @@
+"""Serialization formats for data files.
+
+Supported formats:
+    pretty:  JSON indented with 4 spaces (the original format)
+    compact: JSON without indentation or spaces after separators
+    marshal: stdlib marshal behind a version header, the fastest to load and save
+
+Files are auto-detected on read, so documents in different formats can coexist
+and a data directory can be converted one file at a time.
+"""
+
+import json
+import marshal
+from typing import Any
+
+FORMATS = ("pretty", "compact", "marshal")
+
+MARSHAL_HEADER = b"TASKSDB-MARSHAL\x00"
+MARSHAL_VERSION = 4
+
+
+def dumps(data: Any, storage_format: str = "pretty") -> bytes:
+    """Serialize a document in the given format."""
+    if storage_format == "pretty":
+        return json.dumps(data, indent=4).encode()
+    if storage_format == "compact":
+        return json.dumps(data, separators=(',', ':')).encode()
+    if storage_format == "marshal":
+        return MARSHAL_HEADER + marshal.dumps(data, MARSHAL_VERSION)
+    raise ValueError(f"Unknown storage format: {storage_format}")
+
+
+def loads(raw: bytes) -> Any:
+    """Deserialize a document, detecting its format.
+
+    Raises:
+        ValueError: If the content is not a valid document in any format
+    """
+    if raw.startswith(MARSHAL_HEADER):
+        try:
+            return marshal.loads(raw[len(MARSHAL_HEADER):])
+        except (EOFError, TypeError) as e:
+            raise ValueError(f"Corrupt marshal document: {e}") from e
+    return json.loads(raw)
+
+
+def detect(raw: bytes) -> str:
+    """Get the name of the format a serialized document is in."""
+    if raw.startswith(MARSHAL_HEADER):
+        return "marshal"
+    return "pretty" if b"\n" in raw else "compact"
@@ -0,0 +1,179 @@
+"""Secondary indexes over ongoing tasks.
+
+For every user, the tasks of a document are kept ordered by each indexed field
+as sorted `[sort key, task_id]` pairs. Adds, updates and deletes adjust the
+orders with binary search instead of re-sorting, and the orders are written to
+`<file>.sidx` whenever the document's snapshot is written, so a fresh process
+does not have to sort either. Reading k tasks in index order costs O(k).
+"""
+
+import json
+from bisect import bisect_left, bisect_right, insort
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..i18n.languages import LANGUAGES
+
+INDEXED_FIELDS = ("priority", "due_date", "category", "status", "created_at")
+
+# Most urgent first, whatever language the task was created in
+PRIORITY_KEYS = ("PRIORITY_URGENT", "PRIORITY_HIGH", "PRIORITY_MEDIUM", "PRIORITY_LOW")
+PRIORITY_RANKS = {
+    texts[key]: rank
+    for texts in LANGUAGES.values()
+    for rank, key in enumerate(PRIORITY_KEYS) if key in texts
+}
+UNRANKED = len(PRIORITY_KEYS)
+
+
+def sort_key(field: str, value: Any):
+    """Get the key a field value is ordered by."""
+    if field == "priority":
+        return PRIORITY_RANKS.get(value, UNRANKED)
+    return "" if value is None else str(value)
+
+
+class UserIndex:
+    def __init__(self, tasks: List[Dict[str, Any]], orders: Optional[Dict[str, list]] = None):
+        """Index one user's tasks.
+
+        Args:
+            tasks: The user's tasks, as stored in the document
+            orders: Previously persisted orders of these tasks; sorted from scratch if missing
+        """
+        self.tasks = {task["task_id"]: task for task in tasks}
+        # Tasks sharing an ID (only in files never upgraded to format version 2)
+        # cannot all be indexed; they are then read by scanning
+        self.complete = len(self.tasks) == len(tasks)
+        self._scanned = None if self.complete else tasks
+        if orders is None:
+            orders = {
+                field: sorted([sort_key(field, task.get(field)), task["task_id"]] for task in tasks)
+                for field in INDEXED_FIELDS
+            }
+        self.orders = orders
+
+    def add(self, task: Dict[str, Any]):
+        """Index a new task."""
+        self.tasks[task["task_id"]] = task
+        for field in INDEXED_FIELDS:
+            insort(self.orders[field], [sort_key(field, task.get(field)), task["task_id"]])
+
+    def remove(self, task_id: int):
+        """Remove a task from every order."""
+        task = self.tasks.pop(task_id, None)
+        if task is None:
+            return
+        for field in INDEXED_FIELDS:
+            entries = self.orders[field]
+            entry = [sort_key(field, task.get(field)), task_id]
+            i = bisect_left(entries, entry)
+            if i < len(entries) and entries[i] == entry:
+                del entries[i]
+            else:
+                # The indexed task was modified in place; fall back to a scan
+                self.orders[field] = [entry for entry in entries if entry[1] != task_id]
+
+    def upsert(self, task: Dict[str, Any]):
+        """Index a new or replaced task."""
+        self.remove(task["task_id"])
+        self.add(task)
+
+    def span(self, field: str, low: Any = None, high: Any = None) -> Tuple[int, int]:
+        """Get the positions in a field's order of the keys between low and high (inclusive)."""
+        if field not in self.orders:
+            raise ValueError(f"Field is not indexed: {field}")
+        entries = self.orders[field]
+        lo = 0 if low is None else bisect_left(entries, [low])
+        hi = len(entries) if high is None else bisect_right(entries, [high, float("inf")])
+        return lo, hi
+
+    def entries(self, field: str, low: Any = None, high: Any = None) -> List[list]:
+        """Get the [sort key, task_id] entries of a field with keys between low and high (inclusive)."""
+        lo, hi = self.span(field, low, high)
+        return self.orders[field][lo:hi]
+
+    def ordered(self, field: str, start: Any = None, end: Any = None) -> List[Dict[str, Any]]:
+        """Get the tasks ordered by a field, optionally only those with a value between start and end.
+
+        Both bounds are inclusive field values, e.g. due dates or priority names.
+        """
+        low = None if start is None else sort_key(field, start)
+        high = None if end is None else sort_key(field, end)
+        if self._scanned is not None:
+            self.span(field)  # rejects fields that are not indexed
+            keyed = [(sort_key(field, task.get(field)), task["task_id"], i) for i, task in enumerate(self._scanned)]
+            return [self._scanned[i] for key, _, i in sorted(keyed)
+                    if (low is None or key >= low) and (high is None or key <= high)]
+        return [self.tasks[task_id] for _, task_id in self.entries(field, low, high)]
+
+
+class TaskIndexes:
+    def __init__(self, document: Dict[str, list], persisted: Optional[Dict[str, Dict[str, list]]] = None):
+        """Index the tasks of one document, building each user's index on first use.
+
+        Args:
+            document: The indexed document; the indexes stay valid while it is the loaded copy
+            persisted: Valid persisted orders per user, used instead of sorting
+        """
+        self.document = document
+        self._persisted = persisted or {}
+        self._users: Dict[str, UserIndex] = {}
+
+    def user(self, user_id: str) -> UserIndex:
+        """Get the index of one user's tasks."""
+        if user_id not in self._users:
+            self._users[user_id] = UserIndex(self.document.get(user_id, []), self._persisted.pop(user_id, None))
+        return self._users[user_id]
+
+    def apply(self, op: Dict[str, Any]):
+        """Update the indexes for a mutation; call before applying it to the document."""
+        key = op["key"]
+        if op["op"] in ("put", "upsert_many"):
+            # Rebuilt on next use; one sort is cheaper than many insertions
+            self._users.pop(key, None)
+            self._persisted.pop(key, None)
+        elif not self.user(key).complete:
+            # Scanned rather than indexed; read the changed tasks from the document on next use
+            del self._users[key]
+        elif op["op"] == "upsert":
+            self.user(key).upsert(op["value"])
+        elif op["op"] == "delete":
+            self.user(key).remove(op["id"])
+
+    def dumps(self) -> Dict[str, Dict[str, list]]:
+        """Get the orders of every user in the document, for persisting."""
+        # Built indexes are kept, so the next write does not sort them again
+        return {user_id: self.user(user_id).orders for user_id in self.document}
+
+
+def index_path(file_path: Path) -> Path:
+    """Get the secondary index file belonging to a data file."""
+    return file_path.with_name(file_path.name + ".sidx")
+
+
+def write_indexes(file_path: Path, signature, indexes: TaskIndexes):
+    """Persist the secondary indexes of a data file that was just written.
+
+    The file is a signature line followed by one `[user_id, orders]` line per
+    user, so neither writing nor reading it is one long call holding the GIL.
+    """
+    # json.dumps uses the C encoder; json.dump to a file does not
+    lines = [json.dumps({"signature": list(signature)})]
+    lines.extend(json.dumps([user_id, orders], separators=(',', ':')) for user_id, orders in indexes.dumps().items())
+    with open(index_path(file_path), 'w') as f:
+        f.write("\n".join(lines))
+
+
+def read_indexes(file_path: Path, signature) -> Optional[Dict[str, Dict[str, list]]]:
+    """Read the persisted orders of a data file if they match its signature."""
+    try:
+        with open(index_path(file_path), 'r') as f:
+            header = json.loads(f.readline())
+            if signature is None or header.get("signature") != list(signature):
+                return None
+            if "users" in header:  # written as a single object by older versions
+                return header["users"]
+            return dict(json.loads(line) for line in f)
+    except (FileNotFoundError, ValueError, TypeError, AttributeError):
+        return None
@@ -0,0 +1,131 @@
+"""Append-only journal of document mutations.
+
+A journaled document is stored as a snapshot (the regular data file) plus a
+JSON-lines journal next to it. Each journal line holds the list of operations
+written by one commit. Every operation is idempotent, so replaying records that
+were already folded into the snapshot leaves the document unchanged.
+"""
+
+import json
+import os
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+
+from .durability import Durability
+
+
+def apply_op(document: dict, op: Dict[str, Any]):
+    """Apply a single mutation to a document in place.
+
+    Supported operations:
+        put:    document[key] = value
+        upsert: replace the item of document[key] whose id_field matches value's, or append it
+        upsert_many: upsert every item of values, matching IDs in a single pass
+        delete: remove the item of document[key] whose id_field equals id
+    """
+    kind = op["op"]
+    if kind == "put":
+        document[op["key"]] = op["value"]
+        return
+
+    items = document.setdefault(op["key"], [])
+    id_field = op["id_field"]
+    if kind == "upsert":
+        item_id = op["value"][id_field]
+        for i, item in enumerate(items):
+            if item.get(id_field) == item_id:
+                items[i] = op["value"]
+                return
+        items.append(op["value"])
+    elif kind == "upsert_many":
+        positions = {item.get(id_field): i for i, item in enumerate(items)}
+        for value in op["values"]:
+            i = positions.get(value[id_field])
+            if i is None:
+                positions[value[id_field]] = len(items)
+                items.append(value)
+            else:
+                items[i] = value
+    elif kind == "delete":
+        document[op["key"]] = [item for item in items if item.get(id_field) != op["id"]]
+    else:
+        raise ValueError(f"Unknown journal operation: {kind}")
+
+
+class Journal:
+    def __init__(self, file_path: Path, durability: Optional[Durability] = None):
+        """Initialize the journal belonging to a data file.
+
+        Args:
+            file_path: The journaled data file
+            durability: The fsync policy appends and rewrites follow; none by default
+        """
+        self.path = file_path.with_name(file_path.name + ".journal")
+        self.durability = durability or Durability("none")
+
+    def exists(self) -> bool:
+        """Check whether the journal holds any records."""
+        return self.size() > 0
+
+    def size(self) -> int:
+        """Get the journal size in bytes."""
+        try:
+            return os.path.getsize(self.path)
+        except OSError:
+            return 0
+
+    def append(self, ops: List[Dict[str, Any]]) -> bool:
+        """Append one commit's operations as a single journal line.
+
+        If an interrupted append left a torn line, the new one starts on a line
+        of its own instead of continuing it.
+        """
+        line = json.dumps(ops, separators=(',', ':')).encode() + b"\n"
+        try:
+            with open(self.path, 'a+b') as f:
+                if f.seek(0, os.SEEK_END):
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        line = b"\n" + line
+                f.write(line)
+            self.durability.written(self.path)
+            return True
+        except Exception:
+            return False
+
+    def read(self, offset: int = 0) -> List[Dict[str, Any]]:
+        """Read every operation recorded after the given byte offset.
+
+        Lines torn by an interrupted append are skipped.
+        """
+        ops = []
+        try:
+            with open(self.path, 'rb') as f:
+                f.seek(offset)
+                for line in f:
+                    try:
+                        ops.extend(json.loads(line))
+                    except json.JSONDecodeError:
+                        continue
+        except FileNotFoundError:
+            pass
+        return ops
+
+    def replay(self, document: dict) -> dict:
+        """Apply every journaled operation to a document loaded from the snapshot."""
+        for op in self.read():
+            apply_op(document, op)
+        return document
+
+    def discard(self, upto: int):
+        """Drop the first `upto` bytes of the journal once they are folded into a snapshot."""
+        try:
+            with open(self.path, 'rb') as f:
+                f.seek(upto)
+                tail = f.read()
+        except FileNotFoundError:
+            return
+        if not tail:
+            os.truncate(self.path, 0)
+            return
+        self.durability.write_atomic(self.path, tail)
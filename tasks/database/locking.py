@@ -0,0 +1,215 @@
+"""Reader/writer locks for data files, between processes and between threads.
+
+Each document has a companion `<file>.lock` that is never replaced, so the
+lock survives atomic renames of the data file. Readers take a shared flock and
+proceed in parallel; read-modify-write cycles take an exclusive one. The lock
+file also stores a write generation that is bumped by every writer, which lets
+caches detect changes that a (mtime, size, inode) signature can miss.
+
+Within a process, SharedLock lets the threads of one manager read in parallel
+while a writer has the manager to itself.
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+POLL_INTERVAL = 0.005
+
+
+class LockTimeout(OSError):
+    """Raised when a lock cannot be acquired within its timeout."""
+
+
+class SharedLock:
+    """In-process reader/writer lock.
+
+    Entered as a context manager it is held exclusively and is re-entrant like
+    an RLock; reading() holds it shared with other threads. The writing thread
+    may also read. Waiting writers go before new readers, but not before a
+    thread that is already reading, so nested reads never deadlock.
+    """
+
+    def __init__(self):
+        self._changed = threading.Condition(threading.Lock())
+        self._owner = None
+        self._writes = 0
+        self._readers: Dict[int, int] = {}
+        self._waiting_writers = 0
+
+    def __enter__(self):
+        """Hold the lock exclusively.
+
+        Raises:
+            RuntimeError: If the thread is reading; it must take the lock for writing from the start
+        """
+        thread = threading.get_ident()
+        with self._changed:
+            if self._owner == thread:
+                self._writes += 1
+                return self
+            if thread in self._readers:
+                raise RuntimeError("Cannot write while reading; take the lock for writing from the start")
+            self._waiting_writers += 1
+            try:
+                self._changed.wait_for(lambda: self._owner is None and not self._readers)
+            finally:
+                self._waiting_writers -= 1
+            self._owner = thread
+            self._writes = 1
+        return self
+
+    def __exit__(self, *exc_info):
+        with self._changed:
+            self._writes -= 1
+            if self._writes == 0:
+                self._owner = None
+                self._changed.notify_all()
+
+    @contextmanager
+    def reading(self):
+        """Hold the lock shared with other readers for the duration of the block."""
+        thread = threading.get_ident()
+        with self._changed:
+            if self._owner == thread:
+                writing = True
+            else:
+                writing = False
+                if thread not in self._readers:
+                    self._changed.wait_for(lambda: self._owner is None and not self._waiting_writers)
+                self._readers[thread] = self._readers.get(thread, 0) + 1
+        try:
+            yield self
+        finally:
+            if not writing:
+                with self._changed:
+                    self._readers[thread] -= 1
+                    if not self._readers[thread]:
+                        del self._readers[thread]
+                        self._changed.notify_all()
+
+
+class DocumentLock:
+    def __init__(self, file_path: Path, timeout: float):
+        """Initialize the lock guarding a data file.
+
+        Args:
+            file_path: The data file to guard
+            timeout: Seconds to wait for the lock before raising LockTimeout
+        """
+        self.path = file_path.with_name(file_path.name + ".lock")
+        self.timeout = timeout
+        self._fd = None
+        self._depth = 0
+        self._exclusive = False
+        self._state = threading.Lock()  # threads of this process share the flock
+
+    @contextmanager
+    def acquire(self, exclusive: bool = False, timeout: Optional[float] = None):
+        """Hold the lock, shared or exclusive, for the duration of the block.
+
+        Re-entrant within a process, and shared by its threads, which must
+        exclude each other themselves (see SharedLock). A nested shared request
+        inside an exclusive one keeps the exclusive lock. A shared lock is
+        never upgraded: the flock would be released in between, letting
+        another process change the file after it was read.
+
+        The lock file may be removed with remove() while the lock is held; a
+        process that was waiting on the removed file then locks the new one.
+
+        Args:
+            exclusive: Exclude every other holder, instead of only exclusive ones
+            timeout: Seconds to wait instead of the lock's timeout
+
+        Raises:
+            LockTimeout: If the lock is not acquired within the timeout
+            RuntimeError: If an exclusive lock is requested while a shared one is held
+        """
+        if fcntl is None:
+            yield self
+            return
+
+        with self._state:
+            if self._depth == 0:
+                deadline = time.monotonic() + (self.timeout if timeout is None else timeout)
+                while True:
+                    self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+                    try:
+                        self._flock(exclusive, deadline)
+                        if self._is_current():
+                            break
+                    except BaseException:
+                        os.close(self._fd)
+                        self._fd = None
+                        raise
+                    # Removed while we waited for it: lock the file now at the path
+                    os.close(self._fd)
+                self._exclusive = exclusive
+            elif exclusive and not self._exclusive:
+                raise RuntimeError(f"{self.path} is locked shared; take it exclusive from the start to write")
+            self._depth += 1
+
+        try:
+            yield self
+        finally:
+            with self._state:
+                self._depth -= 1
+                if self._depth == 0:
+                    os.close(self._fd)
+                    self._fd = None
+                    self._exclusive = False
+
+    def _flock(self, exclusive: bool, deadline: float):
+        """Take the flock, polling until the deadline passes."""
+        operation = (fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH) | fcntl.LOCK_NB
+        while True:
+            try:
+                fcntl.flock(self._fd, operation)
+                return
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    kind = "exclusive" if exclusive else "shared"
+                    raise LockTimeout(f"Timed out waiting for {kind} lock on {self.path}") from None
+                time.sleep(POLL_INTERVAL)
+
+    def _is_current(self) -> bool:
+        """Check whether the locked file is still the one at the lock's path."""
+        try:
+            return os.stat(self.path).st_ino == os.fstat(self._fd).st_ino
+        except FileNotFoundError:
+            return False
+
+    def remove(self):
+        """Delete the lock file; call while holding the lock exclusively, so no other process holds it."""
+        if fcntl is not None and not self._exclusive:
+            raise RuntimeError(f"{self.path} must be locked exclusively to remove it")
+        self.path.unlink(missing_ok=True)
+
+    def generation(self) -> int:
+        """Get the write generation stored in the lock file."""
+        try:
+            if self._fd is not None:
+                content = os.pread(self._fd, 32, 0)
+            else:
+                with open(self.path, 'rb') as f:
+                    content = f.read(32)
+        except FileNotFoundError:
+            return 0
+        return int(content) if content.strip() else 0
+
+    def bump(self):
+        """Increment the write generation; call after changing the data file."""
+        if fcntl is None:
+            return
+        with self.acquire(exclusive=True):
+            generation = self.generation() + 1
+            os.ftruncate(self._fd, 0)
+            os.pwrite(self._fd, str(generation).encode(), 0)
@@ -0,0 +1,105 @@
+"""In-memory database backend.
+
+`MemoryDatabaseManager` is a `DatabaseManager` whose documents live in a
+dictionary instead of data files: the same operations, validation, secondary
+indexes, queries and transactions, without serialization or disk I/O. It
+suits tests, benchmarks that should measure the engine alone, and ephemeral
+runs; everything is lost when the manager is dropped.
+"""
+
+import marshal
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from . import formats
+from .db_manager import DatabaseManager
+
+
+class MemoryDatabaseManager(DatabaseManager):
+    persistent = False
+
+    def __init__(self, validate: Optional[bool] = None):
+        """Initialize an empty in-memory database.
+
+        Args:
+            validate: Check every written user and task against its schema
+        """
+        self._documents: Dict[Path, dict] = {}
+        self._generations: Dict[Path, int] = {}
+        super().__init__(base_dir=Path(":memory:"), journal=False, layout="single", locking=False,
+                         archive=False, validate=validate, write_behind=0, fsync="none")
+
+    def _initialize_files(self):
+        """Create the empty documents."""
+        for file_path in [self.users_file, self.ongoing_tasks_file, self.completed_tasks_file]:
+            self._save_json(file_path, {})
+
+    def _locked(self, file_path: Path, exclusive: bool = False):
+        """Hold the in-process lock; there are no other processes to exclude."""
+        return self._lock
+
+    def _file_signature(self, file_path: Path) -> Optional[Tuple[int, ...]]:
+        """Signature of a document: the number of times it was written."""
+        return (self._generations[file_path],) if file_path in self._documents else None
+
+    def _offsets(self, file_path: Path) -> Optional[Dict[str, List[int]]]:
+        """Documents are never serialized, so there are no offset indexes."""
+        return None
+
+    def _load_json(self, file_path: Path) -> dict:
+        """Get a document; a transaction gets its own copy, so rolling back leaves the stored one as it was."""
+        with self._lock:
+            data = self._buffered(file_path)
+            if data is not None:
+                return data
+            data = self._read_document(file_path)
+            if self._pending is not None:
+                data = marshal.loads(marshal.dumps(data))
+            return data
+
+    def _read_snapshot(self, file_path: Path) -> dict:
+        """Get the stored document."""
+        return self._documents.get(file_path, {})
+
+    def _read_document(self, file_path: Path) -> dict:
+        """Get the stored document; there is no cache to keep in front of it."""
+        return self._read_snapshot(file_path)
+
+    def _save_json(self, file_path: Path, data: dict) -> bool:
+        """Store a document."""
+        self._documents[file_path] = data
+        self._generations[file_path] = self._generations.get(file_path, 0) + 1
+        return True
+
+    def _flush(self, pending: Dict[Path, Tuple[dict, List[Dict[str, Any]]]]) -> bool:
+        """Store the documents of a transaction; swapping them in cannot fail halfway."""
+        for file_path, (data, _) in pending.items():
+            self._save_json(file_path, data)
+        return True
+
+    def compact(self, file_path: Path) -> bool:
+        """Nothing to fold: documents have no journal."""
+        return True
+
+    def migrate_format(self) -> int:
+        """Nothing to upgrade: documents are only ever written by this version.
+
+        Returns:
+            0, the number of documents upgraded
+        """
+        return 0
+
+    def convert_format(self, storage_format: str) -> int:
+        """Switch the storage format; documents are never serialized, so none is rewritten.
+
+        Returns:
+            0, the number of documents converted
+        """
+        if storage_format not in formats.FORMATS:
+            raise ValueError(f"Unknown storage format: {storage_format}")
+        self.storage_format = storage_format
+        return 0
+
+    def _document_files(self) -> List[Path]:
+        """List every stored document."""
+        return list(self._documents)
@@ -0,0 +1,279 @@
+"""Format versions of data files and the migrations between them.
+
+Every data file starts with a header entry, `"@meta": {"version": N}`. The
+manager writes it and strips it on read, so loaded documents never contain it.
+Files without a header were written before versioning and are version 1.
+
+MIGRATIONS upgrade the top-level values of one kind of document ("users",
+"tasks" or "completed") from one version to the next. Like journal operations
+they must be idempotent: a journal appended by an older version is replayed
+over an already upgraded snapshot and upgraded again.
+
+On startup the manager passes every older file to migrate_file, which streams
+it entry by entry into a new file and renames that over the original, so
+memory use is bounded by the largest entry (one user's tasks). Progress is
+checkpointed, and an interrupted migration resumes where it stopped. Files
+that are read before they were migrated, e.g. restored from a backup, are
+upgraded in memory, so readers can always assume the current shape.
+
+Versions:
+    1: no header; tasks may lack "priority" and "category", and may share IDs
+    2: header; every task has "priority" and "category", None if never set,
+       and the tasks of a user have distinct IDs
+"""
+
+import json
+import os
+from functools import partial
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from . import formats, stream
+from .durability import CorruptDocumentError, Durability, fsync_path
+from ..constants import MIGRATION_CHECKPOINT_ENTRIES
+
+META_KEY = "@meta"
+CURRENT_VERSION = 2
+STAMP_FILENAME = "format-version"  # the version the whole data directory was migrated to
+
+
+class DocumentVersionError(ValueError):
+    """Raised when a data file was written by a newer version of the application."""
+
+
+def _add_task_fields(tasks: List[Dict[str, Any]], id_field: str) -> List[Dict[str, Any]]:
+    """1 -> 2: give every task a priority and a category, None where none was set, and an ID of its own.
+
+    Version 1 numbered new tasks len(tasks) + 1, so a task added after a
+    delete could share its ID with another; every task after the first with
+    an ID gets a new one after the highest.
+    """
+    next_id = max((task[id_field] for task in tasks if isinstance(task.get(id_field), int)), default=0) + 1
+    seen = set()
+    for task in tasks:
+        task.setdefault("priority", None)
+        task.setdefault("category", None)
+        task_id = task.get(id_field)
+        if not isinstance(task_id, int):
+            continue
+        if task_id in seen:
+            task[id_field] = next_id
+            next_id += 1
+        seen.add(task[id_field])
+    return tasks
+
+
+# MIGRATIONS[version][kind] upgrades one top-level value from version to version + 1
+MIGRATIONS: Dict[int, Dict[str, Callable[[Any], Any]]] = {
+    1: {"tasks": partial(_add_task_fields, id_field="task_id"),
+        "completed": partial(_add_task_fields, id_field="completed_id")},
+}
+
+
+def header() -> Dict[str, Any]:
+    """Get the header value written at the start of every data file."""
+    return {"version": CURRENT_VERSION}
+
+
+def with_header(data: dict) -> dict:
+    """Get a copy of a document with the header as its first entry."""
+    return {META_KEY: header(), **data}
+
+
+def check_version(version: Any) -> int:
+    """Check that a file's version is one this code can read.
+
+    Raises:
+        DocumentVersionError: If it is newer than CURRENT_VERSION
+    """
+    if not isinstance(version, int) or version > CURRENT_VERSION:
+        raise DocumentVersionError(f"Data format version {version} is newer than the supported "
+                                   f"version {CURRENT_VERSION}; upgrade the application")
+    return version
+
+
+def split_header(data: dict) -> int:
+    """Remove the header from a loaded document and return the document's version.
+
+    Raises:
+        DocumentVersionError: If the document was written by a newer version
+    """
+    meta = data.pop(META_KEY, None)
+    return check_version(meta.get("version", 1)) if isinstance(meta, dict) else 1
+
+
+def upgrade_value(kind: Optional[str], value: Any, version: int) -> Any:
+    """Upgrade one top-level value of a document of some kind to CURRENT_VERSION."""
+    for step in range(version, CURRENT_VERSION):
+        migrate = MIGRATIONS[step].get(kind)
+        if migrate is not None:
+            value = migrate(value)
+    return value
+
+
+def upgrade(kind: Optional[str], data: dict, version: int) -> dict:
+    """Upgrade every top-level value of a loaded document in place."""
+    if version < CURRENT_VERSION and kind is not None:
+        for key, value in data.items():
+            data[key] = upgrade_value(kind, value, version)
+    return data
+
+
+def read_version(file_path: Path) -> int:
+    """Get the version of a data file, reading only its first entry unless it is marshalled.
+
+    Raises:
+        CorruptDocumentError: If the file cannot be decoded
+        DocumentVersionError: If it was written by a newer version
+    """
+    try:
+        with open(file_path, 'rb') as f:
+            if f.read(len(formats.MARSHAL_HEADER)) == formats.MARSHAL_HEADER:
+                f.seek(0)
+                return split_header(formats.loads(f.read()))
+            for key, value, _ in stream.iter_entries(f):
+                if key == META_KEY and isinstance(value, dict):
+                    return check_version(value.get("version", 1))
+                return 1
+            return 1
+    except FileNotFoundError:
+        return CURRENT_VERSION
+    except DocumentVersionError:
+        raise
+    except ValueError as e:
+        raise CorruptDocumentError(f"{file_path} is corrupt: {e}") from e
+
+
+# Directory stamp
+def read_stamp(directory: Path) -> int:
+    """Get the version a data directory was last migrated to; 1 if it never was.
+
+    Raises:
+        DocumentVersionError: If a newer version migrated it
+    """
+    try:
+        version = int((directory / STAMP_FILENAME).read_text())
+    except (FileNotFoundError, ValueError):
+        return 1
+    return check_version(version)
+
+
+def write_stamp(directory: Path, durability: Durability):
+    """Record that every data file in a directory is at CURRENT_VERSION."""
+    durability.write_atomic(directory / STAMP_FILENAME, f"{CURRENT_VERSION}\n".encode())
+
+
+# Streaming migration
+def _progress_paths(file_path: Path):
+    """Get the new file, its offsets and the checkpoint of a migration in progress."""
+    return (file_path.with_name(file_path.name + ".migrating"),
+            file_path.with_name(file_path.name + ".migrating.idx"),
+            file_path.with_name(file_path.name + ".migration"))
+
+
+def discard_progress(file_path: Path):
+    """Remove what an interrupted migration of a file left behind."""
+    for path in _progress_paths(file_path):
+        path.unlink(missing_ok=True)
+
+
+def _signature(file_path: Path) -> List[int]:
+    """Get the (mtime, size, inode) of the file being migrated, to tell whether a checkpoint still applies."""
+    stat = os.stat(file_path)
+    return [stat.st_mtime_ns, stat.st_size, stat.st_ino]
+
+
+def migrate_file(file_path: Path, kind: Optional[str], durability: Durability,
+                 checkpoint_every: Optional[int] = None) -> Optional[Dict[str, List[int]]]:
+    """Rewrite a data file at CURRENT_VERSION, keeping its storage format.
+
+    JSON files are streamed one top-level entry at a time into a new file,
+    which replaces the original when it is complete. Every checkpoint_every
+    entries the progress is synced and recorded, and a later call on the
+    unchanged file continues from the last checkpoint. Marshalled files cannot
+    be streamed and are upgraded in memory.
+
+    Args:
+        file_path: The data file
+        kind: "users", "tasks", "completed", or None for documents without records
+        durability: The fsync policy of the new file
+        checkpoint_every: Entries between checkpoints (MIGRATION_CHECKPOINT_ENTRIES by default)
+
+    Returns:
+        The byte ranges of the values in the new file, or None for marshal
+
+    Raises:
+        CorruptDocumentError: If the file cannot be decoded
+        DocumentVersionError: If it was written by a newer version
+    """
+    version = read_version(file_path)
+    with open(file_path, 'rb') as f:
+        head = f.read(stream.CHUNK_SIZE)
+    storage_format = formats.detect(head)
+    if storage_format == "marshal":
+        with open(file_path, 'rb') as f:
+            data = formats.loads(f.read())
+        upgrade(kind, data, split_header(data))
+        durability.write_atomic(file_path, formats.dumps(with_header(data), "marshal"))
+        return None
+
+    checkpoint_every = checkpoint_every or MIGRATION_CHECKPOINT_ENTRIES
+    output_path, offsets_path, checkpoint_path = _progress_paths(file_path)
+    signature = _signature(file_path)
+    checkpoint = None
+    try:
+        checkpoint = json.loads(checkpoint_path.read_text())
+        if (checkpoint["signature"] != signature or checkpoint["version"] != version
+                or output_path.stat().st_size < checkpoint["output"]
+                or offsets_path.stat().st_size < checkpoint["offsets"]):
+            checkpoint = None  # for another file, or the writes it covers were lost
+    except (OSError, ValueError, KeyError, TypeError):
+        checkpoint = None
+
+    try:
+        with open(output_path, 'r+b' if checkpoint else 'wb') as output, \
+                open(offsets_path, 'r+b' if checkpoint else 'wb') as offsets_file, \
+                open(file_path, 'rb') as source:
+            if checkpoint:
+                for f, size in ((output, checkpoint["output"]), (offsets_file, checkpoint["offsets"])):
+                    f.truncate(size)
+                    f.seek(size)
+                writer = stream.EntryWriter(output, storage_format, checkpoint["output"])
+                position, entries = checkpoint["source"], checkpoint["entries"]
+            else:
+                writer = stream.EntryWriter(output, storage_format)
+                span = writer.write(META_KEY, header())
+                offsets_file.write((json.dumps([META_KEY, span]) + "\n").encode())
+                position, entries = 0, 0
+
+            for key, value, end in stream.iter_entries(source, position):
+                if key == META_KEY:
+                    continue
+                span = writer.write(key, upgrade_value(kind, value, version))
+                offsets_file.write((json.dumps([key, span]) + "\n").encode())
+                entries += 1
+                if entries % checkpoint_every == 0:
+                    for f in (output, offsets_file):
+                        f.flush()
+                        if durability.policy != "none":
+                            os.fsync(f.fileno())
+                    durability.write_atomic(checkpoint_path, json.dumps({
+                        "signature": signature, "version": version, "source": end,
+                        "output": writer.position, "offsets": offsets_file.tell(), "entries": entries
+                    }).encode())
+            writer.close()
+    except ValueError as e:
+        raise CorruptDocumentError(f"{file_path} is corrupt: {e}") from e
+
+    if durability.policy != "none":
+        fsync_path(output_path)
+    os.replace(output_path, file_path)
+    durability.written(file_path.parent)
+
+    offsets = {}
+    with open(offsets_path, 'r') as f:
+        for line in f:
+            key, span = json.loads(line)
+            offsets[key] = span
+    discard_progress(file_path)
+    return offsets
@@ -0,0 +1,175 @@
+"""Task queries shared by the database backends.
+
+A query selects tasks of one user:
+
+    where:    {field: value} for equality, or {field: {operator: value, ...}}
+              with the operators eq, ne, lt, lte, gt, gte and in
+    order_by: a field name, prefixed with "-" for descending order
+    limit, offset: the page of results to return
+    fields:   the fields to return for each task (all when omitted)
+
+Values compare in the field's sort order (see indexes.sort_key), so priorities
+match across languages and the most urgent priority is the "lowest". Other
+fields order missing values first, then numbers, strings and anything else,
+so tasks whose values differ in type can still be filtered and ordered.
+Without order_by, tasks are returned in the order they were stored.
+"""
+
+import json
+import operator
+import re
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from .indexes import INDEXED_FIELDS, UserIndex, sort_key
+
+OPERATORS = {
+    "eq": operator.eq,
+    "ne": operator.ne,
+    "lt": operator.lt,
+    "lte": operator.le,
+    "gt": operator.gt,
+    "gte": operator.ge,
+    "in": lambda key, keys: key in keys
+}
+
+FIELD_NAME = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+def field_key(field: str, value: Any):
+    """Get the key a field value is compared and ordered by."""
+    if field in INDEXED_FIELDS:
+        return sort_key(field, value)
+    # Missing values order first, then numbers, then strings, then anything
+    # else by its text; values of different kinds never compare directly
+    if value is None:
+        return (0,)
+    if isinstance(value, (int, float)):
+        return (1, value)
+    if isinstance(value, str):
+        return (2, value)
+    return (3, json.dumps(value, sort_keys=True, default=str))
+
+
+def _check_field(field: str) -> str:
+    """Reject field names that could not be stored task fields."""
+    if not FIELD_NAME.match(field):
+        raise ValueError(f"Invalid field name: {field!r}")
+    return field
+
+
+class Query:
+    def __init__(self, where: Optional[Dict[str, Any]] = None, order_by: Optional[str] = None,
+                 limit: Optional[int] = None, offset: int = 0, fields: Optional[Sequence[str]] = None):
+        """Parse and validate a query.
+
+        Raises:
+            ValueError: If a field name, operator or page bound is invalid
+        """
+        self.conditions: List[Tuple[str, str, Any]] = []
+        for field, condition in (where or {}).items():
+            _check_field(field)
+            if not isinstance(condition, dict):
+                condition = {"eq": condition}
+            for op, value in condition.items():
+                if op not in OPERATORS:
+                    raise ValueError(f"Unknown query operator: {op}")
+                self.conditions.append((field, op, value))
+
+        self.descending = bool(order_by) and order_by.startswith("-")
+        self.order_by = _check_field(order_by.lstrip("-")) if order_by else None
+
+        if (limit is not None and limit < 0) or offset < 0:
+            raise ValueError("limit and offset must not be negative")
+        self.limit = limit
+        self.offset = offset
+        self.fields = [_check_field(field) for field in fields] if fields else None
+
+        # Comparison keys of the operands, computed once
+        self._keys = [
+            (field, OPERATORS[op], {field_key(field, v) for v in value} if op == "in" else field_key(field, value))
+            for field, op, value in self.conditions
+        ]
+
+    def matches(self, task: Dict[str, Any]) -> bool:
+        """Check whether a task satisfies every condition."""
+        return all(compare(field_key(field, task.get(field)), key) for field, compare, key in self._keys)
+
+    def project(self, task: Dict[str, Any]) -> Dict[str, Any]:
+        """Keep only the requested fields of a task."""
+        if self.fields is None:
+            return task
+        return {field: task.get(field) for field in self.fields}
+
+    def key_bounds(self, field: str) -> Tuple[Any, Any]:
+        """Get inclusive (low, high) sort key bounds the conditions put on a field; None if open."""
+        low = high = None
+        for condition_field, op, value in self.conditions:
+            if condition_field != field or op == "ne":
+                continue
+            keys = [sort_key(field, v) for v in value] if op == "in" else [sort_key(field, value)]
+            if not keys:
+                continue
+            if op in ("eq", "in", "gt", "gte"):
+                low = min(keys) if low is None else max(low, min(keys))
+            if op in ("eq", "in", "lt", "lte"):
+                high = max(keys) if high is None else min(high, max(keys))
+        return low, high
+
+    def lower_value(self, field: str) -> Any:
+        """Get the greatest lower bound the conditions put on a field, as a raw value."""
+        values = [value for condition_field, op, value in self.conditions
+                  if condition_field == field and op in ("eq", "gt", "gte")]
+        return max(values) if values else None
+
+    def _narrowest_range(self, index: UserIndex) -> Optional[List[Dict[str, Any]]]:
+        """Get the tasks in the narrowest range any condition allows on an indexed field, in ID order."""
+        best = None
+        for field in {field for field, _, _ in self.conditions if field in INDEXED_FIELDS}:
+            entries = index.entries(field, *self.key_bounds(field))
+            if best is None or len(entries) < len(best):
+                best = entries
+        if best is None:
+            return None
+        return [index.tasks[task_id] for task_id in sorted(task_id for _, task_id in best)]
+
+    def execute(self, tasks: Iterable[Dict[str, Any]], index: Optional[UserIndex] = None,
+                id_field: str = "task_id") -> List[Dict[str, Any]]:
+        """Run the query over one user's tasks.
+
+        Args:
+            tasks: The user's tasks in storage order; may be a lazy iterator
+            index: The user's secondary indexes, used to narrow and order the scan if they cover every task
+            id_field: Field that orders tasks whose order_by values are equal
+
+        Returns:
+            The requested page of matching tasks
+        """
+        stop = None if self.limit is None else self.offset + self.limit
+        ordered = self.order_by is None
+        if index is not None and not index.complete:
+            index = None
+        if index is not None and self.order_by in INDEXED_FIELDS:
+            # Walk the order_by index, within the range its own conditions allow
+            order = index.orders[self.order_by]
+            positions = range(*index.span(self.order_by, *self.key_bounds(self.order_by)))
+            if self.descending:
+                positions = positions[::-1]
+            if not self.conditions:
+                # Nothing to filter, so the page is located by position alone
+                return [self.project(index.tasks[order[i][1]]) for i in positions[self.offset:stop]]
+            tasks, ordered = (index.tasks[order[i][1]] for i in positions), True
+        elif index is not None:
+            candidates = self._narrowest_range(index)
+            if candidates is not None:
+                tasks = candidates
+
+        matching: Iterator[Dict[str, Any]] = (task for task in tasks if self.matches(task))
+        if not ordered:
+            matching = iter(sorted(
+                matching,
+                key=lambda task: (field_key(self.order_by, task.get(self.order_by)), task.get(id_field) or 0),
+                reverse=self.descending
+            ))
+        # Stops reading candidates as soon as the page is full
+        return [self.project(task) for task in islice(matching, self.offset, stop)]
@@ -1,67 +1,86 @@
-"""JSON schemas for database validation."""
+"""JSON schemas for database validation.
 
-from typing import Dict, Any
+The record schemas describe one user or one task; the document schemas
+describe whole data files built from them. Writes are checked record by
+record (see validation.py), full files only by `python -m tasks fsck`.
+"""
+
+from typing import Dict, Any, List
+
+from ..i18n.languages import LANGUAGES
+
+
+def _translations(*keys: str) -> List[str]:
+    """Get the texts of some language keys in every language."""
+    return sorted({texts[key] for texts in LANGUAGES.values() for key in keys if key in texts})
+
+
+STATUSES = _translations("STATUS_IN_PROGRESS", "STATUS_ON_HOLD", "STATUS_ALMOST_DONE", "STATUS_COMPLETED")
+PRIORITIES = _translations("PRIORITY_LOW", "PRIORITY_MEDIUM", "PRIORITY_HIGH", "PRIORITY_URGENT")
+CATEGORIES = _translations("CATEGORY_WORK", "CATEGORY_PERSONAL", "CATEGORY_SHOPPING",
+                           "CATEGORY_HEALTH", "CATEGORY_STUDY", "CATEGORY_OTHER")
+
+# Timestamps are stored as DATETIME_FORMAT, which is not RFC 3339 "date-time"
+TIMESTAMP_SCHEMA = {"type": "string", "pattern": r"^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}$"}
+
+USER_SCHEMA: Dict[str, Any] = {
+    "type": "object",
+    "required": ["userid", "password"],
+    "properties": {
+        "userid": {"type": "integer", "minimum": 1},
+        "password": {"type": "string", "minLength": 60, "maxLength": 60}  # bcrypt hash length
+    },
+    "additionalProperties": False
+}
+
+TASK_SCHEMA: Dict[str, Any] = {
+    "type": "object",
+    "required": ["task_id", "name", "description", "priority", "category", "created_at", "due_date", "status"],
+    "properties": {
+        "task_id": {"type": "integer", "minimum": 1},
+        "name": {"type": "string", "minLength": 1},
+        "description": {"type": "string"},
+        "created_at": TIMESTAMP_SCHEMA,
+        "due_date": TIMESTAMP_SCHEMA,
+        "status": {"enum": STATUSES},
+        "priority": {"enum": PRIORITIES + [None]},
+        "category": {"enum": CATEGORIES + [None]}
+    },
+    "additionalProperties": False
+}
+
+COMPLETED_TASK_SCHEMA: Dict[str, Any] = {
+    "type": "object",
+    "required": ["completed_id", "name", "description", "priority", "category", "created_at", "due_date",
+                 "completed_at", "status"],
+    "properties": {
+        "completed_id": {"type": "integer", "minimum": 1},
+        "name": {"type": "string", "minLength": 1},
+        "description": {"type": "string"},
+        "created_at": TIMESTAMP_SCHEMA,
+        "due_date": TIMESTAMP_SCHEMA,
+        "completed_at": TIMESTAMP_SCHEMA,
+        "status": {"enum": _translations("STATUS_COMPLETED")},
+        "priority": {"enum": PRIORITIES + [None]},
+        "category": {"enum": CATEGORIES + [None]}
+    },
+    "additionalProperties": False
+}
 
 USERS_SCHEMA = {
     "type": "object",
-    "patternProperties": {
-        "^[a-zA-Z0-9_]+$": {  # username pattern
-            "type": "object",
-            "required": ["userid", "password"],
-            "properties": {
-                "userid": {"type": "integer", "minimum": 1},
-                "password": {"type": "string", "minLength": 60, "maxLength": 60}  # bcrypt hash length
-            },
-            "additionalProperties": False
-        }
-    }
+    "propertyNames": {"minLength": 1},  # usernames
+    "additionalProperties": USER_SCHEMA
 }
 
 ONGOING_TASKS_SCHEMA = {
     "type": "object",
-    "patternProperties": {
-        "^[0-9]+$": {  # user ID pattern
-            "type": "array",
-            "items": {
-                "type": "object",
-                "required": ["task_id", "name", "description", "created_at", "due_date", "status"],
-                "properties": {
-                    "task_id": {"type": "integer", "minimum": 1},
-                    "name": {"type": "string", "minLength": 1},
-                    "description": {"type": "string"},
-                    "created_at": {"type": "string", "format": "date-time"},
-                    "due_date": {"type": "string", "format": "date-time"},
-                    "status": {"type": "string", "enum": ["In Progress", "On Hold", "Almost Done", "Completed"]},
-                    "priority": {"type": "string", "enum": ["Low", "Medium", "High", "Urgent"]},
-                    "category": {"type": "string", "enum": ["Work", "Personal", "Shopping", "Health", "Study", "Other"]}
-                },
-                "additionalProperties": False
-            }
-        }
-    }
+    "propertyNames": {"pattern": "^[0-9]+$"},  # user IDs
+    "additionalProperties": {"type": "array", "items": TASK_SCHEMA}
 }
 
 COMPLETED_TASKS_SCHEMA = {
     "type": "object",
-    "patternProperties": {
-        "^[0-9]+$": {  # user ID pattern
-            "type": "array",
-            "items": {
-                "type": "object",
-                "required": ["completed_id", "name", "description", "created_at", "due_date", "completed_at", "status"],
-                "properties": {
-                    "completed_id": {"type": "integer", "minimum": 1},
-                    "name": {"type": "string", "minLength": 1},
-                    "description": {"type": "string"},
-                    "created_at": {"type": "string", "format": "date-time"},
-                    "due_date": {"type": "string", "format": "date-time"},
-                    "completed_at": {"type": "string", "format": "date-time"},
-                    "status": {"type": "string", "enum": ["Completed"]},
-                    "priority": {"type": "string", "enum": ["Low", "Medium", "High", "Urgent"]},
-                    "category": {"type": "string", "enum": ["Work", "Personal", "Shopping", "Health", "Study", "Other"]}
-                },
-                "additionalProperties": False
-            }
-        }
-    }
-} 
\ No newline at end of file
+    "propertyNames": {"pattern": "^[0-9]+$"},  # user IDs
+    "additionalProperties": {"type": "array", "items": COMPLETED_TASK_SCHEMA}
+}
@@ -0,0 +1,104 @@
+"""Persistent monotonic ID sequences."""
+
+import os
+import threading
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+class SequenceAllocator:
+    def __init__(self, directory: Optional[Path]):
+        """Initialize the allocator storing one small counter file per scope.
+
+        Args:
+            directory: Directory holding the counter files; None keeps the counters in memory
+        """
+        self.directory = directory
+        if self.directory is not None:
+            self.directory.mkdir(exist_ok=True)
+        self._counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _sequence_file(self, scope: str) -> Path:
+        """Get the counter file of a scope."""
+        return self.directory / f"{scope}.seq"
+
+    def allocate(self, scope: str, count: int = 1, seed: Optional[Callable[[], int]] = None) -> int:
+        """Allocate a block of consecutive IDs from a scope.
+
+        Allocation reads and rewrites only the scope's counter file, under an
+        exclusive file lock so concurrent processes never receive the same ID.
+        IDs are never reused, even after the objects they name are deleted.
+
+        Args:
+            scope: Name of the sequence, e.g. "users" or "tasks-3"
+            count: Number of IDs to allocate
+            seed: Returns the highest ID already in use; called when the scope is new
+
+        Returns:
+            The first allocated ID
+        """
+        return self._update(scope, lambda last: last + count, seed) + 1
+
+    def advance(self, scope: str, highest: int, seed: Optional[Callable[[], int]] = None):
+        """Make sure IDs up to highest, which were stored without being allocated, are never allocated.
+
+        Args:
+            scope: Name of the sequence
+            highest: The highest ID that was stored
+            seed: Returns the highest ID already in use; called when the scope is new
+        """
+        self._update(scope, lambda last: max(last, highest), seed)
+
+    def scopes(self) -> List[str]:
+        """Get the names of the sequences IDs were allocated from."""
+        if self.directory is None:
+            return list(self._counters)
+        return [path.stem for path in self.directory.glob("*.seq")]
+
+    def _update(self, scope: str, change: Callable[[int], int], seed: Optional[Callable[[], int]]) -> int:
+        """Replace a scope's counter with change(counter) and return the counter it had."""
+        # The seed reads a data file, whose lock may be held by a thread or process that is
+        # waiting for this sequence, so it is computed before the sequence is locked
+        initial = seed() if seed is not None and self._is_new(scope) else 0
+        with self._lock:
+            if self.directory is None:
+                last = self._counters.get(scope, initial)
+                self._counters[scope] = change(last)
+                return last
+            fd = os.open(self._sequence_file(scope), os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                if fcntl:
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+                content = os.read(fd, 64).strip()
+                last = int(content) if content else initial
+                # Counters only grow, so the new value covers the old one without truncating the file first
+                os.lseek(fd, 0, os.SEEK_SET)
+                os.write(fd, str(max(change(last), last)).encode())
+                return last
+            finally:
+                os.close(fd)
+
+    def _is_new(self, scope: str) -> bool:
+        """Check whether nothing was allocated from a scope yet."""
+        if self.directory is None:
+            return scope not in self._counters
+        try:
+            return self._sequence_file(scope).stat().st_size == 0
+        except FileNotFoundError:
+            return True
+
+    def current(self, scope: str) -> int:
+        """Get the last ID allocated from a scope, or 0 if none was."""
+        if self.directory is None:
+            return self._counters.get(scope, 0)
+        try:
+            content = self._sequence_file(scope).read_text().strip()
+        except FileNotFoundError:
+            return 0
+        return int(content) if content else 0
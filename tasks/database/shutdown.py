@@ -0,0 +1,57 @@
+"""Flushing write-behind buffers when the process ends.
+
+Managers that buffer writes register here. Their buffers are flushed when the
+interpreter exits, and when the process receives SIGTERM or SIGHUP, before
+the signal's previous handler runs (or the process exits, if there was none).
+"""
+
+import atexit
+import signal
+import threading
+import weakref
+
+SIGNALS = tuple(getattr(signal, name) for name in ("SIGTERM", "SIGHUP") if hasattr(signal, name))
+
+_managers = weakref.WeakSet()
+_previous_handlers = {}
+_installed = False
+_install_lock = threading.Lock()
+
+
+def flush_all():
+    """Flush every registered manager, skipping any that fails."""
+    for manager in list(_managers):
+        try:
+            manager.flush()
+        except Exception:
+            pass
+
+
+def _handle_signal(signum, frame):
+    """Flush, then hand the signal to whoever handled it before."""
+    flush_all()
+    previous = _previous_handlers.get(signum)
+    if callable(previous):
+        previous(signum, frame)
+    elif previous != signal.SIG_IGN:
+        raise SystemExit(128 + signum)
+
+
+def flush_at_exit(manager):
+    """Flush a manager's buffered writes at exit and on termination signals.
+
+    Only a weak reference is kept, so registering does not keep the manager alive.
+    """
+    global _installed
+    _managers.add(manager)
+    with _install_lock:
+        if _installed:
+            return
+        _installed = True
+        atexit.register(flush_all)
+        for signum in SIGNALS:
+            try:
+                _previous_handlers[signum] = signal.signal(signum, _handle_signal)
+            except ValueError:
+                # Handlers can only be set from the main thread; exit still flushes
+                pass
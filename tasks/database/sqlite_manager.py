@@ -0,0 +1,513 @@
+"""SQLite database manager implementing the DatabaseManager API."""
+
+import json
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any, Iterator, List, Optional, Tuple, Union
+
+from .archive import timestamp
+from .indexes import INDEXED_FIELDS, PRIORITY_RANKS, UNRANKED, sort_key
+from .migrations import CURRENT_VERSION, check_version, upgrade_value
+from .query import Query
+from .validation import check_documents, validate_record
+from ..constants import DATA_DIR, SQLITE_FILENAME, DATABASE_VALIDATION
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    userid INTEGER,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_users_userid ON users (userid);
+
+CREATE TABLE IF NOT EXISTS ongoing_tasks (
+    user_id TEXT NOT NULL,
+    task_id INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (user_id, task_id)
+);
+
+CREATE TABLE IF NOT EXISTS completed_tasks (
+    user_id TEXT NOT NULL,
+    completed_id INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (user_id, completed_id)
+);
+
+CREATE TABLE IF NOT EXISTS sequences (
+    scope TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+def _sort_expression(field: str) -> str:
+    """SQL expression computing the same sort key as indexes.sort_key."""
+    if field == "priority":
+        cases = " ".join(
+            "WHEN '{}' THEN {}".format(text.replace("'", "''"), rank) for text, rank in PRIORITY_RANKS.items()
+        )
+        return f"(CASE json_extract(data, '$.priority') {cases} ELSE {UNRANKED} END)"
+    return f"COALESCE(json_extract(data, '$.{field}'), '')"
+
+
+def _field_expression(field: str) -> str:
+    """SQL expression a query compares and orders a field by; matches query.field_key."""
+    if field in INDEXED_FIELDS:
+        return _sort_expression(field)
+    return f"json_extract(data, '$.{field}')"
+
+
+def _field_param(field: str, value: Any) -> Any:
+    """Convert a query operand to the form _field_expression produces."""
+    return sort_key(field, value) if field in INDEXED_FIELDS else value
+
+
+MIGRATION_BATCH_SIZE = 1000  # rows upgraded per statement batch
+
+SQL_OPERATORS = {"eq": "IS", "ne": "IS NOT", "lt": "<", "lte": "<=", "gt": ">", "gte": ">="}
+USER_SEED_QUERY = "SELECT COALESCE(MAX(userid), 0) FROM users"
+
+
+# Expression indexes matching the JSON backend's secondary indexes
+INDEX_SCHEMA = "".join(
+    f"CREATE INDEX IF NOT EXISTS idx_ongoing_tasks_{field} ON ongoing_tasks "
+    f"(user_id, {_sort_expression(field)}, task_id);\n"
+    for field in INDEXED_FIELDS
+)
+
+
+class SQLiteDatabaseManager:
+    def __init__(self, db_path: Optional[Path] = None, validate: Optional[bool] = None,
+                 base_dir: Optional[Path] = None):
+        """Initialize the SQLite database manager.
+
+        Args:
+            db_path: The database file (SQLITE_FILENAME in base_dir by default)
+            validate: Check every written user and task against its schema
+            base_dir: Directory holding the database (DATA_DIR, set with TASKS_DATA_DIR, by default)
+        """
+        self.base_dir = Path(base_dir) if base_dir else DATA_DIR
+        self.base_dir.mkdir(parents=True, exist_ok=True)
+        self.db_path = Path(db_path) if db_path else self.base_dir / SQLITE_FILENAME
+
+        self.conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.executescript(INDEX_SCHEMA)
+        self._lock = threading.RLock()
+        self._in_transaction = False
+        self.validation_enabled = DATABASE_VALIDATION if validate is None else validate
+        self._migrate_version()
+
+    def _migrate_version(self):
+        """Upgrade rows written by older versions; PRAGMA user_version holds the format version.
+
+        Rows are rewritten in batches inside one transaction, so an interrupted
+        upgrade is rolled back and runs again on the next start.
+        """
+        version = check_version(self.conn.execute("PRAGMA user_version").fetchone()[0] or 1)
+        if version == CURRENT_VERSION:
+            return
+        with self._lock, self.conn:
+            for table, kind in (("ongoing_tasks", "tasks"), ("completed_tasks", "completed")):
+                last = 0
+                while True:
+                    rows = self.conn.execute(f"SELECT rowid, data FROM {table} WHERE rowid > ? ORDER BY rowid LIMIT ?",
+                                             (last, MIGRATION_BATCH_SIZE)).fetchall()
+                    if not rows:
+                        break
+                    self.conn.executemany(f"UPDATE {table} SET data = ? WHERE rowid = ?", [
+                        (json.dumps(upgrade_value(kind, [json.loads(data)], version)[0]), rowid) for rowid, data in rows
+                    ])
+                    last = rows[-1][0]
+            self.conn.execute(f"PRAGMA user_version = {CURRENT_VERSION}")
+
+    def close(self):
+        """Close the underlying connection."""
+        self.conn.close()
+
+    def _execute_write(self, query: str, params: tuple = ()) -> int:
+        """Run a single write statement and return the row count.
+
+        Outside a transaction the statement is committed on its own.
+        """
+        with self._lock:
+            if self._in_transaction:
+                return self.conn.execute(query, params).rowcount
+            try:
+                with self.conn:
+                    return self.conn.execute(query, params).rowcount
+            except sqlite3.Error:
+                return -1
+
+    def _fetch(self, query: str, params=()) -> list:
+        """Run a read statement and return every row.
+
+        The connection is shared between threads, so the statement runs under
+        the lock, never inside another thread's open transaction, and its rows
+        are fetched before the lock is released.
+        """
+        with self._lock:
+            return self.conn.execute(query, params).fetchall()
+
+    def _validate(self, kind: str, records: list):
+        """Check the records about to be written against their schema.
+
+        Raises:
+            RecordValidationError: If a record does not match
+        """
+        if self.validation_enabled:
+            for record in records:
+                validate_record(kind, record)
+
+    def _execute_write_many(self, query: str, rows: list) -> int:
+        """Run a write statement once per row and return the total row count.
+
+        Outside a transaction all rows are committed together.
+        """
+        with self._lock:
+            if self._in_transaction:
+                return self.conn.executemany(query, rows).rowcount
+            try:
+                with self.conn:
+                    return self.conn.executemany(query, rows).rowcount
+            except sqlite3.Error:
+                return -1
+
+    @contextmanager
+    def transaction(self):
+        """Group several operations into one atomic commit.
+
+        If the block raises, every statement it ran is rolled back.
+        Nested transactions join the outermost one.
+
+        Raises:
+            OSError: If the changes could not be committed
+        """
+        with self._lock:
+            if self._in_transaction:
+                yield self
+                return
+
+            self._in_transaction = True
+            try:
+                with self.conn:
+                    yield self
+            except sqlite3.Error as e:
+                raise OSError(f"Failed to commit transaction: {e}") from e
+            finally:
+                self._in_transaction = False
+
+    def _generate_task_id(self, user_id: str, is_completed: bool = False, count: int = 1) -> int:
+        """Generate new task IDs for a user.
+
+        Args:
+            user_id: The user's ID
+            is_completed: Whether this is for a completed task
+            count: Number of consecutive IDs to allocate
+
+        Returns:
+            The first of the new unique task IDs
+        """
+        return self._allocate(*self._task_sequence(user_id, is_completed), count)
+
+    @staticmethod
+    def _task_sequence(user_id: str, is_completed: bool = False) -> Tuple[str, str, tuple]:
+        """Get the scope of a user's task sequence and the query seeding it."""
+        if is_completed:
+            table, id_column, scope = "completed_tasks", "completed_id", f"completed-{user_id}"
+        else:
+            table, id_column, scope = "ongoing_tasks", "task_id", f"tasks-{user_id}"
+        return scope, f"SELECT COALESCE(MAX({id_column}), 0) FROM {table} WHERE user_id = ?", (str(user_id),)
+
+    def _assign_task_ids(self, user_id: str, tasks: list, is_completed: bool = False):
+        """Give every task without an ID a new one, allocating them as one block.
+
+        The sequence is first advanced past the IDs tasks already carry (e.g.
+        imported ones), so they are never allocated again.
+        """
+        id_field = "completed_id" if is_completed else "task_id"
+        highest = max((task[id_field] for task in tasks if isinstance(task.get(id_field), int)), default=0)
+        if highest:
+            self._advance(*self._task_sequence(user_id, is_completed), highest)
+        new_tasks = [task for task in tasks if id_field not in task]
+        if new_tasks:
+            first_id = self._generate_task_id(user_id, is_completed, count=len(new_tasks))
+            for offset, task in enumerate(new_tasks):
+                task[id_field] = first_id + offset
+
+    def allocate_user_id(self, count: int = 1) -> int:
+        """Allocate new unique user IDs and return the first."""
+        return self._allocate("users", USER_SEED_QUERY, count=count)
+
+    def _assign_user_ids(self, users: Dict[str, Dict[str, Any]]):
+        """Give every user without a userid a new one, after advancing the sequence past the given ones."""
+        highest = max((user["userid"] for user in users.values() if isinstance(user.get("userid"), int)), default=0)
+        if highest:
+            self._advance("users", USER_SEED_QUERY, (), highest)
+        new_users = [user for user in users.values() if "userid" not in user]
+        if new_users:
+            first_id = self.allocate_user_id(count=len(new_users))
+            for offset, user in enumerate(new_users):
+                user["userid"] = first_id + offset
+
+    def _seed(self, scope: str, seed_query: str, seed_params: tuple):
+        """Create a sequence that does not exist yet, starting after the highest ID returned by seed_query."""
+        if self.conn.execute("SELECT 1 FROM sequences WHERE scope = ?", (scope,)).fetchone() is None:
+            seed = self.conn.execute(seed_query, seed_params).fetchone()[0]
+            self.conn.execute("INSERT OR IGNORE INTO sequences (scope, value) VALUES (?, ?)", (scope, seed))
+
+    def _allocate(self, scope: str, seed_query: str, seed_params: tuple = (), count: int = 1) -> int:
+        """Allocate a block of IDs from a persisted sequence and return the first one.
+
+        A new sequence starts after the highest ID returned by seed_query.
+        """
+        with self.transaction():
+            self._seed(scope, seed_query, seed_params)
+            self.conn.execute("UPDATE sequences SET value = value + ? WHERE scope = ?", (count, scope))
+            value = self.conn.execute("SELECT value FROM sequences WHERE scope = ?", (scope,)).fetchone()[0]
+        return value - count + 1
+
+    def _advance(self, scope: str, seed_query: str, seed_params: tuple, highest: int):
+        """Make sure IDs up to highest, which were stored without being allocated, are never allocated."""
+        with self.transaction():
+            self._seed(scope, seed_query, seed_params)
+            self.conn.execute("UPDATE sequences SET value = MAX(value, ?) WHERE scope = ?", (highest, scope))
+
+    # User operations
+    def get_user(self, username: str) -> Optional[Dict[str, Any]]:
+        """Get user data by username."""
+        rows = self._fetch("SELECT data FROM users WHERE username = ?", (username,))
+        return json.loads(rows[0][0]) if rows else None
+
+    def get_user_id(self, username: str) -> Optional[int]:
+        """Get the ID of a user, or None if there is no such user."""
+        rows = self._fetch("SELECT userid FROM users WHERE username = ?", (username,))
+        return rows[0][0] if rows else None
+
+    def get_username(self, user_id: Union[int, str]) -> Optional[str]:
+        """Get the name of the user with an ID, or None if no user has it."""
+        rows = self._fetch("SELECT username FROM users WHERE userid = ? ORDER BY rowid LIMIT 1", (int(user_id),))
+        return rows[0][0] if rows else None
+
+    def get_all_users(self) -> Dict[str, Any]:
+        """Get all users data."""
+        rows = self._fetch("SELECT username, data FROM users ORDER BY rowid")
+        return {username: json.loads(data) for username, data in rows}
+
+    def save_user(self, username: str, user_data: Dict[str, Any]) -> bool:
+        """Save or update user data."""
+        self._validate("users", [user_data])
+        return self._execute_write(
+            "INSERT INTO users (username, userid, data) VALUES (?, ?, ?) "
+            "ON CONFLICT (username) DO UPDATE SET userid = excluded.userid, data = excluded.data",
+            (username, user_data.get("userid"), json.dumps(user_data))
+        ) > 0
+
+    def save_users(self, users: Dict[str, Dict[str, Any]]) -> bool:
+        """Save or update many users in one commit; users without a userid get new IDs."""
+        self._assign_user_ids(users)
+        self._validate("users", list(users.values()))
+        return self._execute_write_many(
+            "INSERT INTO users (username, userid, data) VALUES (?, ?, ?) "
+            "ON CONFLICT (username) DO UPDATE SET userid = excluded.userid, data = excluded.data",
+            [(username, user_data.get("userid"), json.dumps(user_data)) for username, user_data in users.items()]
+        ) >= 0
+
+    # Task operations
+    def get_user_tasks(self, user_id: str) -> list:
+        """Get all ongoing tasks for a user."""
+        rows = self._fetch("SELECT data FROM ongoing_tasks WHERE user_id = ? ORDER BY rowid", (str(user_id),))
+        return [json.loads(data) for (data,) in rows]
+
+    def get_user_tasks_by(self, user_id: str, field: str, start: Any = None, end: Any = None) -> list:
+        """Get a user's ongoing tasks in the order of an indexed field, optionally within inclusive bounds."""
+        if field not in INDEXED_FIELDS:
+            raise ValueError(f"Field is not indexed: {field}")
+        expression = _sort_expression(field)
+        query = "SELECT data FROM ongoing_tasks WHERE user_id = ?"
+        params = [str(user_id)]
+        if start is not None:
+            query += f" AND {expression} >= ?"
+            params.append(sort_key(field, start))
+        if end is not None:
+            query += f" AND {expression} <= ?"
+            params.append(sort_key(field, end))
+        rows = self._fetch(query + f" ORDER BY {expression}, task_id", params)
+        return [json.loads(data) for (data,) in rows]
+
+    def query(self, user_id: str, where: Optional[Dict[str, Any]] = None, order_by: Optional[str] = None,
+              limit: Optional[int] = None, offset: int = 0, fields: Optional[List[str]] = None,
+              completed: bool = False) -> list:
+        """Select a page of a user's tasks; see DatabaseManager.query.
+
+        Conditions, ordering, paging and projection are all executed by SQLite,
+        using the expression indexes on ongoing tasks.
+        """
+        query = Query(where, order_by, limit, offset, fields)
+        table, id_column = ("completed_tasks", "completed_id") if completed else ("ongoing_tasks", "task_id")
+
+        clauses, params = ["user_id = ?"], [str(user_id)]
+        for field, op, value in query.conditions:
+            expression = _field_expression(field)
+            if op == "in":
+                values = list(value)
+                if not values:
+                    return []
+                clauses.append(f"{expression} IN ({', '.join('?' * len(values))})")
+                params.extend(_field_param(field, v) for v in values)
+            else:
+                clauses.append(f"{expression} {SQL_OPERATORS[op]} ?")
+                params.append(_field_param(field, value))
+
+        if query.order_by:
+            direction = "DESC" if query.descending else "ASC"
+            order = f"{_field_expression(query.order_by)} {direction}, {id_column} {direction}"
+        else:
+            order = "rowid"
+
+        if query.fields:
+            columns = ", ".join(f"'{field}', json_extract(data, '$.{field}')" for field in query.fields)
+            selection = f"json_object({columns})"
+        else:
+            selection = "data"
+
+        sql = f"SELECT {selection} FROM {table} WHERE {' AND '.join(clauses)} ORDER BY {order}"
+        if query.limit is not None or query.offset:
+            sql += " LIMIT ? OFFSET ?"
+            params.extend([-1 if query.limit is None else query.limit, query.offset])
+        return [json.loads(data) for (data,) in self._fetch(sql, params)]
+
+    def save_user_task(self, user_id: str, task_data: Dict[str, Any]) -> bool:
+        """Save a new task for a user."""
+        self._assign_task_ids(user_id, [task_data])
+        self._validate("tasks", [task_data])
+        return self._execute_write(
+            "INSERT INTO ongoing_tasks (user_id, task_id, data) VALUES (?, ?, ?)",
+            (str(user_id), task_data['task_id'], json.dumps(task_data))
+        ) > 0
+
+    def save_user_tasks(self, user_id: str, tasks: list) -> bool:
+        """Save many tasks of a user in one commit; tasks without a task_id get new IDs."""
+        self._assign_task_ids(user_id, tasks)
+        self._validate("tasks", tasks)
+        return self._execute_write_many(
+            "INSERT OR REPLACE INTO ongoing_tasks (user_id, task_id, data) VALUES (?, ?, ?)",
+            [(str(user_id), task["task_id"], json.dumps(task)) for task in tasks]
+        ) >= 0
+
+    def update_user_task(self, user_id: str, task_id: int, task_data: Dict[str, Any]) -> bool:
+        """Update an existing task."""
+        task_data['task_id'] = task_id
+        self._validate("tasks", [task_data])
+        return self._execute_write(
+            "UPDATE ongoing_tasks SET data = ? WHERE user_id = ? AND task_id = ?",
+            (json.dumps(task_data), str(user_id), task_id)
+        ) > 0
+
+    def delete_user_task(self, user_id: str, task_id: int) -> bool:
+        """Delete a task."""
+        return self._execute_write(
+            "DELETE FROM ongoing_tasks WHERE user_id = ? AND task_id = ?", (str(user_id), task_id)
+        ) > 0
+
+    def add_completed_task(self, user_id: str, task_data: Dict[str, Any]) -> bool:
+        """Add a task to completed tasks."""
+        self._assign_task_ids(user_id, [task_data], is_completed=True)
+        self._validate("completed", [task_data])
+        return self._execute_write(
+            "INSERT INTO completed_tasks (user_id, completed_id, data) VALUES (?, ?, ?)",
+            (str(user_id), task_data['completed_id'], json.dumps(task_data))
+        ) > 0
+
+    def add_completed_tasks(self, user_id: str, tasks: list) -> bool:
+        """Add many completed tasks of a user in one commit; tasks without a completed_id get new IDs."""
+        self._assign_task_ids(user_id, tasks, is_completed=True)
+        self._validate("completed", tasks)
+        return self._execute_write_many(
+            "INSERT OR REPLACE INTO completed_tasks (user_id, completed_id, data) VALUES (?, ?, ?)",
+            [(str(user_id), task["completed_id"], json.dumps(task)) for task in tasks]
+        ) >= 0
+
+    def get_completed_tasks(self, user_id: str, since: Union[str, datetime, None] = None) -> list:
+        """Get all completed tasks for a user, optionally only those completed since a time."""
+        return list(self.iter_completed_tasks(user_id, since))
+
+    def iter_completed_tasks(self, user_id: str,
+                             since: Union[str, datetime, None] = None) -> Iterator[Dict[str, Any]]:
+        """Iterate over a user's completed tasks; the rows are read at once, while the lock is held."""
+        if since is None:
+            rows = self._fetch("SELECT data FROM completed_tasks WHERE user_id = ? ORDER BY rowid", (str(user_id),))
+        else:
+            rows = self._fetch(
+                "SELECT data FROM completed_tasks WHERE user_id = ? AND COALESCE("
+                "json_extract(data, '$.completed_at'), json_extract(data, '$.created_at'), '') >= ? "
+                "ORDER BY rowid",
+                (str(user_id), timestamp(since))
+            )
+        return (json.loads(data) for (data,) in rows)
+
+    def fsck(self, processes: Optional[int] = None) -> List[str]:
+        """Validate every stored user and task against its schema; see DatabaseManager.fsck."""
+        documents = {"users": self.get_all_users(), "tasks": {}, "completed": {}}
+        for kind, table, id_column in (("tasks", "ongoing_tasks", "task_id"),
+                                       ("completed", "completed_tasks", "completed_id")):
+            rows = self._fetch(f"SELECT user_id, data FROM {table} ORDER BY user_id, {id_column}")
+            for user_id, data in rows:
+                documents[kind].setdefault(user_id, []).append(json.loads(data))
+        return check_documents(documents, processes)
+
+    # Migration
+    def import_from_json(self, json_db) -> Dict[str, int]:
+        """Import every user, ongoing task and completed task from a JSON DatabaseManager.
+
+        Tasks whose ID is already used by another task of the same user (possible
+        with the old length-based ID generation) are given the next free ID.
+
+        Returns:
+            The number of imported rows per table
+        """
+        users = json_db.get_all_users()
+        ongoing = json_db._load_all_tasks(json_db.ongoing_tasks_file)
+        completed = json_db._load_all_completed_tasks()
+
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO users (username, userid, data) VALUES (?, ?, ?)",
+                ((name, data.get("userid"), json.dumps(data)) for name, data in users.items())
+            )
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO ongoing_tasks (user_id, task_id, data) VALUES (?, ?, ?)",
+                self._import_rows(ongoing, "task_id")
+            )
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO completed_tasks (user_id, completed_id, data) VALUES (?, ?, ?)",
+                self._import_rows(completed, "completed_id")
+            )
+
+        return {
+            "users": len(users),
+            "ongoing_tasks": sum(len(tasks) for tasks in ongoing.values()),
+            "completed_tasks": sum(len(tasks) for tasks in completed.values())
+        }
+
+    @staticmethod
+    def _import_rows(document: Dict[str, list], id_field: str):
+        """Yield (user_id, id, data) rows for a JSON task document, renumbering duplicate IDs."""
+        for user_id, tasks in document.items():
+            next_id = max((task.get(id_field) or 0 for task in tasks), default=0) + 1
+            seen = set()
+            for task in tasks:
+                task = dict(task)
+                if not task.get(id_field) or task[id_field] in seen:
+                    task[id_field] = next_id
+                    next_id += 1
+                seen.add(task[id_field])
+                yield str(user_id), task[id_field], json.dumps(task)
+
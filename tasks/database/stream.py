@@ -0,0 +1,243 @@
+"""Incremental reading of JSON data files through a side offset index.
+
+When a JSON document is written, the byte range of every top-level value is
+recorded in an index file next to it (`<file>.idx`), together with the data
+file's signature. A reader holding a valid index can seek straight to one
+user's value and decode only that, or stream its items one at a time.
+
+Whole documents can also be read and written one top-level entry at a time
+(`iter_entries`, `EntryWriter`), which keeps memory bounded by the largest
+entry, e.g. when a data file is migrated to a new format version.
+"""
+
+import codecs
+import itertools
+import json
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+CHUNK_SIZE = 64 * 1024
+
+_decoder = json.JSONDecoder()
+
+
+def _layout(storage_format: str) -> Tuple[str, str, str, str, Optional[str]]:
+    """Get the opening, entry separator, closing, key separator and indent of a JSON format."""
+    if storage_format == "pretty":
+        return "{\n    ", ",\n    ", "\n}", ": ", "    "
+    return "{", ",", "}", ":", None
+
+
+def _encode_entry(key: str, value: Any, key_separator: str, indent: Optional[str]) -> Tuple[str, str]:
+    """Encode one top-level entry as its key prefix and value text."""
+    prefix = json.dumps(key) + key_separator
+    if indent:
+        text = json.dumps(value, indent=4).replace("\n", "\n" + indent)
+    else:
+        text = json.dumps(value, separators=(',', ':'))
+    return prefix, text
+
+
+def dumps_with_offsets(data: Dict[str, Any], storage_format: str,
+                       header: Optional[Tuple[str, Any]] = None) -> Tuple[bytes, Dict[str, List[int]]]:
+    """Serialize a document as JSON and record the byte range of each top-level value.
+
+    The output is identical to formats.dumps for the "pretty" and "compact" formats.
+
+    Args:
+        data: The document
+        storage_format: "pretty" or "compact"
+        header: A (key, value) entry written before those of data, without copying the document
+    """
+    entries = itertools.chain([header] if header else [], data.items())
+    if not data and not header:
+        return b"{}", {}
+
+    opening, separator, closing, key_separator, indent = _layout(storage_format)
+    parts = [opening]
+    offsets = {}
+    position = len(opening)
+    for i, (key, value) in enumerate(entries):
+        if i:
+            parts.append(separator)
+            position += len(separator)
+        prefix, text = _encode_entry(key, value, key_separator, indent)
+        parts.append(prefix)
+        parts.append(text)
+        position += len(prefix)
+        # ensure_ascii output, so character counts equal byte counts
+        offsets[key] = [position, position + len(text)]
+        position += len(text)
+    parts.append(closing)
+    return "".join(parts).encode(), offsets
+
+
+class EntryWriter:
+    """Write a JSON document to a file one top-level entry at a time.
+
+    The output is identical to dumps_with_offsets, but only one value is held
+    in memory at a time.
+    """
+
+    def __init__(self, f: BinaryIO, storage_format: str, position: int = 0):
+        """Initialize the writer.
+
+        Args:
+            f: Binary file positioned where the document starts, or where an interrupted writer stopped
+            storage_format: "pretty" or "compact"
+            position: Bytes an interrupted writer already wrote, to continue after its last entry
+        """
+        self.f = f
+        self.opening, self.separator, self.closing, self.key_separator, self.indent = _layout(storage_format)
+        self.position = position
+
+    def write(self, key: str, value: Any) -> List[int]:
+        """Append an entry and return the byte range of its value."""
+        prefix, text = _encode_entry(key, value, self.key_separator, self.indent)
+        lead = self.separator if self.position else self.opening
+        # ensure_ascii output, so character counts equal byte counts
+        self.f.write((lead + prefix + text).encode())
+        start = self.position + len(lead) + len(prefix)
+        self.position = start + len(text)
+        return [start, self.position]
+
+    def close(self):
+        """Write the end of the document."""
+        self.f.write((self.closing if self.position else "{}").encode())
+
+
+def iter_entries(f: BinaryIO, start: int = 0, chunk_size: int = CHUNK_SIZE) -> Iterator[Tuple[str, Any, int]]:
+    """Yield the (key, value, end) of each top-level entry of a JSON document in an open file, reading it in chunks.
+
+    end is the byte offset just past the entry's value; passing it as start
+    continues with the next entry. Only one value is held in memory at a time.
+
+    Raises:
+        ValueError: If the file is not a JSON object
+    """
+    f.seek(start)
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    position = 0
+    offset = start  # byte offset of buffer[position]
+    eof = False
+
+    while True:
+        # Skip whitespace, the opening brace and separators
+        while position < len(buffer) and buffer[position] in " \t\r\n,{":
+            position += 1
+            offset += 1
+        if position < len(buffer) and buffer[position] == "}":
+            return
+        entry = _decode_entry(buffer, position, eof) if position < len(buffer) else None
+        if entry is not None:
+            key, value, end = entry
+            offset += len(buffer[position:end].encode())
+            position = end
+            yield key, value, offset
+            continue
+        if eof:
+            raise json.JSONDecodeError("Unterminated object", buffer, position)
+        chunk = f.read(chunk_size)
+        eof = not chunk
+        buffer = buffer[position:] + decoder.decode(chunk, final=eof)
+        position = 0
+
+
+def _decode_entry(buffer: str, position: int, eof: bool) -> Optional[Tuple[str, Any, int]]:
+    """Decode the `"key": value` entry at a position, or return None if the buffer ends before it does."""
+    try:
+        key, end = _decoder.raw_decode(buffer, position)
+        if not isinstance(key, str):
+            raise json.JSONDecodeError("Expecting property name", buffer, position)
+        while end < len(buffer) and buffer[end] in " \t\r\n":
+            end += 1
+        if end < len(buffer) and buffer[end] != ":":
+            raise json.JSONDecodeError("Expecting ':' delimiter", buffer, end)
+        end += 1
+        while end < len(buffer) and buffer[end] in " \t\r\n":
+            end += 1
+        value, end = _decoder.raw_decode(buffer, end)
+    except json.JSONDecodeError:
+        if eof:
+            raise
+        return None
+    # A value ending exactly at the buffer end may be a truncated number
+    if end == len(buffer) and not eof:
+        return None
+    return key, value, end
+
+
+def index_path(file_path: Path) -> Path:
+    """Get the offset index file belonging to a data file."""
+    return file_path.with_name(file_path.name + ".idx")
+
+
+def write_index(file_path: Path, signature, offsets: Dict[str, List[int]]):
+    """Write the offset index of a data file that was just written."""
+    with open(index_path(file_path), 'w') as f:
+        json.dump({"signature": list(signature), "offsets": offsets}, f, separators=(',', ':'))
+
+
+def read_index(file_path: Path) -> Optional[dict]:
+    """Read the offset index of a data file, or None if it is missing or unreadable."""
+    try:
+        with open(index_path(file_path), 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def read_value(file_path: Path, span: List[int]) -> Any:
+    """Decode the single top-level value stored at a byte range."""
+    start, end = span
+    with open(file_path, 'rb') as f:
+        f.seek(start)
+        return json.loads(f.read(end - start))
+
+
+def loads_by_offsets(raw: bytes, offsets: Dict[str, List[int]]) -> Dict[str, Any]:
+    """Decode a whole document one top-level value at a time.
+
+    The result equals parsing it at once, but a thread decoding a large file
+    lets other threads, such as an event loop, run between values.
+    """
+    return {key: json.loads(raw[start:end]) for key, (start, end) in offsets.items()}
+
+
+def iter_items(f: BinaryIO, span: List[int], chunk_size: int = CHUNK_SIZE) -> Iterator[Any]:
+    """Yield the items of the array stored at a byte range of an open file, reading it in chunks."""
+    start, end = span
+    f.seek(start)
+    remaining = end - start
+    buffer = ""
+    position = 0
+    opened = False
+
+    while True:
+        # Skip whitespace, the opening bracket and separators
+        while position < len(buffer) and buffer[position] in " \t\r\n,[":
+            if buffer[position] == "[":
+                if opened:
+                    break
+                opened = True
+            position += 1
+        if opened and position < len(buffer) and buffer[position] == "]":
+            return
+        if position < len(buffer):
+            try:
+                item, item_end = _decoder.raw_decode(buffer, position)
+                # A value ending exactly at the buffer end may be a truncated number
+                if item_end < len(buffer) or not remaining:
+                    position = item_end
+                    yield item
+                    continue
+            except json.JSONDecodeError:
+                if not remaining:
+                    raise
+        elif not remaining:
+            return
+        chunk = f.read(min(chunk_size, remaining))
+        remaining -= len(chunk)
+        buffer = buffer[position:] + chunk.decode()
+        position = 0
@@ -0,0 +1,206 @@
+"""Schema validation of database records.
+
+The record schemas are compiled once, at import, into plain Python checks,
+which are much faster than interpreting the schema for every record. Writes
+validate only the records they touch, so a write costs the same however large
+its file is. `check_documents` validates whole documents in parallel across
+users for `python -m tasks fsck`.
+"""
+
+import re
+from multiprocessing import Pool
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from .schemas import USER_SCHEMA, TASK_SCHEMA, COMPLETED_TASK_SCHEMA
+
+try:
+    import jsonschema
+except ImportError:
+    jsonschema = None
+
+ID_FIELDS = {"tasks": "task_id", "completed": "completed_id"}
+USER_ID_PATTERN = re.compile(r"^[0-9]+$")
+FSCK_BATCH_SIZE = 500  # users per process pool job
+
+TYPES = {
+    "object": lambda value: isinstance(value, dict),
+    "array": lambda value: isinstance(value, list),
+    "string": lambda value: isinstance(value, str),
+    "integer": lambda value: isinstance(value, int) and not isinstance(value, bool)
+}
+
+Check = Callable[[Any], Optional[str]]
+
+
+class RecordValidationError(ValueError):
+    """Raised when a record written to the database does not match its schema."""
+
+
+def _at(path: str, message: str) -> str:
+    """Prefix an error message with the location of the invalid value."""
+    return f"{path}: {message}" if path else message
+
+
+def compile_schema(schema: Dict[str, Any], path: str = "") -> Check:
+    """Compile a schema into a function returning the first error of a value, or None.
+
+    Handles the keywords the record schemas use; other schemas are checked
+    with jsonschema.
+
+    Raises:
+        ValueError: If the schema uses other keywords and jsonschema is not installed
+    """
+    supported = {"type", "enum", "pattern", "minLength", "maxLength", "minimum",
+                 "required", "properties", "additionalProperties"}
+    if not set(schema) <= supported or schema.get("type", "object") not in TYPES:
+        if jsonschema is None:
+            raise ValueError(f"Cannot compile schema keywords: {sorted(set(schema) - supported)}")
+        validator = jsonschema.validators.validator_for(schema)(schema)
+
+        def check_with_jsonschema(value):
+            error = next(validator.iter_errors(value), None)
+            return None if error is None else _at(path, error.message)
+        return check_with_jsonschema
+
+    checks: List[Check] = []
+    if "type" in schema:
+        is_type, expected = TYPES[schema["type"]], schema["type"]
+        checks.append(lambda value: None if is_type(value) else _at(path, f"{value!r} is not of type {expected}"))
+    if "enum" in schema:
+        allowed = set(schema["enum"])
+        checks.append(lambda value: None if value in allowed else _at(path, f"{value!r} is not an allowed value"))
+    if "pattern" in schema:
+        pattern = re.compile(schema["pattern"])
+        checks.append(lambda value: None if not isinstance(value, str) or pattern.search(value)
+                      else _at(path, f"{value!r} does not match {pattern.pattern!r}"))
+    if "minLength" in schema:
+        low = schema["minLength"]
+        checks.append(lambda value: None if not isinstance(value, str) or len(value) >= low
+                      else _at(path, f"{value!r} is shorter than {low} characters"))
+    if "maxLength" in schema:
+        high = schema["maxLength"]
+        checks.append(lambda value: None if not isinstance(value, str) or len(value) <= high
+                      else _at(path, f"{value!r} is longer than {high} characters"))
+    if "minimum" in schema:
+        minimum = schema["minimum"]
+        checks.append(lambda value: None if not isinstance(value, (int, float)) or value >= minimum
+                      else _at(path, f"{value!r} is less than the minimum of {minimum}"))
+    if "required" in schema:
+        required = frozenset(schema["required"])
+
+        def check_required(value):
+            missing = required - value.keys() if isinstance(value, dict) else None
+            return _at(path, f"missing {', '.join(sorted(missing))}") if missing else None
+        checks.append(check_required)
+    if "properties" in schema or "additionalProperties" in schema:
+        properties = {
+            name: compile_schema(subschema, f"{path}.{name}" if path else name)
+            for name, subschema in schema.get("properties", {}).items()
+        }
+        additional = schema.get("additionalProperties", True)
+        if isinstance(additional, dict):
+            additional = compile_schema(additional, f"{path}.*" if path else "*")
+
+        def check_properties(value):
+            if not isinstance(value, dict):
+                return None
+            for name, item in value.items():
+                check = properties.get(name, additional)
+                if check is False:
+                    return _at(path, f"unexpected field {name!r}")
+                if check is not True:
+                    error = check(item)
+                    if error:
+                        return error
+            return None
+        checks.append(check_properties)
+
+    def check(value):
+        for check_one in checks:
+            error = check_one(value)
+            if error:
+                return error
+        return None
+    return check
+
+
+# Compiled once; the schemas themselves are checked too when jsonschema is available
+if jsonschema is not None:
+    for _schema in (USER_SCHEMA, TASK_SCHEMA, COMPLETED_TASK_SCHEMA):
+        jsonschema.validators.validator_for(_schema).check_schema(_schema)
+
+VALIDATORS: Dict[str, Check] = {
+    "users": compile_schema(USER_SCHEMA),
+    "tasks": compile_schema(TASK_SCHEMA),
+    "completed": compile_schema(COMPLETED_TASK_SCHEMA)
+}
+
+
+def validate_record(kind: str, record: Any):
+    """Check one user ("users") or task ("tasks", "completed") against its schema.
+
+    Raises:
+        RecordValidationError: If the record does not match
+    """
+    error = VALIDATORS[kind](record)
+    if error:
+        raise RecordValidationError(f"Invalid {kind} record: {error}")
+
+
+def check_entries(kind: str, entries: List[Tuple[str, Any]]) -> List[str]:
+    """Validate document entries (a username and user, or a user ID and task list).
+
+    Returns:
+        A description of every problem found
+    """
+    check = VALIDATORS[kind]
+    problems = []
+    for key, value in entries:
+        if kind == "users":
+            error = check(value)
+            if error:
+                problems.append(f"{kind} {key!r}: {error}")
+            continue
+
+        if not USER_ID_PATTERN.match(key):
+            problems.append(f"{kind}: invalid user ID {key!r}")
+        if not isinstance(value, list):
+            problems.append(f"{kind} {key}: tasks are not a list")
+            continue
+        id_field, seen = ID_FIELDS[kind], set()
+        for position, task in enumerate(value):
+            task_id = task.get(id_field) if isinstance(task, dict) else None
+            error = check(task)
+            if error:
+                problems.append(f"{kind} {key}[{position}] ({id_field} {task_id}): {error}")
+            elif task_id in seen:
+                problems.append(f"{kind} {key}[{position}]: duplicate {id_field} {task_id}")
+            seen.add(task_id)
+    return problems
+
+
+def _batches(documents: Dict[str, Dict[str, Any]]) -> Iterable[Tuple[str, List[Tuple[str, Any]]]]:
+    """Split documents into jobs of up to FSCK_BATCH_SIZE entries."""
+    for kind, document in documents.items():
+        entries = list(document.items())
+        for start in range(0, len(entries), FSCK_BATCH_SIZE):
+            yield kind, entries[start:start + FSCK_BATCH_SIZE]
+
+
+def check_documents(documents: Dict[str, Dict[str, Any]], processes: Optional[int] = None) -> List[str]:
+    """Validate whole documents, in parallel across users.
+
+    Args:
+        documents: Documents by kind ("users", "tasks" or "completed")
+        processes: Worker processes; None uses one per CPU, 1 checks in this process
+
+    Returns:
+        A description of every problem found
+    """
+    batches = list(_batches(documents))
+    if processes == 1 or len(batches) <= 1:
+        results = [check_entries(kind, entries) for kind, entries in batches]
+    else:
+        with Pool(processes) as pool:
+            results = pool.starmap(check_entries, batches)
+    return [problem for problems in results for problem in problems]
@@ -16,6 +16,8 @@ LANGUAGES = {
         "INVALID_ACTION": "Invalid action. Type 'help' to see available commands.",
         "AUTH_SUCCESS": "Welcome, {}! You can now manage your tasks.",
         "AUTH_FAILED": "Authentication failed. Please try again later.",
+        "SESSION_RESUMED": "Welcome back, {}! Type 'logout' to end your session.",
+        "LOGGED_OUT": "You have been logged out. You will be asked to log in next time.",
         "ERROR_AUTH": "An error occurred during authentication: {}",
         "ERROR_GENERAL": "An error occurred: {}",
         "ERROR_TRY_AGAIN": "Please try again or type 'exit' to quit.",
@@ -30,6 +32,8 @@ LANGUAGES = {
         "AUTH_INVALID_CHOICE": "Invalid input. Please enter 'r' to register or 'l' to login.",
         "LOGIN_SUCCESS": "Login successful. Welcome, {}!",
         "LOGIN_FAILED": "Login failed. Please check your credentials.",
+        "USER_NOT_FOUND": "User '{}' not found.",
+        "LOGIN_THROTTLED": "Too many login attempts. Please try again in {} second(s).",
         "REGISTER_SUCCESS": "Registration successful. Welcome, {}!",
         "USERNAME_TAKEN": "Username '{}' is already taken.",
         "INVALID_INPUT": "Invalid input: {}",
@@ -78,6 +82,7 @@ LANGUAGES = {
         "SORT_STATUS": "Status",
         "SORT_CREATION_DATE": "Creation Date",
         "ENTER_SORT_OPTION": "Enter sort option (1-5): ",
+        "SHOW_MORE_TASKS": "Press Enter to show more tasks, or type q to stop: ",
 
         # Task UI Messages
         "AVAILABLE_TASKS": "Your Available Tasks",
@@ -117,6 +122,8 @@ LANGUAGES = {
         "INVALID_ACTION": "Acción inválida. Escribe 'help' para ver los comandos disponibles.",
         "AUTH_SUCCESS": "¡Bienvenido, {}! Ahora puedes gestionar tus tareas.",
         "AUTH_FAILED": "Autenticación fallida. Por favor, intenta de nuevo.",
+        "SESSION_RESUMED": "¡Bienvenido de nuevo, {}! Escribe 'logout' para cerrar tu sesión.",
+        "LOGGED_OUT": "Has cerrado la sesión. Se te pedirá iniciar sesión la próxima vez.",
         "ERROR_AUTH": "Ocurrió un error durante la autenticación: {}",
         "ERROR_GENERAL": "Ocurrió un error: {}",
         "ERROR_TRY_AGAIN": "Por favor, intenta de nuevo o escribe 'exit' para salir.",
@@ -131,6 +138,8 @@ LANGUAGES = {
         "AUTH_INVALID_CHOICE": "Entrada inválida. Por favor, ingrese 'r' para registrarse o 'l' para iniciar sesión.",
         "LOGIN_SUCCESS": "Login successful. Welcome, {}!",
         "LOGIN_FAILED": "Login failed. Please check your credentials.",
+        "USER_NOT_FOUND": "Usuario '{}' no encontrado.",
+        "LOGIN_THROTTLED": "Demasiados intentos de inicio de sesión. Inténtalo de nuevo en {} segundo(s).",
         "REGISTER_SUCCESS": "Registration successful. Welcome, {}!",
         "USERNAME_TAKEN": "El nombre de usuario '{}' ya está en uso.",
         "INVALID_INPUT": "Entrada inválida: {}",
@@ -179,6 +188,7 @@ LANGUAGES = {
         "SORT_STATUS": "Estado",
         "SORT_CREATION_DATE": "Fecha de Creación",
         "ENTER_SORT_OPTION": "Ingrese opción de ordenamiento (1-5): ",
+        "SHOW_MORE_TASKS": "Presione Enter para ver más tareas, o escriba q para terminar: ",
 
         # Task UI Messages
         "AVAILABLE_TASKS": "Tus Tareas Disponibles",
@@ -218,6 +228,8 @@ LANGUAGES = {
         "INVALID_ACTION": "Ugyldig handling. Skriv 'help' for å se kommandoer.",
         "AUTH_SUCCESS": "Velkommen, {}! Du kan nå administrere oppgavene dine.",
         "AUTH_FAILED": "Autentisering mislyktes. Prøv igjen senere.",
+        "SESSION_RESUMED": "Velkommen tilbake, {}! Skriv 'logout' for å avslutte økten.",
+        "LOGGED_OUT": "Du er logget ut. Du blir bedt om å logge inn neste gang.",
         "ERROR_AUTH": "Det oppstod en feil under autentisering: {}",
         "ERROR_GENERAL": "Det oppstod en feil: {}",
         "ERROR_TRY_AGAIN": "Prøv igjen eller skriv 'exit' for å avslutte.",
@@ -232,6 +244,8 @@ LANGUAGES = {
         "AUTH_INVALID_CHOICE": "Ugyldig inndata. Skriv 'r' for å registrere eller 'l' for å logge inn.",
         "LOGIN_SUCCESS": "Login successful. Welcome, {}!",
         "LOGIN_FAILED": "Login failed. Please check your credentials.",
+        "USER_NOT_FOUND": "Brukeren '{}' ble ikke funnet.",
+        "LOGIN_THROTTLED": "For mange innloggingsforsøk. Prøv igjen om {} sekund(er).",
         "REGISTER_SUCCESS": "Registration successful. Welcome, {}!",
         "USERNAME_TAKEN": "Brukernavnet '{}' er allerede i bruk.",
         "INVALID_INPUT": "Ugyldig inndata: {}",
@@ -280,6 +294,7 @@ LANGUAGES = {
         "SORT_STATUS": "Status",
         "SORT_CREATION_DATE": "Opprettelsesdato",
         "ENTER_SORT_OPTION": "Angi sorteringsalternativ (1-5): ",
+        "SHOW_MORE_TASKS": "Trykk Enter for å vise flere oppgaver, eller skriv q for å stoppe: ",
 
         # Task UI Messages
         "AVAILABLE_TASKS": "Dine Tilgjengelige Oppgaver",
@@ -319,6 +334,8 @@ LANGUAGES = {
         "INVALID_ACTION": "无效操作。输入'help'查看命令。",
         "AUTH_SUCCESS": "欢迎，{}！您现在可以管理任务了。",
         "AUTH_FAILED": "认证失败。请稍后重试。",
+        "SESSION_RESUMED": "欢迎回来，{}！输入 'logout' 结束会话。",
+        "LOGGED_OUT": "您已退出登录。下次需要重新登录。",
         "ERROR_AUTH": "认证过程中出错：{}",
         "ERROR_GENERAL": "发生错误：{}",
         "ERROR_TRY_AGAIN": "请重试或输入'exit'退出。",
@@ -333,6 +350,8 @@ LANGUAGES = {
         "AUTH_INVALID_CHOICE": "输入无效。请输入'r'注册或'l'登录。",
         "LOGIN_SUCCESS": "Login successful. Welcome, {}!",
         "LOGIN_FAILED": "Login failed. Please check your credentials.",
+        "USER_NOT_FOUND": "未找到用户 '{}'。",
+        "LOGIN_THROTTLED": "登录尝试次数过多。请在 {} 秒后重试。",
         "REGISTER_SUCCESS": "Registration successful. Welcome, {}!",
         "USERNAME_TAKEN": "用户名'{}'已被使用。",
         "INVALID_INPUT": "无效输入：{}",
@@ -381,6 +400,7 @@ LANGUAGES = {
         "SORT_STATUS": "状态",
         "SORT_CREATION_DATE": "创建日期",
         "ENTER_SORT_OPTION": "输入排序选项（1-5）：",
+        "SHOW_MORE_TASKS": "按回车键显示更多任务，或输入 q 停止：",
 
         # Task UI Messages
         "AVAILABLE_TASKS": "您的可用任务",
@@ -420,6 +440,8 @@ LANGUAGES = {
         "INVALID_ACTION": "Acțiune invalidă. Scrie 'help' pentru a vedea comenzile.",
         "AUTH_SUCCESS": "Bun venit, {}! Acum poți gestiona sarcinile.",
         "AUTH_FAILED": "Autentificare eșuată. Te rog încearcă din nou mai târziu.",
+        "SESSION_RESUMED": "Bine ai revenit, {}! Tastează 'logout' pentru a încheia sesiunea.",
+        "LOGGED_OUT": "Ai fost deconectat. Va trebui să te autentifici data viitoare.",
         "ERROR_AUTH": "A apărut o eroare în timpul autentificării: {}",
         "ERROR_GENERAL": "A apărut o eroare: {}",
         "ERROR_TRY_AGAIN": "Te rog încearcă din nou sau scrie 'exit' pentru a ieși.",
@@ -434,6 +456,8 @@ LANGUAGES = {
         "AUTH_INVALID_CHOICE": "Intrare invalidă. Introduceți 'r' pentru înregistrare sau 'l' pentru conectare.",
         "LOGIN_SUCCESS": "Login successful. Welcome, {}!",
         "LOGIN_FAILED": "Login failed. Please check your credentials.",
+        "USER_NOT_FOUND": "Utilizatorul '{}' nu a fost găsit.",
+        "LOGIN_THROTTLED": "Prea multe încercări de autentificare. Încearcă din nou peste {} secundă(e).",
         "REGISTER_SUCCESS": "Registration successful. Welcome, {}!",
         "USERNAME_TAKEN": "Numele de utilizator '{}' este deja folosit.",
         "INVALID_INPUT": "Input invalid: {}",
@@ -482,6 +506,7 @@ LANGUAGES = {
         "SORT_STATUS": "Stare",
         "SORT_CREATION_DATE": "Data Creării",
         "ENTER_SORT_OPTION": "Introdu opțiunea de sortare (1-5): ",
+        "SHOW_MORE_TASKS": "Apasă Enter pentru mai multe sarcini sau tastează q pentru a opri: ",
 
         # Task UI Messages
         "AVAILABLE_TASKS": "Sarcinile Tale Disponibile",
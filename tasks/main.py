@@ -23,12 +23,18 @@ class TaskManager:
         'edit': ('Edit a task', lambda task: task.edit_task()),
         'delete': ('Delete a task', lambda task: task.delete_task()),
         'help': ('Show this help message', lambda _: None),
+        'logout': ('Log out and exit', lambda _: None),
         'exit': ('Exit the program', lambda _: None)
     }
 
-    def __init__(self):
-        """Initialize the task manager."""
-        self.auth = Auth()
+    def __init__(self, db=None):
+        """Initialize the task manager.
+
+        Args:
+            db: Database manager shared by every action; defaults to the process-wide one
+        """
+        self.db = db
+        self.auth = Auth(db)
         self.task = None
         self.username = None
 
@@ -81,10 +87,16 @@ ro) Română
         """Handle user authentication."""
         try:
             print_with_clear()
+            username = self.auth.resume_session()
+            if username:
+                self.username = username
+                self.task = Task(username, self.db)
+                print_with_clear(language_manager.get_text("SESSION_RESUMED").format(username))
+                return True
             is_authenticated, username = self.auth.welcome()
             if is_authenticated:
                 self.username = username
-                self.task = Task(username)
+                self.task = Task(username, self.db)
                 print_with_clear(language_manager.get_text("AUTH_SUCCESS").format(username))
                 return True
             print(language_manager.get_text("AUTH_FAILED"))
@@ -103,6 +115,10 @@ ro) Română
                 if action == 'exit':
                     print_with_clear(language_manager.get_text("GOODBYE_MESSAGE"))
                     break
+                elif action == 'logout':
+                    self.auth.logout()
+                    print_with_clear(language_manager.get_text("LOGGED_OUT"))
+                    break
                 elif action == 'help':
                     self._show_help()
                 else:
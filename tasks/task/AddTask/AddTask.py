@@ -20,7 +20,9 @@ class AddTask(BaseTask):
             new_task = self._create_task(task_name, task_description, priority, category)
             
             # Save the task
-            if self.db.save_user_task(self.user_id, new_task):
+            with self.db.transaction():
+                saved = self.db.save_user_task(self.user_id, new_task)
+            if saved:
                 print_with_clear(language_manager.get_text("TASK_ADDED"))
             else:
                 self._handle_error(None, "ERROR_SAVING")
@@ -16,20 +16,21 @@ class DeleteTask(BaseTask):
                 return
 
             self._display_user_tasks(user_tasks, detailed=False)
-            task_id = self._get_task_id(len(user_tasks))
+            task_id = self._get_task_id(max(task["task_id"] for task in user_tasks))
             task_to_delete = self._find_task_by_id(user_tasks, task_id)
 
             if task_to_delete:
-                # Move to completed tasks
-                completed_task = self._prepare_completed_task(task_to_delete)
-                if self.db.add_completed_task(self.user_id, completed_task):
-                    # Delete from ongoing tasks
-                    if self.db.delete_user_task(self.user_id, task_id):
-                        print_with_clear(language_manager.get_text("TASK_DELETED"))
-                    else:
-                        print_with_clear(language_manager.get_text("ERROR_SAVING"))
-                else:
+                # Move to completed tasks and delete from ongoing tasks in one commit
+                try:
+                    with self.db.transaction():
+                        completed_task = self._prepare_completed_task(task_to_delete)
+                        if not (self.db.add_completed_task(self.user_id, completed_task)
+                                and self.db.delete_user_task(self.user_id, task_id)):
+                            raise OSError("Failed to move task to completed tasks")
+                except OSError:
                     print_with_clear(language_manager.get_text("ERROR_SAVING"))
+                    return
+                print_with_clear(language_manager.get_text("TASK_DELETED"))
 
         except Exception as e:
             self._handle_error(e)
@@ -46,19 +47,18 @@ class DeleteTask(BaseTask):
                 print_with_clear(language_manager.get_text("INVALID_INPUT").format("Please enter a number"))
 
     def _prepare_completed_task(self, task):
-        """Prepare a task for moving to completed tasks."""
-        completed_tasks = self.db.get_completed_tasks(self.user_id)
-        completed_id = len(completed_tasks) + 1
-        
+        """Prepare a task for moving to completed tasks.
+
+        The completed ID is allocated by the database when the task is added.
+        """
         return {
-            "completed_id": completed_id,
             "name": task["name"],
             "description": task["description"],
             "created_at": task["created_at"],
             "due_date": task["due_date"],
             "completed_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
             "status": language_manager.get_text("STATUS_COMPLETED"),
-            "priority": task.get("priority"),
-            "category": task.get("category")
+            "priority": task["priority"],
+            "category": task["category"]
         }
 
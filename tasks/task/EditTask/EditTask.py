@@ -15,13 +15,15 @@ class EditTask(BaseTask):
                 return
 
             self._display_tasks(user_tasks)
-            task_id = self._prompt_task_id(len(user_tasks))
+            task_id = self._prompt_task_id(max(task["task_id"] for task in user_tasks))
             task_to_edit = self._find_task_by_id(user_tasks, task_id)
 
             if task_to_edit:
                 print_with_clear(language_manager.get_text("EDITING_TASK").format(task_id))
                 updated_task = self._edit_task_fields(task_to_edit)
-                if self.db.update_user_task(self.user_id, task_id, updated_task):
+                with self.db.transaction():
+                    updated = self.db.update_user_task(self.user_id, task_id, updated_task)
+                if updated:
                     print_with_clear(language_manager.get_text("TASK_UPDATED"))
                 else:
                     print_with_clear(language_manager.get_text("ERROR_SAVING"))
@@ -36,8 +38,8 @@ class EditTask(BaseTask):
         print_with_clear("\n" + language_manager.get_text("AVAILABLE_TASKS"))
         for task in user_tasks:
             print(f"[{task['task_id']}] {task['name']} - {task['description']}")
-            print(f"    {language_manager.get_text('PRIORITY')}: {task.get('priority', 'Not set')} | "
-                  f"{language_manager.get_text('CATEGORY')}: {task.get('category', 'Not set')} | "
+            print(f"    {language_manager.get_text('PRIORITY')}: {task['priority'] or 'Not set'} | "
+                  f"{language_manager.get_text('CATEGORY')}: {task['category'] or 'Not set'} | "
                   f"{language_manager.get_text('STATUS')}: {task['status']}")
 
     def _prompt_task_id(self, max_id):
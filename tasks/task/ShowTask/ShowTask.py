@@ -1,33 +1,44 @@
 """Task display functionality."""
 
-from operator import itemgetter
 from ...i18n import language_manager
 from ..base_task import BaseTask
 from ...utils import print_with_clear
 
 
 class ShowTask(BaseTask):
-    def __init__(self, user_id, username):
+    # Indexed task field for each sort option
+    SORT_FIELDS = {1: "priority", 2: "due_date", 3: "category", 4: "status", 5: "created_at"}
+    PAGE_SIZE = 20
+
+    def __init__(self, user_id, username, db=None):
         """Initialize the TaskViewer with user ID and username."""
-        super().__init__(user_id)
+        super().__init__(user_id, db)
         self.username = username
 
     def show_tasks(self):
         """Display all tasks for the user."""
         try:
-            user_tasks = self.db.get_user_tasks(self.user_id)
-
-            if not self._user_has_tasks(user_tasks):
+            if not self._user_has_tasks(self.db.query(self.user_id, limit=1, fields=["task_id"])):
                 print_with_clear(f"Sorry {self.username}, {language_manager.get_text('NO_TASKS')}")
                 return
 
             sort_option = self._get_sort_option()
-            sorted_tasks = self._sort_tasks(user_tasks, sort_option)
-            self._display_user_tasks(sorted_tasks, detailed=True)
+            self._show_pages(self.SORT_FIELDS[sort_option])
 
         except Exception as e:
             self._handle_error(e)
 
+    def _show_pages(self, order_by):
+        """Display the tasks one page at a time, loading each page on demand."""
+        offset = 0
+        while True:
+            # One task more than a page tells whether another page follows
+            page = self.db.query(self.user_id, order_by=order_by, limit=self.PAGE_SIZE + 1, offset=offset)
+            self._display_user_tasks(page[:self.PAGE_SIZE], detailed=True)
+            if len(page) <= self.PAGE_SIZE or input(language_manager.get_text("SHOW_MORE_TASKS")).strip():
+                return
+            offset += self.PAGE_SIZE
+
     def _get_sort_option(self):
         """Get the sorting preference from the user."""
         print_with_clear("\n" + language_manager.get_text("SORT_BY"))
@@ -46,25 +57,6 @@ class ShowTask(BaseTask):
             except ValueError:
                 print_with_clear(language_manager.get_text("INVALID_INPUT").format("Please enter a number"))
 
-    def _sort_tasks(self, tasks, sort_option):
-        """Sort tasks based on user preference."""
-        if sort_option == 1:  # Priority
-            priority_order = {
-                language_manager.get_text("PRIORITY_URGENT"): 0,
-                language_manager.get_text("PRIORITY_HIGH"): 1,
-                language_manager.get_text("PRIORITY_MEDIUM"): 2,
-                language_manager.get_text("PRIORITY_LOW"): 3
-            }
-            return sorted(tasks, key=lambda x: priority_order.get(x.get('priority', 'Low'), 4))
-        elif sort_option == 2:  # Due Date
-            return sorted(tasks, key=itemgetter('due_date'))
-        elif sort_option == 3:  # Category
-            return sorted(tasks, key=itemgetter('category'))
-        elif sort_option == 4:  # Status
-            return sorted(tasks, key=itemgetter('status'))
-        else:  # Creation Date
-            return sorted(tasks, key=itemgetter('created_at'))
-
     def _display_user_tasks(self, tasks, detailed=False):
         """Display the tasks in a user-friendly format."""
         print_with_clear(f"\n{language_manager.get_text('AVAILABLE_TASKS')}, {self.username}:")
@@ -73,8 +65,8 @@ class ShowTask(BaseTask):
             print(f"Task ID: {task['task_id']}")
             print(f"{language_manager.get_text('FIELD_NAME')}: {task['name']}")
             print(f"{language_manager.get_text('FIELD_DESCRIPTION')}: {task['description']}")
-            print(f"{language_manager.get_text('FIELD_PRIORITY')}: {task.get('priority', 'Not set')}")
-            print(f"{language_manager.get_text('FIELD_CATEGORY')}: {task.get('category', 'Not set')}")
+            print(f"{language_manager.get_text('FIELD_PRIORITY')}: {task['priority'] or 'Not set'}")
+            print(f"{language_manager.get_text('FIELD_CATEGORY')}: {task['category'] or 'Not set'}")
             print(f"{language_manager.get_text('FIELD_STATUS')}: {task['status']}")
             print(f"{language_manager.get_text('SORT_CREATION_DATE')}: {task['created_at']}")
             print(f"{language_manager.get_text('SORT_DUE_DATE')}: {task['due_date']}")
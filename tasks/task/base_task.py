@@ -1,14 +1,19 @@
 """Base class for task operations."""
 
-from ..database.db_manager import DatabaseManager
+from ..database.backends import get_database
 from ..i18n import language_manager
 from ..utils import print_with_clear
 
 class BaseTask:
-    def __init__(self, user_id):
-        """Initialize base task with user ID and database manager."""
+    def __init__(self, user_id, db=None):
+        """Initialize base task with user ID and database manager.
+
+        Args:
+            user_id: The user's ID
+            db: Database manager to use; defaults to the shared one
+        """
         self.user_id = user_id
-        self.db = DatabaseManager()
+        self.db = db or get_database()
 
     def _load_tasks(self):
         """Load tasks from the database."""
@@ -47,8 +52,8 @@ class BaseTask:
             print(f"{language_manager.get_text('FIELD_DESCRIPTION')}: {task['description']}")
             
             if detailed:
-                print(f"{language_manager.get_text('FIELD_PRIORITY')}: {task.get('priority', 'Not set')}")
-                print(f"{language_manager.get_text('FIELD_CATEGORY')}: {task.get('category', 'Not set')}")
+                print(f"{language_manager.get_text('FIELD_PRIORITY')}: {task['priority'] or 'Not set'}")
+                print(f"{language_manager.get_text('FIELD_CATEGORY')}: {task['category'] or 'Not set'}")
                 print(f"{language_manager.get_text('FIELD_STATUS')}: {task['status']}")
                 print(f"{language_manager.get_text('SORT_CREATION_DATE')}: {task['created_at']}")
                 print(f"{language_manager.get_text('SORT_DUE_DATE')}: {task['due_date']}")
@@ -4,31 +4,40 @@ from .AddTask.AddTask import AddTask
 from .ShowTask.ShowTask import ShowTask
 from .EditTask.EditTask import EditTask
 from .DeleteTask.DeleteTask import DeleteTask
-from ..database.db_manager import DatabaseManager
+from ..database.backends import get_database
 from ..i18n import language_manager
 from ..utils import print_with_clear
 
 
 class Task:
-    def __init__(self, username):
-        """Initialize task manager with username."""
+    def __init__(self, username, db=None):
+        """Initialize task manager with username.
+
+        Args:
+            username: The logged in user's name
+            db: Database manager to use; defaults to the shared one
+        """
         self.username = username
-        self.db = DatabaseManager()
+        self.db = db or get_database()
+        self.user_id = None
 
     def get_user_id(self):
-        """Fetch the user ID from the database based on the username."""
+        """Get the user's ID, looked up in the user directory once per session."""
+        if self.user_id is not None:
+            return self.user_id
         try:
-            user_data = self.db.get_user(self.username)
-            if user_data:
-                return user_data["userid"]
-            raise ValueError(language_manager.get_text("USER_NOT_FOUND").format(self.username))
+            user_id = self.db.get_user_id(self.username)
         except Exception as e:
             raise ValueError(language_manager.get_text("ERROR_LOADING").format(str(e)))
+        if user_id is None:
+            raise ValueError(language_manager.get_text("USER_NOT_FOUND").format(self.username))
+        self.user_id = user_id
+        return user_id
 
     def add_task(self):
         """Add a new task for the user."""
         try:
-            task_adder = AddTask(self.get_user_id())
+            task_adder = AddTask(self.get_user_id(), self.db)
             task_adder.add_task()
         except Exception as e:
             print_with_clear(language_manager.get_text("ERROR_UNEXPECTED").format(str(e)))
@@ -36,7 +45,7 @@ class Task:
     def show_task(self):
         """Show tasks for the user."""
         try:
-            task_shower = ShowTask(self.get_user_id(), self.username)
+            task_shower = ShowTask(self.get_user_id(), self.username, self.db)
             task_shower.show_tasks()
         except Exception as e:
             print_with_clear(language_manager.get_text("ERROR_UNEXPECTED").format(str(e)))
@@ -44,7 +53,7 @@ class Task:
     def edit_task(self):
         """Edit an existing task for the user."""
         try:
-            task_editor = EditTask(self.get_user_id())
+            task_editor = EditTask(self.get_user_id(), self.db)
             task_editor.edit_task()
         except Exception as e:
             print_with_clear(language_manager.get_text("ERROR_UNEXPECTED").format(str(e)))
@@ -52,7 +61,7 @@ class Task:
     def delete_task(self):
         """Delete a task for the user."""
         try:
-            task_deleter = DeleteTask(self.get_user_id())
+            task_deleter = DeleteTask(self.get_user_id(), self.db)
             task_deleter.delete_task()
         except Exception as e:
             print_with_clear(language_manager.get_text("ERROR_UNEXPECTED").format(str(e)))